@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+
+from sqlalchemy.engine import make_url
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_utils import (encode_batches, create_table, create_key_index, populate_table,
+                      upsert_into_table, drop_table)
+from database.engines import get_engine, dispose_engines
+from database.pbp_frame import PbpFrame
+from database.pbp_utils import process_pbp, get_team_adjusted_epa
+from database.derived_tables import get_games
+from database.pipeline import PIPELINE_TABLES, read_pbp, run_pipeline
+from database.feature_store import read_season_files
+from database.queries import get_game_stats
+from database.synthetic_pbp import make_pbp, make_games, write_pbp_seasons
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# the columns get_game_stats reads, loaded into the database before it is timed
+GAME_STATS_COLUMNS = ['game_id', 'season', 'home_team', 'away_team', 'posteam',
+                      'play_type_nfl', 'yards_gained', 'epa']
+
+
+def _size(result=None):
+    """
+    The number of rows of a stage's output
+    """
+
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(_size(value) for value in result.values())
+
+    return None
+
+
+def measure(func=None, repeat: int = 3, memory: bool = True):
+    """
+    Time a stage and measure its peak memory.
+
+    The stage is timed repeat times, then run once more under tracemalloc,
+    which numpy and pandas report their buffers to, so the timings are not
+    slowed by the tracing.
+
+    Args:
+        func: A function of no arguments running the stage
+        repeat (int, optional): The number of timed runs. Defaults to 3.
+        memory (bool, optional): Whether to measure peak memory. Defaults to True.
+
+    Returns:
+        tuple: The stage's output and a dict of its measurements
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        del result
+        tracemalloc.start()
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    return result, {
+        'seconds': round(min(times), 4),
+        'median_seconds': round(float(np.median(times)), 4),
+        'peak_mb': None if peak is None else round(peak, 2),
+        'rows_out': _size(result)
+    }
+
+
+def run_benchmarks(seasons: list = None, repeat: int = 3, URI: str = None,
+                   extra_columns: int = 300, n_jobs: int = None, seed: int = 0):
+    """
+    A function that benchmarks the pipeline on synthetic play-by-play data
+    of each size.
+
+    For each number of seasons it times and memory-profiles reading the
+    season files (every column and only the needed ones), process_pbp, each
+    aggregator, the games table assembly and the parallel pipeline, then the
+    load paths: encoding COPY text, creating a table, and, on a postgres URI,
+    populating and upserting bench_ tables that are dropped afterwards.
+    get_game_stats always runs against a temporary SQLite copy of the data,
+    so no existing pbp table is touched.
+
+    Args:
+        seasons (list, optional): The numbers of seasons to benchmark. Defaults to [1, 5].
+        repeat (int, optional): The timed runs of each stage. Defaults to 3.
+        URI (str, optional): The database for the load paths. Defaults to a
+            temporary SQLite file, where the COPY paths are skipped.
+        extra_columns (int, optional): Filler columns, so the season files are
+            about as wide as nflfastR's. Defaults to 300.
+        n_jobs (int, optional): The processes for run_pipeline. Defaults to every core.
+        seed (int, optional): The random seed of the data. Defaults to 0.
+
+    Returns:
+        list: One dict of measurements per stage and size
+    """
+
+    if seasons is None:
+        seasons = [1, 5]
+
+    results = []
+
+    def record(stage, n_seasons, rows_in, stats, **extra):
+        row = {'stage': stage, 'seasons': n_seasons, 'rows_in': rows_in, **stats, **extra}
+        results.append(row)
+        print(f"{n_seasons:>3} seasons  {stage:<28} {row['seconds']:>9.4f}s  "
+              f"{row['peak_mb'] if row['peak_mb'] is not None else '':>9} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db_uri = URI or sqlite_uri
+        postgres = make_url(db_uri).get_backend_name() == 'postgresql'
+
+        for n_seasons in seasons:
+            raw = make_pbp(n_seasons, extra_columns=extra_columns, seed=seed)
+            ls = make_games(raw, seed=seed)
+            season_list = sorted(raw['season'].unique().tolist())
+            directory = os.path.join(tmp, f'pbp_{n_seasons}')
+            write_pbp_seasons(raw, directory)
+            n = len(raw)
+
+            full, stats = measure(lambda: read_season_files(directory, season_list), repeat)
+            record('read_pbp_all_columns', n_seasons, n, stats)
+            raw, stats = measure(lambda: read_pbp(season_list, games=True, directory=directory),
+                                 repeat)
+            record('read_pbp_pruned', n_seasons, n, stats)
+
+            df, stats = measure(lambda: process_pbp(raw), repeat)
+            record('process_pbp', n_seasons, n, stats)
+
+            for name, func in PIPELINE_TABLES.items():
+                _, stats = measure(lambda: func(df), repeat)
+                record(name, n_seasons, n, stats)
+
+            _, stats = measure(lambda: get_team_adjusted_epa(df), repeat)
+            record('team_adjusted_epa', n_seasons, n, stats)
+
+            games, stats = measure(lambda: get_games(PbpFrame(df), ls), repeat)
+            record('games', n_seasons, n, stats)
+
+            _, stats = measure(lambda: run_pipeline(directory=directory, ls=ls, n_jobs=n_jobs),
+                               repeat, memory=False)
+            record('run_pipeline', n_seasons, n, stats, n_jobs=n_jobs or os.cpu_count())
+
+            # the load paths, on the play-by-play the queries read and on a derived table
+            pbp_table = full[GAME_STATS_COLUMNS]
+            copy_bytes, stats = measure(
+                lambda: sum(len(batch) for batch in encode_batches(pbp_table)), repeat)
+            record('encode_batches', n_seasons, n, stats, bytes=copy_bytes)
+
+            _, stats = measure(lambda: create_table(games, 'bench_games', URI=db_uri), repeat)
+            record('create_table', n_seasons, len(games), stats)
+
+            if postgres:
+                _, stats = measure(lambda: populate_table(pbp_table, 'bench_pbp', URI=db_uri), 1,
+                                   memory=False)
+                record('populate_table', n_seasons, n, stats, bytes=copy_bytes)
+                create_key_index('bench_games', URI=db_uri, key_cols=['game_id', 'team'])
+                _, stats = measure(lambda: upsert_into_table(
+                    games, 'bench_games', URI=db_uri, key_cols=['game_id', 'team']), repeat,
+                    memory=False)
+                record('upsert_into_table', n_seasons, len(games), stats)
+                drop_table('bench_pbp', URI=db_uri)
+
+            drop_table('bench_games', URI=db_uri)
+
+            pbp_table.to_sql('pbp', get_engine(sqlite_uri), if_exists='replace', index=False,
+                             chunksize=50000)
+            _, stats = measure(lambda: get_game_stats(min_year=2000, use_cache=False,
+                                                      URI=sqlite_uri), repeat)
+            record('get_game_stats', n_seasons, n, stats)
+
+            del full, raw, df, games, pbp_table
+
+        dispose_engines(sqlite_uri)
+
+    return results
+
+
+def save_results(results: list = None, path: str = None):
+    """
+    Save benchmark results as JSON with the versions they were run with
+
+    Args:
+        results (list): The output of run_benchmarks
+        path (str, optional): The file to write. Defaults to a timestamped file in RESULTS_DIR.
+
+    Returns:
+        str: The path written
+    """
+
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, time.strftime('bench_%Y%m%d_%H%M%S.json'))
+
+    payload = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pa.__version__,
+        'results': results
+    }
+
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, default=str)
+
+    return path
+
+
+def compare_results(baseline: str = None, current: str = None):
+    """
+    A function that compares two saved benchmark runs stage by stage.
+
+    Args:
+        baseline (str): The path of the earlier run
+        current (str): The path of the later run
+
+    Returns:
+        df (pd.DataFrame): The seconds and peak memory of each stage in both
+            runs, with ratios above 1 where the later run is slower or larger
+    """
+
+    def load(path):
+        with open(path) as f:
+            return pd.DataFrame(json.load(f)['results'])[['stage', 'seasons', 'seconds', 'peak_mb']]
+
+    return (
+        load(baseline)
+        .merge(load(current), how='outer', on=['stage', 'seasons'],
+               suffixes=('_baseline', '_current'))
+        .assign(time_ratio=lambda x: (x['seconds_current'] / x['seconds_baseline']).round(2),
+                memory_ratio=lambda x: (x['peak_mb_current'] / x['peak_mb_baseline']).round(2))
+    )
+
+
+if __name__ == '__main__':
+    # python -m benchmarks.pipeline_benchmarks --seasons 1 5 25 [--uri URI] [--compare old.json]
+    parser = argparse.ArgumentParser(description='Benchmark the pbp pipeline on synthetic data')
+    parser.add_argument('--seasons', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--uri', default=None)
+    parser.add_argument('--extra-columns', type=int, default=300)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    path = save_results(
+        run_benchmarks(args.seasons, repeat=args.repeat, URI=args.uri,
+                       extra_columns=args.extra_columns, n_jobs=args.n_jobs),
+        args.output)
+    print(f'results saved to {path}')
+
+    if args.compare:
+        print(compare_results(args.compare, path).to_string(index=False))
@@ -0,0 +1,267 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import DATA_DIR, read_season_files
+from .player_index import build_player_index, player_keys
+
+
+DEPTH_DIR = os.path.join(DATA_DIR, 'depth_charts')
+SNAP_DIR = os.path.join(DATA_DIR, 'snap_counts')
+
+DEPTH_COLUMNS = ['season', 'club_code', 'week', 'game_type', 'depth_team', 'formation',
+                 'gsis_id', 'position', 'full_name']
+SNAP_COLUMNS = ['game_id', 'season', 'week', 'player', 'pfr_player_id', 'position', 'team',
+                'offense_snaps', 'offense_pct']
+
+# relocated teams, so the codes of every source and era line up
+TEAM_ALIASES = {'OAK': 'LV', 'SD': 'LAC', 'STL': 'LA', 'LAR': 'LA', 'JAC': 'JAX'}
+
+# more weeks than any season has, so (group, week) packs into one integer
+WEEK_SPAN = 64
+
+# the playoff rounds, numbered from the week after the regular season
+PLAYOFF_ROUNDS = {'WC': 1, 'DIV': 2, 'CON': 3, 'SB': 4}
+
+
+def regular_season_weeks(seasons=None):
+    """
+    The number of regular season weeks game ids count in each season, 18
+    since 2021 and 17 before
+    """
+
+    return np.where(np.asarray(seasons) >= 2021, 18, 17)
+
+
+def schedule_weeks(depth_charts: pd.DataFrame = None):
+    """
+    A function that maps depth chart weeks to the weeks game ids use.
+
+    Most seasons' depth charts have one regular season week more than the
+    schedule, a chart from before week 1, so the chart labelled week w + 1
+    is the one published before the week w games and the wild card round is
+    labelled a week later than its game ids. Each season's charts are
+    shifted by how many regular season weeks they have beyond the schedule,
+    and playoff charts are numbered from the last regular season week by
+    round. A season still in progress is not shifted, since its last week
+    is not known yet.
+
+    Args:
+        depth_charts (pd.DataFrame): Depth chart entries with season, week and game_type
+
+    Returns:
+        np.ndarray: The schedule week of each entry, 0 for a chart from before week 1
+    """
+
+    seasons = depth_charts['season'].to_numpy()
+    regular = (depth_charts['game_type'] == 'REG').to_numpy()
+    last_week = (depth_charts['week'].where(regular)
+                 .groupby(depth_charts['season']).transform('max').fillna(0).to_numpy())
+    shift = np.maximum(last_week - regular_season_weeks(seasons), 0)
+
+    return np.where(regular, depth_charts['week'].to_numpy() - shift,
+                    regular_season_weeks(seasons) +
+                    depth_charts['game_type'].map(PLAYOFF_ROUNDS).fillna(0).to_numpy()
+                    ).astype(int)
+
+
+def read_depth_charts(seasons: list = None, directory: str = DEPTH_DIR):
+    """
+    A function that reads the offensive depth charts of some seasons.
+
+    Entries of game type POST are dropped, since their week numbers do not
+    follow the regular season and playoff weeks of the other entries. Weeks
+    are mapped to the weeks of game ids by schedule_weeks, and the week a
+    chart is labelled with is kept as chart_week.
+
+    Args:
+        seasons (list, optional): The seasons to read. Defaults to every season.
+        directory (str, optional): The depth chart directory. Defaults to DEPTH_DIR.
+
+    Returns:
+        df (pd.DataFrame): The depth chart entries, with integer season, week (the
+            schedule week), chart_week and depth_team
+    """
+
+    df = read_season_files(directory, seasons=seasons, columns=DEPTH_COLUMNS)
+    df = df[(df['formation'] == 'Offense') & (df['game_type'] != 'POST')].copy()
+
+    for col in ['season', 'week', 'depth_team']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    df = df.dropna(subset=['season', 'week', 'depth_team', 'gsis_id'])
+    df = df.astype({'season': int, 'week': int, 'depth_team': int}).reset_index(drop=True)
+
+    return df.assign(chart_week=df['week'], week=schedule_weeks(df))
+
+
+def read_snap_counts(seasons: list = None, directory: str = SNAP_DIR):
+    """
+    A function that reads the snap counts of some seasons.
+
+    Args:
+        seasons (list, optional): The seasons to read. Defaults to every season.
+        directory (str, optional): The snap counts directory. Defaults to SNAP_DIR.
+
+    Returns:
+        df (pd.DataFrame): One row per player and game
+    """
+
+    df = read_season_files(directory, seasons=seasons, columns=SNAP_COLUMNS)
+
+    return df.astype({'season': int, 'week': int})
+
+
+def _group_codes(*cols):
+    """
+    One integer code per combination of the key columns, -1 where any is missing
+    """
+
+    codes = np.zeros(len(cols[0]), dtype=np.int64)
+
+    for col in cols:
+        col_codes, uniques = pd.factorize(col)
+        codes = np.where(col_codes < 0, -1, codes * (len(uniques) + 1) + col_codes)
+        codes = np.where(codes < 0, -1, codes)
+
+    return codes
+
+
+def asof_positions(ref_groups: np.ndarray = None, ref_weeks: np.ndarray = None,
+                   groups: np.ndarray = None, weeks: np.ndarray = None,
+                   strict: bool = True):
+    """
+    A function that finds, for each query, the latest reference row of the
+    same group from an earlier week, with one sort and one binary search.
+
+    Args:
+        ref_groups (np.ndarray): The group code of each reference row
+        ref_weeks (np.ndarray): The week of each reference row
+        groups (np.ndarray): The group code of each query, -1 to skip it
+        weeks (np.ndarray): The week of each query
+        strict (bool, optional): Whether a reference row from the query's own week
+            is excluded. Defaults to True.
+
+    Returns:
+        np.ndarray: The position of the matching reference row, -1 where there is none
+    """
+
+    ref_keys = ref_groups.astype(np.int64) * WEEK_SPAN + ref_weeks
+    order = np.argsort(ref_keys, kind='stable')
+    ref_keys = ref_keys[order]
+
+    keys = groups.astype(np.int64) * WEEK_SPAN + weeks - int(strict)
+    positions = np.searchsorted(ref_keys, keys, side='right') - 1
+
+    found = (groups >= 0) & (positions >= 0)
+    found[found] = ref_keys[positions[found]] // WEEK_SPAN == groups[found]
+
+    return np.where(found, order[np.maximum(positions, 0)], -1)
+
+
+def _depth_slots(depth_charts: pd.DataFrame = None, index: pd.DataFrame = None):
+    """
+    Each player's highest slot on their team's depth chart each week
+    """
+
+    slots = depth_charts.assign(
+        team=depth_charts['club_code'].replace(TEAM_ALIASES),
+        player_key=player_keys(index, depth_charts['gsis_id'])
+    )
+
+    return (
+        slots[slots['player_key'] >= 0]
+        .sort_values(by=['season', 'team', 'week', 'depth_team', 'position'], kind='stable')
+        .drop_duplicates(subset=['season', 'week', 'team', 'player_key'])
+        .reset_index(drop=True)
+    )
+
+
+def add_depth_and_snaps(df: pd.DataFrame = None, depth_charts: pd.DataFrame = None,
+                        snap_counts: pd.DataFrame = None, index: pd.DataFrame = None,
+                        same_week_depth: bool = True):
+    """
+    A function that adds the depth chart slot and snap share known before
+    kickoff to player-game rows, such as the output of get_receiving,
+    get_rushing or get_qb_pass.
+
+    The depth slot is the player's highest slot on their team's latest depth
+    chart of the season up to the game's week, in schedule weeks (see
+    schedule_weeks). The chart of a game's week is published before the
+    game: it names one-game fill-in starters, which the next week's chart
+    no longer does, so it is included unless same_week_depth is False. The snap share is from the player's latest
+    earlier game of the season, on any team, so the game's own snaps never
+    leak in. Both are found with one binary search over all the rows.
+
+    Snap counts are keyed by PFR ids, so rows are matched through the player
+    index of player_index.
+
+    Args:
+        df (pd.DataFrame): Player-game rows with game_id, player_id (GSIS) and team
+        depth_charts (pd.DataFrame, optional): The output of read_depth_charts, with
+            schedule weeks. Defaults to every season on disk.
+        snap_counts (pd.DataFrame, optional): The output of read_snap_counts.
+            Defaults to every season on disk.
+        index (pd.DataFrame, optional): The player index. Defaults to one built from
+            the depth charts and snap counts.
+        same_week_depth (bool, optional): Whether the depth chart of the game's week
+            is used. Defaults to True.
+
+    Returns:
+        df (pd.DataFrame): df with depth_team, depth_position and depth_week (the
+            schedule week of the chart), and
+            the offense_pct, offense_snaps and week of the last game (prev_offense_pct,
+            prev_offense_snaps, prev_snap_week)
+    """
+
+    if depth_charts is None:
+        depth_charts = read_depth_charts()
+    if snap_counts is None:
+        snap_counts = read_snap_counts()
+    if index is None:
+        index = build_player_index({'depth_charts': depth_charts, 'snap_counts': snap_counts})
+
+    # game ids look like 2021_01_PHI_ATL, so each distinct game is parsed once
+    game_codes, game_ids = pd.factorize(df['game_id'])
+    game_parts = pd.Series(game_ids).astype(str).str.split('_')
+    seasons = game_parts.str[0].astype(int).to_numpy()[game_codes]
+    weeks = game_parts.str[1].astype(int).to_numpy()[game_codes]
+    teams = df['team'].replace(TEAM_ALIASES).to_numpy()
+    keys = player_keys(index, df['player_id'])
+
+    slots = _depth_slots(depth_charts, index)
+    snaps = snap_counts.assign(
+        player_key=player_keys(index, snap_counts['pfr_player_id'], 'pfr_id'))
+    snaps = snaps[snaps['player_key'] >= 0]
+
+    n_slots = len(slots)
+    codes = _group_codes(np.concatenate([slots['season'].to_numpy(), seasons]),
+                         np.concatenate([slots['team'].to_numpy(), teams]),
+                         np.concatenate([slots['player_key'].to_numpy(),
+                                         np.where(keys >= 0, keys, np.nan)]))
+    depth = asof_positions(codes[:n_slots], slots['week'].to_numpy(), codes[n_slots:], weeks,
+                           strict=not same_week_depth)
+
+    n_snaps = len(snaps)
+    codes = _group_codes(np.concatenate([snaps['season'].to_numpy(), seasons]),
+                         np.concatenate([snaps['player_key'].to_numpy(),
+                                         np.where(keys >= 0, keys, np.nan)]))
+    prev = asof_positions(codes[:n_snaps], snaps['week'].to_numpy(), codes[n_snaps:], weeks,
+                          strict=True)
+
+    def take(values, positions, fill=np.nan):
+        values = np.asarray(values)
+        taken = values[np.maximum(positions, 0)]
+        if values.dtype.kind in 'iu':
+            taken = taken.astype(np.float64)
+        return np.where(positions >= 0, taken, fill)
+
+    return df.assign(
+        depth_team=take(slots['depth_team'], depth),
+        depth_position=take(slots['position'].to_numpy(dtype=object), depth, None),
+        depth_week=take(slots['week'], depth),
+        prev_offense_pct=take(snaps['offense_pct'], prev),
+        prev_offense_snaps=take(snaps['offense_snaps'], prev),
+        prev_snap_week=take(snaps['week'], prev)
+    )
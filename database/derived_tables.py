@@ -0,0 +1,143 @@
+import pandas as pd
+
+from .pbp_frame import PbpFrame
+from .pbp_utils import (get_qb_pass, get_rushing, get_receiving, get_kicker_stats,
+                        get_def_stats, get_team_rush_yds, get_team_pass_yds,
+                        get_team_scores, get_opp_rush, get_opp_pass, get_game_results)
+
+
+# the per-game tables derived from play-by-play data and the function building each
+DERIVED_TABLES = {
+    'qb_games': get_qb_pass,
+    'rush_games': get_rushing,
+    'receiving_games': get_receiving,
+    'kicker_games': get_kicker_stats,
+    'defense_games': get_def_stats
+}
+
+
+def get_games(pbp: PbpFrame = None, ls: pd.DataFrame = None):
+    """
+    Build the games table from play-by-play data and Lee Sharpe's games data
+
+    Args:
+        pbp (PbpFrame): Play-by-play data
+        ls (pd.DataFrame): Lee Sharpe's games data
+
+    Returns:
+        df (pd.DataFrame): A dataframe of each team's aggregate stats for each game
+    """
+
+    return get_game_results(
+        df=pbp,
+        team_rush_yds=get_team_rush_yds(pbp),
+        team_pass_yds=get_team_pass_yds(pbp),
+        team_scores=get_team_scores(pbp),
+        opp_rush=get_opp_rush(pbp),
+        opp_pass=get_opp_pass(pbp),
+        ls=ls
+    )
+
+
+def get_derived_rows(df: pd.DataFrame = None, game_ids: list = None,
+                     ls: pd.DataFrame = None, tables: dict = None):
+    """
+    Build the rows of each derived table for a set of games.
+
+    Only the plays of those games are aggregated. Every game is aggregated
+    from all of its plays, so the per-game team columns such as
+    rush_att_share, target_share and air_yards_share come out the same as in
+    a full rebuild.
+
+    Args:
+        df (pd.DataFrame): Play-by-play data, either the full history or just the new games
+        game_ids (list, optional): The games to build. Defaults to every game in df.
+        ls (pd.DataFrame, optional): Lee Sharpe's games data, needed for the games
+            table. Defaults to None, which skips the games table.
+        tables (dict, optional): A mapping of table name to the function building it.
+            Defaults to DERIVED_TABLES.
+
+    Returns:
+        dict: A dataframe of new rows for each derived table
+    """
+
+    if tables is None:
+        tables = DERIVED_TABLES
+
+    if game_ids is not None:
+        df = df[df['game_id'].isin(game_ids)]
+
+    pbp = PbpFrame(df)
+
+    rows = {name: func(pbp) for name, func in tables.items()}
+
+    if ls is not None:
+        rows['games'] = get_games(pbp, ls)
+
+    return rows
+
+
+def replace_games(table: pd.DataFrame = None, rows: pd.DataFrame = None):
+    """
+    Replace the rows of a derived table for the games in rows.
+
+    Existing rows of those games are dropped and the new rows are added in
+    game_id order. New games that sort after every existing game, as a new
+    week does, are appended without reordering the table.
+
+    Args:
+        table (pd.DataFrame): The existing derived table
+        rows (pd.DataFrame): The rebuilt rows for some games
+
+    Returns:
+        df (pd.DataFrame): The updated derived table
+    """
+
+    if rows.empty:
+        return table
+
+    kept = table[~table['game_id'].isin(rows['game_id'].unique())]
+    in_order = kept.empty or str(kept['game_id'].max()) < str(rows['game_id'].min())
+
+    table = pd.concat([kept, rows], ignore_index=True)
+
+    if not in_order:
+        table = table.sort_values(by='game_id', kind='stable', ignore_index=True)
+
+    return table
+
+
+def update_derived_tables(tables: dict = None, df: pd.DataFrame = None,
+                          game_ids: list = None, ls: pd.DataFrame = None):
+    """
+    Incrementally update the derived per-game tables with new or corrected games.
+
+    Args:
+        tables (dict): A mapping of table name to its existing dataframe
+        df (pd.DataFrame): Play-by-play data containing at least the games to update
+        game_ids (list, optional): The games to update. Defaults to every game in df.
+        ls (pd.DataFrame, optional): Lee Sharpe's games data, needed to update the
+            games table. Defaults to None.
+
+    Raises:
+        ValueError: If tables has the games table but ls is None, since it would
+            be left stale
+
+    Returns:
+        dict: The updated dataframe of each table
+    """
+
+    if 'games' in tables and ls is None:
+        raise ValueError("Error: the games table can't be updated without ls, "
+                         "Lee Sharpe's games data")
+
+    builders = {name: func for name, func in DERIVED_TABLES.items() if name in tables}
+    rows = get_derived_rows(df, game_ids=game_ids,
+                            ls=ls if 'games' in tables else None, tables=builders)
+
+    updated = dict(tables)
+
+    for name, new_rows in rows.items():
+        updated[name] = replace_games(tables[name], new_rows)
+
+    return updated
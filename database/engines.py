@@ -0,0 +1,132 @@
+import os
+import threading
+
+from contextlib import contextmanager
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# pool settings used when an engine is first created for a URI
+POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True
+}
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_db_uri():
+    """
+    Build the postgres URI from the DB_* environment variables.
+    """
+
+    user = os.getenv('DB_USER')
+    password = os.getenv('DB_PASSWORD')
+    host = os.getenv('DB_HOST')
+    database = os.getenv('DB_NAME')
+    port = os.getenv('DB_PORT')
+
+    return f'postgresql://{user}:{password}@{host}:{port}/{database}'
+
+
+def configure_pool(**settings):
+    """
+    Change the pool settings used for engines created from now on, e.g.
+    configure_pool(pool_size=10). Existing engines keep their pool.
+    """
+
+    POOL_SETTINGS.update(settings)
+
+
+def get_engine(URI=None):
+    """
+    Get the process-wide engine for a URI, creating it on first use.
+
+    Every caller with the same URI shares one engine and its connection
+    pool, so connection setup and the TLS handshake are paid once per
+    pooled connection rather than once per call.
+
+    Args:
+        URI: credentials for the database. defaults to the DB_* environment variables
+
+    Returns:
+        Engine: the shared sqlalchemy engine
+    """
+
+    if URI is None:
+        URI = get_db_uri()
+
+    engine = _engines.get(URI)
+
+    if engine is None:
+        with _lock:
+            engine = _engines.get(URI)
+            if engine is None:
+                settings = dict(POOL_SETTINGS)
+                # sqlite stand-ins use pools that take no size settings
+                if make_url(URI).get_backend_name() == 'sqlite':
+                    settings = {'pool_pre_ping': settings['pool_pre_ping']}
+                engine = create_engine(URI, **settings)
+                _engines[URI] = engine
+
+    return engine
+
+
+def database_url(URI=None):
+    """
+    The URL of the database a URI connects to, without the password, which
+    query results are cached under
+
+    Args:
+        URI: credentials for the database. defaults to the DB_* environment variables
+
+    Returns:
+        str: the URL with the password masked
+    """
+
+    if URI is None:
+        URI = get_db_uri()
+
+    return make_url(URI).render_as_string(hide_password=True)
+
+
+@contextmanager
+def raw_connection(URI=None):
+    """
+    Check a raw DBAPI connection out of the shared pool for the length of a
+    with block. The connection goes back to the pool when the block exits,
+    so a loop of inserts can reuse one connection.
+
+    Args:
+        URI: credentials for the database. defaults to the DB_* environment variables
+
+    Yields:
+        connection: a pooled psycopg2 (or sqlite) connection
+    """
+
+    conn = get_engine(URI).raw_connection()
+
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def dispose_engines(URI=None):
+    """
+    Close the pooled connections of one engine, or of every engine when no
+    URI is given, and forget the engines.
+    """
+
+    with _lock:
+        uris = list(_engines) if URI is None else [URI]
+        for uri in uris:
+            engine = _engines.pop(uri, None)
+            if engine is not None:
+                engine.dispose()
@@ -0,0 +1,353 @@
+import os
+
+import pandas as pd
+import numpy as np
+import pyarrow.dataset as ds
+
+from .feature_store import DATA_DIR, write_table, _add_partition_cols
+from .rolling_features import _group_layout, _by_position, _ewm_params, _ewm_step
+
+
+STATE_DIR = os.path.join(DATA_DIR, 'feature_state')
+
+
+def _keys(by=None):
+    """
+    The group key(s) as a list
+    """
+
+    return [by] if isinstance(by, str) else list(by)
+
+
+def _check_spec(spec: dict = None, by=None):
+    """
+    Make sure every feature can be carried forward from a saved state, which
+    is kept per group of by
+    """
+
+    for name, feature in spec.items():
+        if _keys(feature.get('by', by)) != _keys(by):
+            raise ValueError(f"{name} is grouped by {feature['by']}, pass by={feature['by']!r} "
+                             'to carry it forward')
+        if feature.get('shift', 1) != 1:
+            raise ValueError(f'{name}: only features lagged by one game (shift=1) '
+                             'can be updated from a saved state')
+        if feature['kind'] not in ['ewm', 'rolling']:
+            raise ValueError(f"unknown window type {feature['kind']} for {name}")
+
+
+def _split_spec(spec: dict = None):
+    """
+    The ewm and rolling feature names of a spec
+    """
+
+    ewm_names = [name for name, feature in spec.items() if feature['kind'] == 'ewm']
+    rolling_names = [name for name, feature in spec.items() if feature['kind'] == 'rolling']
+
+    return ewm_names, rolling_names
+
+
+def _state_columns(name: str = None, feature: dict = None):
+    """
+    The state columns of a feature: the ewm accumulators, or the last window
+    values with lag1 the most recent
+    """
+
+    if feature['kind'] == 'ewm':
+        return [f'{name}_weighted', f'{name}_old_wt', f'{name}_nobs']
+
+    return [f'{name}_lag{i}' for i in range(1, feature['window'] + 1)]
+
+
+def _rolling_from_lags(lags: np.ndarray = None, feature: dict = None):
+    """
+    The rolling mean of the saved window values, like rolling(window, min_periods).mean()
+    """
+
+    present = ~np.isnan(lags)
+    count = present.sum(axis=1)
+    filled = np.where(present, lags, 0.)
+
+    # added up most recent first, in the order _rolling_mean adds them, so the
+    # means are identical rather than equal up to rounding
+    total = filled[:, 0].copy()
+    for lag in range(1, filled.shape[1]):
+        total += filled[:, lag]
+
+    min_periods = feature.get('min_periods')
+    if min_periods is None:
+        min_periods = feature['window']
+
+    return np.where((count >= max(min_periods, 1)) & (count > 0),
+                    total / np.maximum(count, 1), np.nan)
+
+
+def update_state(df: pd.DataFrame = None, spec: dict = None, by='player_id',
+                 state: pd.DataFrame = None):
+    """
+    A function that carries rolling features forward over new games.
+
+    Each group's saved ewm accumulators and window values are updated with
+    its new rows only, so the cost depends on the number of new rows rather
+    than on each group's full history. The features of every new row equal
+    what add_rolling_features returns on the full history.
+
+    Args:
+        df (pd.DataFrame): The new rows, such as a week of get_receiving output, in game order
+        spec (dict): The features, as in add_rolling_features. Every feature must
+            use shift=1.
+        by (str or list, optional): The group key(s). Defaults to 'player_id'.
+        state (pd.DataFrame, optional): The state of each group before these rows.
+            Defaults to None, an empty history.
+
+    Returns:
+        tuple: df with a column for each feature, and the new state of the
+        groups in df with the season and week of their last game
+    """
+
+    _check_spec(spec, by)
+    keys = _keys(by)
+    ewm_names, rolling_names = _split_spec(spec)
+
+    df = _add_partition_cols(df.copy(deep=False))
+
+    order, codes, position = _group_layout(df, keys)
+    keep = codes >= 0
+    order, codes, position = order[keep], codes[keep], position[keep]
+
+    # the key values and last season and week of each group
+    last = np.r_[np.flatnonzero(np.diff(codes)), len(codes) - 1] if len(codes) else []
+    groups = df[keys + ['season', 'week']].take(order[last]).reset_index(drop=True)
+
+    previous = groups[keys]
+    if state is not None:
+        previous = previous.merge(state.drop(columns=['season', 'week'], errors='ignore'),
+                                  how='left', on=keys)
+
+    def saved(col, default):
+        if col in previous.columns:
+            return previous[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.full(len(previous), np.nan if default is None else default)
+
+    # ewm accumulators, one column per feature
+    params = _ewm_params(spans=[spec[name]['span'] for name in ewm_names],
+                         adjust=[spec[name].get('adjust', True) for name in ewm_names],
+                         min_periods=[spec[name].get('min_periods', 0) for name in ewm_names])
+
+    weighted = np.column_stack([saved(f'{name}_weighted', None) for name in ewm_names]
+                               or [np.empty((len(groups), 0))])
+    old_wt = np.column_stack([np.nan_to_num(saved(f'{name}_old_wt', 1.), nan=1.)
+                              for name in ewm_names] or [np.empty((len(groups), 0))])
+    nobs = np.column_stack([np.nan_to_num(saved(f'{name}_nobs', 0.)).astype(np.int64)
+                            for name in ewm_names] or [np.empty((len(groups), 0), dtype=np.int64)])
+
+    # window values of each rolling feature, most recent first
+    lags = {name: np.column_stack([saved(col, None)
+                                   for col in _state_columns(name, spec[name])])
+            for name in rolling_names}
+
+    ewm_values = np.column_stack(
+        [df[spec[name]['col']].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+         for name in ewm_names] or [np.empty((len(order), 0))])
+    rolling_values = {
+        name: df[spec[name]['col']].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        for name in rolling_names}
+
+    results = {name: np.full(len(order), np.nan) for name in spec}
+
+    for rows in _by_position(position):
+        group_rows = codes[rows]
+
+        # each row's features come from the games before it
+        means = np.where(nobs[group_rows] >= params[3], weighted[group_rows], np.nan)
+        for i, name in enumerate(ewm_names):
+            results[name][rows] = means[:, i]
+        for name in rolling_names:
+            results[name][rows] = _rolling_from_lags(lags[name][group_rows], spec[name])
+
+        w, ow, n = _ewm_step(ewm_values[rows], weighted[group_rows], old_wt[group_rows],
+                             nobs[group_rows], params)
+        weighted[group_rows] = w
+        old_wt[group_rows] = ow
+        nobs[group_rows] = n
+
+        for name in rolling_names:
+            window = lags[name][group_rows]
+            lags[name][group_rows] = np.column_stack(
+                [rolling_values[name][rows], window[:, :-1]])
+
+    for name in spec:
+        column = np.full(len(df), np.nan)
+        column[order] = results[name]
+        df[name] = column
+
+    new_state = {col: groups[col] for col in keys}
+    for i, name in enumerate(ewm_names):
+        new_state[f'{name}_weighted'] = weighted[:, i]
+        new_state[f'{name}_old_wt'] = old_wt[:, i]
+        new_state[f'{name}_nobs'] = nobs[:, i]
+    for name in rolling_names:
+        for i, col in enumerate(_state_columns(name, spec[name])):
+            new_state[col] = lags[name][:, i]
+    new_state['season'] = groups['season'].astype(int)
+    new_state['week'] = groups['week'].astype(int)
+
+    return df, pd.DataFrame(new_state)
+
+
+def merge_state(state: pd.DataFrame = None, updated: pd.DataFrame = None, by='player_id'):
+    """
+    Replace the state of the groups in updated
+    """
+
+    if state is None:
+        return updated
+
+    return (
+        pd.concat([state, updated], ignore_index=True)
+        .drop_duplicates(subset=_keys(by), keep='last')
+        .reset_index(drop=True)
+    )
+
+
+def get_state_features(state: pd.DataFrame = None, spec: dict = None, by='player_id'):
+    """
+    A function that returns each group's features for its next game.
+
+    Args:
+        state (pd.DataFrame): The state of each group, as returned by load_state
+        spec (dict): The features the state was built with
+        by (str or list, optional): The group key(s). Defaults to 'player_id'.
+
+    Returns:
+        df (pd.DataFrame): One row per group with its key(s), the season and week
+            of its last game and a column for each feature
+    """
+
+    _check_spec(spec, by)
+    ewm_names, rolling_names = _split_spec(spec)
+
+    features = state[_keys(by) + ['season', 'week']].copy()
+
+    if ewm_names:
+        minp = _ewm_params(spans=[spec[name]['span'] for name in ewm_names],
+                           adjust=[True] * len(ewm_names),
+                           min_periods=[spec[name].get('min_periods', 0)
+                                        for name in ewm_names])[3]
+        for i, name in enumerate(ewm_names):
+            features[name] = state[f'{name}_weighted'].where(
+                state[f'{name}_nobs'] >= minp[i])
+
+    for name in rolling_names:
+        lags = state[_state_columns(name, spec[name])].to_numpy(dtype=np.float64)
+        features[name] = _rolling_from_lags(lags, spec[name])
+
+    return features
+
+
+def save_state(updated: pd.DataFrame = None, name: str = None, by='player_id',
+               root: str = STATE_DIR):
+    """
+    Save the state of the groups updated by one week of games. The store
+    keeps a log of states by season and week; saving a week again replaces
+    that week.
+
+    Args:
+        updated (pd.DataFrame): The new states returned by update_state for one week
+        name (str): The name of the state, e.g. 'receiving'
+        by (str or list, optional): The group key(s). Defaults to 'player_id'.
+        root (str, optional): The root directory of the states. Defaults to STATE_DIR.
+    """
+
+    write_table(updated, name, root=root, team_col=_keys(by)[0])
+
+
+def load_state(name: str = None, season: int = None, week: int = None, by='player_id',
+               root: str = STATE_DIR):
+    """
+    A function that returns the state of every group as of a week, for
+    backtests that need the features known before a slate.
+
+    Args:
+        name (str): The name of the state
+        season (int, optional): The season. Defaults to the latest.
+        week (int, optional): The last week to include. Defaults to the whole season.
+        by (str or list, optional): The group key(s). Defaults to 'player_id'.
+        root (str, optional): The root directory of the states. Defaults to STATE_DIR.
+
+    Returns:
+        df (pd.DataFrame): The latest state of each group up to that week,
+            or None if nothing has been saved yet
+    """
+
+    path = os.path.join(root, name)
+
+    if not os.path.isdir(path):
+        return None
+
+    condition = None
+    if season is not None:
+        condition = ds.field('season') < season
+        if week is None:
+            condition = condition | (ds.field('season') == season)
+        else:
+            condition = condition | ((ds.field('season') == season) &
+                                     (ds.field('week') <= week))
+
+    state = (
+        ds.dataset(path, format='parquet', partitioning='hive')
+        .to_table(filter=condition)
+        .to_pandas()
+    )
+
+    if state.empty:
+        return None
+
+    state['season'] = state['season'].astype(int)
+    state['week'] = state['week'].astype(int)
+
+    return (
+        state
+        .sort_values(by=['season', 'week'], kind='stable')
+        .drop_duplicates(subset=_keys(by), keep='last')
+        .reset_index(drop=True)
+    )
+
+
+def update_feature_state(name: str = None, df: pd.DataFrame = None, spec: dict = None,
+                         by='player_id', root: str = STATE_DIR):
+    """
+    A function that adds new weeks of box scores to a saved state, one week
+    at a time, and returns their features.
+
+    Starts from the state saved before the first week in df, so rerunning a
+    corrected week also brings every later week in df up to date.
+
+    Args:
+        name (str): The name of the state, e.g. 'receiving'
+        df (pd.DataFrame): Box scores with a game_id, such as get_receiving output
+        spec (dict): The features, as in add_rolling_features
+        by (str or list, optional): The group key(s). Defaults to 'player_id'.
+        root (str, optional): The root directory of the states. Defaults to STATE_DIR.
+
+    Returns:
+        df (pd.DataFrame): df with a column for each feature
+    """
+
+    df = _add_partition_cols(df)
+    weeks = df[['season', 'week']].drop_duplicates().sort_values(by=['season', 'week'])
+
+    first_season, first_week = weeks.iloc[0]
+    state = load_state(name, season=first_season, week=first_week - 1, by=by, root=root)
+
+    features = []
+
+    for season, week in weeks.itertuples(index=False):
+        rows = df[(df['season'] == season) & (df['week'] == week)]
+        week_features, updated = update_state(rows, spec, by=by, state=state)
+
+        save_state(updated, name, by=by, root=root)
+        state = merge_state(state, updated, by=by)
+        features.append(week_features)
+
+    return pd.concat(features).reindex(df.index)
@@ -0,0 +1,170 @@
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+FEATURE_DIR = os.path.join(DATA_DIR, 'features')
+
+PARTITION_COLS = ['season', 'week']
+
+
+def _add_partition_cols(df: pd.DataFrame = None):
+    """
+    Add season and week columns taken from the game_id when they are missing
+    """
+
+    if 'season' not in df.columns:
+        df = df.assign(season=df['game_id'].str[:4].astype(int))
+    if 'week' not in df.columns:
+        df = df.assign(week=df['game_id'].str[5:7].astype(int))
+
+    return df
+
+
+def _build_filter(seasons: list = None, weeks: list = None, teams: list = None,
+                  team_col: str = 'team'):
+    """
+    Combine the season, week and team filters into one dataset expression
+    """
+
+    conditions = []
+
+    if seasons is not None:
+        conditions.append(ds.field('season').isin(list(seasons)))
+    if weeks is not None:
+        conditions.append(ds.field('week').isin(list(weeks)))
+    if teams is not None:
+        conditions.append(ds.field(team_col).isin(list(teams)))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    return expression
+
+
+def write_table(df: pd.DataFrame = None, table_name: str = None,
+                root: str = FEATURE_DIR, team_col: str = 'team'):
+    """
+    Write a derived table to the feature store, partitioned by season and week.
+
+    Only the season/week partitions present in df are replaced, so writing a
+    new week or a corrected week leaves the rest of the table untouched. Rows
+    are sorted by team within each partition so the row group statistics let
+    team filters skip data.
+
+    Args:
+        df (pd.DataFrame): A derived table with a game_id column, such as the
+            output of get_receiving or get_game_results
+        table_name (str): The name of the table in the store
+        root (str, optional): The root directory of the store. Defaults to FEATURE_DIR.
+        team_col (str, optional): The team column to sort by. Defaults to 'team'.
+    """
+
+    df = _add_partition_cols(df)
+
+    sort_cols = PARTITION_COLS + [col for col in [team_col, 'game_id'] if col in df.columns]
+    df = df.sort_values(by=sort_cols, kind='stable')
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    ds.write_dataset(
+        table,
+        os.path.join(root, table_name),
+        format='parquet',
+        partitioning=ds.partitioning(table.select(PARTITION_COLS).schema, flavor='hive'),
+        existing_data_behavior='delete_matching'
+    )
+
+
+def read_table(table_name: str = None, columns: list = None, seasons: list = None,
+               weeks: list = None, teams: list = None, root: str = FEATURE_DIR,
+               team_col: str = 'team'):
+    """
+    Read a derived table from the feature store.
+
+    Season and week filters prune whole partition directories, the team filter
+    is checked against row group statistics before any data is read, and only
+    the requested columns are decoded.
+
+    Args:
+        table_name (str): The name of the table in the store
+        columns (list, optional): The columns to read. Defaults to all columns.
+        seasons (list, optional): The seasons to read. Defaults to all seasons.
+        weeks (list, optional): The weeks to read. Defaults to all weeks.
+        teams (list, optional): The teams to read. Defaults to all teams.
+        root (str, optional): The root directory of the store. Defaults to FEATURE_DIR.
+        team_col (str, optional): The column the team filter applies to. Defaults to 'team'.
+
+    Returns:
+        df (pd.DataFrame): The matching rows of the table
+    """
+
+    dataset = ds.dataset(os.path.join(root, table_name), format='parquet',
+                         partitioning='hive')
+
+    table = dataset.to_table(
+        columns=columns,
+        filter=_build_filter(seasons, weeks, teams, team_col)
+    )
+
+    return table.to_pandas()
+
+
+def list_season_files(directory: str = None, seasons: list = None):
+    """
+    List the per-season parquet files of a data directory, such as
+    data/player_stats/player_stats_2021.parquet
+
+    Args:
+        directory (str): A directory of files ending in _<season>.parquet
+        seasons (list, optional): The seasons to keep. Defaults to all seasons.
+
+    Returns:
+        list: The paths of the matching files, in season order
+    """
+
+    files = []
+
+    for file in sorted(os.listdir(directory)):
+        match = re.search(r'_(\d{4})\.parquet$', file)
+        if match is None:
+            continue
+        if seasons is not None and int(match.group(1)) not in seasons:
+            continue
+        files.append(os.path.join(directory, file))
+
+    return files
+
+
+def read_season_files(directory: str = None, seasons: list = None, columns: list = None,
+                      filters: list = None):
+    """
+    Read the per-season parquet files of a data directory, opening only the
+    files of the requested seasons and only the requested columns.
+
+    Args:
+        directory (str): A directory of files ending in _<season>.parquet
+        seasons (list, optional): The seasons to read. Defaults to all seasons.
+        columns (list, optional): The columns to read. Defaults to all columns.
+        filters (list, optional): Row filters in the pyarrow DNF format, e.g.
+            [('week', '<=', 4)]. Defaults to None.
+
+    Returns:
+        df (pd.DataFrame): The rows of the matching files
+    """
+
+    files = list_season_files(directory, seasons)
+
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(
+        [pq.read_table(file, columns=columns, filters=filters).to_pandas() for file in files],
+        ignore_index=True
+    )
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .pbp_frame import PbpFrame
+
+
+# the instrumentation settings and the records of the current trace. while
+# disabled, an instrumented function costs one check of 'enabled'
+_STATE = {
+    'enabled': False,
+    'memory': False,
+    'log': False,
+    'path': None,
+    'records': []
+}
+
+# serializes the records of stages finishing on several threads at once
+_WRITE_LOCK = threading.Lock()
+
+# the stages running in each thread, innermost last, and for threads of a
+# pool the stage that started them (see stage_context and worker_stage)
+_LOCAL = threading.local()
+
+
+def _stack():
+    """
+    The running stages of the current thread
+    """
+
+    if not hasattr(_LOCAL, 'stack'):
+        _LOCAL.stack = []
+
+    return _LOCAL.stack
+
+
+def stage_context():
+    """
+    The stage running in the current thread, to hand to the threads of a
+    pool with worker_stage
+
+    Returns:
+        dict: The name and depth of the running stage
+    """
+
+    stack = _stack()
+
+    return {'parent': stack[-1]['stage'] if stack else getattr(_LOCAL, 'parent', None),
+            'depth': len(stack) + getattr(_LOCAL, 'depth', 0)}
+
+
+@contextmanager
+def worker_stage(context: dict = None):
+    """
+    Record the stages run inside a with block on a pool thread as children
+    of the stage that started the pool, from stage_context.
+
+    tracemalloc's peak is shared by every thread, so stages running
+    alongside others would reset each other's peaks. Their peak_mb is left
+    out instead, and the peak of the stage that started the pool covers
+    them all.
+    """
+
+    previous = (getattr(_LOCAL, 'parent', None), getattr(_LOCAL, 'depth', 0),
+                getattr(_LOCAL, 'concurrent', False))
+    _LOCAL.parent, _LOCAL.depth, _LOCAL.concurrent = context['parent'], context['depth'], True
+
+    try:
+        yield
+    finally:
+        _LOCAL.parent, _LOCAL.depth, _LOCAL.concurrent = previous
+
+
+def _rows(value=None):
+    """
+    The number of rows of a dataframe, PbpFrame or series, or None
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series, PbpFrame)):
+        return len(value)
+
+    return None
+
+
+def _frame_bytes(value=None):
+    """
+    The in-memory size of a query result
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False, deep=True).sum())
+
+    return None
+
+
+def add_bytes(n_bytes: int = None):
+    """
+    Attribute bytes sent to or read from the database to the running stage
+    and the stages it was called from, e.g. the size of a COPY stream. Does
+    nothing while disabled.
+    """
+
+    if _STATE['enabled']:
+        for frame in _stack():
+            frame['bytes'] = (frame['bytes'] or 0) + int(n_bytes)
+
+
+def _write(record: dict = None):
+    """
+    Keep a finished stage's record, append it to the trace file and print it
+    """
+
+    with _WRITE_LOCK:
+        _STATE['records'].append(record)
+
+        if _STATE['path'] is not None:
+            # one line per record, so worker processes can append to the same file
+            with open(_STATE['path'], 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+
+    if _STATE['log']:
+        memory = '' if record['peak_mb'] is None else f", peak +{record['peak_mb']} MB"
+        print(f"{'  ' * record['depth']}{record['stage']}: {record['seconds']}s, "
+              f"rows {record['rows_in']} -> {record['rows_out']}{memory}")
+
+
+def instrumented(func=None, stage: str = None, result_bytes: bool = False):
+    """
+    A decorator recording the wall time, rows in and out, peak memory growth
+    and bytes transferred of each call while instrumentation is enabled.
+
+    Rows in are taken from df or the first dataframe argument, rows out
+    from the result. Stages called inside other stages are recorded with
+    their depth and parent, so the trace shows where the time of a stage
+    went. Peak memory is measured for stages running one at a time: stages
+    on the threads of a pool run with worker_stage have no peak_mb.
+
+    Args:
+        func: The function to wrap
+        stage (str, optional): The name of the stage. Defaults to the function name.
+        result_bytes (bool, optional): Whether to count the in-memory size of the
+            result as bytes transferred, for queries. Defaults to False.
+    """
+
+    if func is None:
+        return functools.partial(instrumented, stage=stage, result_bytes=result_bytes)
+
+    name = stage or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _STATE['enabled']:
+            return func(*args, **kwargs)
+
+        stack = _stack()
+        frame = {'bytes': None, 'child_peak': 0}
+        memory = _STATE['memory'] and not getattr(_LOCAL, 'concurrent', False)
+
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # the caller's peak so far, before this stage resets it
+                stack[-1]['child_peak'] = max(stack[-1]['child_peak'], peak)
+            frame['start_memory'] = current
+            tracemalloc.reset_peak()
+
+        context = stage_context()
+        frame['stage'] = name
+        stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+
+        peak_mb = None
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+            peak_mb = round((peak - frame['start_memory']) / 1024 ** 2, 2)
+            if stack:
+                stack[-1]['child_peak'] = max(stack[-1]['child_peak'], peak)
+
+        if result_bytes and frame['bytes'] is None:
+            frame['bytes'] = _frame_bytes(result)
+
+        _write({
+            'stage': name,
+            'parent': context['parent'],
+            'depth': context['depth'],
+            'pid': os.getpid(),
+            'start': round(time.time() - seconds, 6),
+            'seconds': round(seconds, 6),
+            'rows_in': next((_rows(value) for value in (kwargs.get('df'),) + args
+                             if _rows(value) is not None), None),
+            'rows_out': _rows(result),
+            'peak_mb': peak_mb,
+            'bytes': frame['bytes']
+        })
+
+        return result
+
+    return wrapper
+
+
+def enable(path: str = None, memory: bool = False, log: bool = False):
+    """
+    A function that turns instrumentation on.
+
+    Args:
+        path (str, optional): A JSON lines file each stage's record is appended to
+            as it finishes. Defaults to None, keeping records in memory only.
+        memory (bool, optional): Whether to trace peak memory with tracemalloc, which
+            slows allocation-heavy code. Peaks are measured for stages running one
+            at a time, not for stages on pool threads. Defaults to False.
+        log (bool, optional): Whether to print each stage as it finishes. Defaults to False.
+    """
+
+    _STATE.update(enabled=True, memory=memory, log=log, path=path)
+    _stack().clear()
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    A function that turns instrumentation off, keeping the records so far
+    """
+
+    if _STATE['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    _STATE.update(enabled=False, memory=False, log=False, path=None)
+    _stack().clear()
+
+
+def is_enabled():
+    """
+    Whether instrumentation is on
+    """
+
+    return _STATE['enabled']
+
+
+def reset_trace():
+    """
+    Forget the records kept so far
+    """
+
+    _STATE['records'].clear()
+
+
+def get_trace():
+    """
+    A function that returns the records of the stages run while enabled.
+
+    Returns:
+        df (pd.DataFrame): One row per stage call, in the order they finished
+    """
+
+    return pd.DataFrame(_STATE['records'], columns=[
+        'stage', 'parent', 'depth', 'pid', 'start', 'seconds', 'rows_in', 'rows_out',
+        'peak_mb', 'bytes'])
+
+
+def save_trace(path: str = None):
+    """
+    Save the records kept so far as a JSON trace
+
+    Args:
+        path (str): The file to write
+    """
+
+    with open(path, 'w') as f:
+        json.dump(_STATE['records'], f, indent=2, default=str)
+
+
+def summarize_trace(trace: pd.DataFrame = None):
+    """
+    A function that totals a trace by stage, slowest first.
+
+    Args:
+        trace (pd.DataFrame, optional): A trace, e.g. from get_trace or a trace file
+            read with pd.read_json(path, lines=True). Defaults to get_trace().
+
+    Returns:
+        df (pd.DataFrame): The calls, total and largest seconds, rows and peak memory
+            of each stage
+    """
+
+    if trace is None:
+        trace = get_trace()
+
+    return (
+        trace
+        .groupby('stage', as_index=False)
+        .agg(calls=('seconds', 'size'), seconds=('seconds', 'sum'),
+             max_seconds=('seconds', 'max'), rows_in=('rows_in', 'sum'),
+             rows_out=('rows_out', 'sum'), peak_mb=('peak_mb', 'max'), bytes=('bytes', 'sum'))
+        .sort_values(by='seconds', ascending=False, ignore_index=True)
+    )
+
+
+@contextmanager
+def tracing(path: str = None, memory: bool = False, log: bool = False):
+    """
+    Instrument the stages run inside a with block, then turn instrumentation
+    back off. Takes the same arguments as enable.
+    """
+
+    enable(path=path, memory=memory, log=log)
+
+    try:
+        yield
+    finally:
+        disable()
@@ -0,0 +1,492 @@
+import os
+import math
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+
+# the classic contest rosters: the slots each position must fill, the flex
+# slots any of the flex positions can fill, and the salary cap
+SITE_ROSTERS = {
+    'dk': {
+        'salary_cap': 50000,
+        'slots': {'QB': 1, 'RB': 2, 'WR': 3, 'TE': 1, 'DST': 1},
+        'flex': {'count': 1, 'positions': ['RB', 'WR', 'TE']}
+    },
+    'fd': {
+        'salary_cap': 60000,
+        'slots': {'QB': 1, 'RB': 2, 'WR': 3, 'TE': 1, 'DST': 1},
+        'flex': {'count': 1, 'positions': ['RB', 'WR', 'TE']}
+    }
+}
+
+# the positions that stack with their QB and that bring the stack back from the opponent
+STACK_POSITIONS = ['WR', 'TE']
+BRING_BACK_POSITIONS = ['RB', 'WR', 'TE']
+
+# set in each worker by _init_worker, so the player pool is sent to a worker once
+_POOL = None
+
+
+def _roster_layout(roster: dict = None):
+    """
+    Split the roster into positions filled by exactly one player, solved by
+    picking the best player at each salary, and positions with a range of
+    counts through the flex slots, solved by the knapsack
+    """
+
+    flex = roster.get('flex', {'count': 0, 'positions': []})
+    singles = [pos for pos, count in roster['slots'].items()
+               if count == 1 and pos not in flex['positions']]
+    counts = {pos: (count, count + (flex['count'] if pos in flex['positions'] else 0))
+              for pos, count in roster['slots'].items() if pos not in singles}
+
+    return {'singles': singles, 'counts': counts,
+            'size': sum(roster['slots'].values()) + flex['count']}
+
+
+def _prune(candidates: np.ndarray = None, values: np.ndarray = None, salary: np.ndarray = None,
+           classes: np.ndarray = None, keep_count: np.ndarray = None):
+    """
+    Drop players that can never be chosen: those with at least as many
+    players of their class (position and stack flags) that cost no more and
+    score at least as much as the most that class can fill
+    """
+
+    kept = []
+
+    for cls in np.unique(classes[candidates]):
+        members = candidates[classes[candidates] == cls]
+        members = members[np.lexsort((-values[members], salary[members]))]
+        best = []
+        limit = keep_count[members[0]]
+        for player in members:
+            if sum(value >= values[player] for value in best) < limit:
+                kept.append(player)
+            best = sorted(best + [values[player]], reverse=True)[:limit]
+
+    return np.array(sorted(kept), dtype=np.int64)
+
+
+def _max_plus(group: np.ndarray = None, rest: np.ndarray = None):
+    """
+    Combine the best value of a group at each salary with the best value of
+    the rest of the lineup at each salary
+
+    Returns:
+        tuple: The best combined value at each total salary and the salary
+        given to the group
+    """
+
+    out = np.full_like(rest, -np.inf)
+    split = np.full(len(rest), -1, dtype=np.int64)
+
+    for t in np.flatnonzero(np.isfinite(group)):
+        candidate = group[t] + rest[:len(rest) - t]
+        better = candidate > out[t:]
+        out[t:][better] = candidate[better]
+        split[t:][better] = t
+
+    return out, split
+
+
+def _solve(values: np.ndarray = None, pool: dict = None, allowed: np.ndarray = None,
+           stack_team: int = -1, stack: int = 0, bring_back: int = 0):
+    """
+    Find the lineup with the highest total value, exactly.
+
+    Positions filled by one player keep the best player at each salary.
+    The others are solved by a knapsack over salary units whose state also
+    counts each position, the QB's stacked teammates and the opponents
+    bringing the stack back (both capped at the number required), and the
+    parts are combined by a max-plus convolution over salary.
+
+    Returns:
+        list: The chosen player rows, or None if no legal lineup exists
+    """
+
+    layout = pool['layout']
+    n_units = pool['n_units']
+    position, salary, team, opp = pool['position'], pool['units'], pool['team'], pool['opp']
+
+    candidates = np.flatnonzero(allowed & np.isfinite(values))
+
+    # the single positions, the QB restricted to the stack team
+    singles = []
+    for pos in layout['singles']:
+        members = candidates[position[candidates] == pos]
+        if stack_team >= 0 and pos == 'QB':
+            members = members[team[members] == stack_team]
+        best = np.full(n_units + 1, -np.inf)
+        who = np.full(n_units + 1, -1, dtype=np.int64)
+        for player in members[np.argsort(values[members], kind='stable')]:
+            best[salary[player]] = values[player]
+            who[salary[player]] = player
+        singles.append((best, who))
+
+    flex_positions = list(layout['counts'])
+    stack_cap = stack if stack_team >= 0 else 0
+    back_cap = bring_back if stack_team >= 0 else 0
+
+    members = candidates[np.isin(position[candidates], flex_positions)]
+    if stack_team >= 0:
+        stack_team_opp = opp[np.flatnonzero(team == stack_team)[0]]
+    fa = np.zeros(len(position), dtype=np.int64)
+    fb = np.zeros(len(position), dtype=np.int64)
+    if stack_cap:
+        fa = ((team == stack_team) & np.isin(position, pool['stack_positions'])).astype(np.int64)
+    if back_cap:
+        fb = ((team == stack_team_opp) &
+              np.isin(position, pool['bring_back_positions'])).astype(np.int64)
+
+    keep_count = np.array([layout['counts'].get(pos, (1, 1))[1] for pos in position])
+    classes = np.array([f'{pos}|{a}|{b}' for pos, a, b in zip(position, fa, fb)])
+    members = _prune(members, values, salary, classes, keep_count) if len(members) else members
+
+    shape = tuple(layout['counts'][pos][1] + 1 for pos in flex_positions) + \
+        (stack_cap + 1, back_cap + 1, n_units + 1)
+    dp = np.full(shape, -np.inf)
+    dp[(0,) * (len(shape) - 1)] = 0.
+    took = []
+
+    n_counts = len(flex_positions)
+    for player in members:
+        axis = flex_positions.index(position[player])
+        cost = salary[player]
+        new = dp.copy()
+        codes = np.zeros(shape, dtype=np.int8)
+
+        a_moves = [(slice(None), slice(None), 0)]
+        if fa[player]:
+            a_moves = [(slice(0, stack_cap), slice(1, stack_cap + 1), 0),
+                       (slice(stack_cap, stack_cap + 1), slice(stack_cap, stack_cap + 1), 1)]
+        b_moves = [(slice(None), slice(None), 0)]
+        if fb[player]:
+            b_moves = [(slice(0, back_cap), slice(1, back_cap + 1), 0),
+                       (slice(back_cap, back_cap + 1), slice(back_cap, back_cap + 1), 1)]
+
+        for a_old, a_new, a_code in a_moves:
+            for b_old, b_new, b_code in b_moves:
+                old = [slice(None)] * n_counts + [a_old, b_old, slice(0, n_units + 1 - cost)]
+                target = [slice(None)] * n_counts + [a_new, b_new, slice(cost, n_units + 1)]
+                old[axis] = slice(0, shape[axis] - 1)
+                target[axis] = slice(1, shape[axis])
+
+                candidate = dp[tuple(old)] + values[player]
+                view = new[tuple(target)]
+                better = candidate > view
+                np.copyto(view, candidate, where=better)
+                np.copyto(codes[tuple(target)], 1 + a_code + 2 * b_code, where=better)
+
+        dp = new
+        took.append(codes)
+
+    # the best knapsack value at each salary over the legal position counts
+    base = sum(low for low, _ in layout['counts'].values())
+    flex_count = layout['size'] - len(layout['singles']) - base
+    rest = np.full(n_units + 1, -np.inf)
+    rest_counts = np.full(n_units + 1, -1, dtype=np.int64)
+    combos = [combo for combo in np.ndindex(*shape[:n_counts])
+              if sum(combo) == base + flex_count and
+              all(layout['counts'][pos][0] <= k for pos, k in zip(flex_positions, combo))]
+    for i, combo in enumerate(combos):
+        candidate = dp[combo + (stack_cap, back_cap)]
+        better = candidate > rest
+        rest[better] = candidate[better]
+        rest_counts[better] = i
+
+    splits = []
+    for best, _ in singles:
+        rest, split = _max_plus(best, rest)
+        splits.append(split)
+
+    if not np.isfinite(rest).any():
+        return None
+
+    units = int(np.argmax(rest))
+    lineup = []
+
+    for (best, who), split in zip(reversed(singles), reversed(splits)):
+        t = split[units]
+        lineup.append(int(who[t]))
+        units -= t
+
+    state = list(combos[rest_counts[units]]) + [stack_cap, back_cap, units]
+    for player, codes in zip(reversed(members), reversed(took)):
+        code = codes[tuple(state)]
+        if not code:
+            continue
+        lineup.append(int(player))
+        a_code, b_code = (code - 1) % 2, (code - 1) // 2
+        state[flex_positions.index(position[player])] -= 1
+        state[n_counts] -= fa[player] if a_code == 0 else 0
+        state[n_counts + 1] -= fb[player] if b_code == 0 else 0
+        state[n_counts + 2] -= salary[player]
+
+    return sorted(lineup)
+
+
+def _best_lineup(values: np.ndarray = None, pool: dict = None, allowed: np.ndarray = None,
+                 stack: int = 0, bring_back: int = 0):
+    """
+    The best lineup over every possible stack team, or without a stack
+    """
+
+    if not stack and not bring_back:
+        return _solve(values, pool, allowed)
+
+    qbs = np.flatnonzero(allowed & (pool['position'] == 'QB') & np.isfinite(values))
+
+    # the best lineup with a team's QB but no stack bounds that team's stacked
+    # lineup, so teams are tried best bound first until no bound can win
+    bounds = []
+    for stack_team in np.unique(pool['team'][qbs]):
+        lineup = _solve(values, pool, allowed, stack_team)
+        if lineup is not None:
+            bounds.append((values[lineup].sum(), stack_team))
+
+    best, best_value = None, -np.inf
+    for bound, stack_team in sorted(bounds, key=lambda item: -item[0]):
+        if bound <= best_value:
+            break
+        lineup = _solve(values, pool, allowed, stack_team, stack, bring_back)
+        if lineup is not None and values[lineup].sum() > best_value:
+            best, best_value = lineup, values[lineup].sum()
+
+    return best
+
+
+def _init_worker(pool: dict = None):
+    """
+    Keep the player pool in the worker for every search it runs
+    """
+
+    global _POOL
+    _POOL = pool
+
+
+def _run_search(args: tuple = None):
+    """
+    Run one lineup search in a worker
+    """
+
+    values, allowed, stack, bring_back = args
+    return _best_lineup(values, _POOL, allowed, stack, bring_back)
+
+
+def _build_pool(players: pd.DataFrame = None, roster: dict = None):
+    """
+    The arrays of the player pool that every search needs
+    """
+
+    units = math.gcd(*players['salary'].astype(int).tolist(), int(roster['salary_cap']))
+    team_codes, teams = pd.factorize(pd.concat([players['team'], players.get(
+        'opp', pd.Series(dtype=object))]))
+
+    return {
+        'layout': _roster_layout(roster),
+        'n_units': int(roster['salary_cap']) // units,
+        'units': (players['salary'].astype(int) // units).to_numpy(),
+        'position': players['position'].to_numpy(dtype=object),
+        'team': team_codes[:len(players)],
+        'opp': (team_codes[len(players):] if 'opp' in players.columns
+                else np.full(len(players), -1)),
+        'stack_positions': STACK_POSITIONS,
+        'bring_back_positions': BRING_BACK_POSITIONS
+    }
+
+
+def _lineup_points(lineups: list = None, sims: np.ndarray = None):
+    """
+    The total points of each lineup in each simulation
+    """
+
+    return np.stack([sims[list(lineup)].sum(axis=0, dtype=np.float64) for lineup in lineups])
+
+
+def score_lineups(totals: np.ndarray = None, objective: str = 'mean', target: float = None,
+                  payouts: list = None):
+    """
+    A function that scores lineups by their simulated totals.
+
+    Args:
+        totals (np.ndarray): The (lineups, simulations) total points
+        objective (str, optional): 'mean', 'hit_rate' (the share of simulations
+            reaching target) or 'payout' (the mean prize). Defaults to 'mean'.
+        target (float, optional): The points a lineup must reach for 'hit_rate'.
+        payouts (list, optional): (min_points, prize) pairs for 'payout'; a lineup
+            wins the prize of the highest min_points it reaches.
+
+    Returns:
+        np.ndarray: The objective of each lineup
+    """
+
+    if objective == 'mean':
+        return totals.mean(axis=1)
+
+    if objective == 'hit_rate':
+        return (totals >= target).mean(axis=1)
+
+    if objective == 'payout':
+        payouts = sorted(payouts)
+        thresholds = np.array([points for points, _ in payouts], dtype=np.float64)
+        prizes = np.r_[0., [prize for _, prize in payouts]]
+        return prizes[np.searchsorted(thresholds, totals, side='right')].mean(axis=1)
+
+    raise ValueError(f'unknown objective {objective}, expected mean, hit_rate or payout')
+
+
+def _assign_slots(lineup: list = None, players: pd.DataFrame = None, roster: dict = None):
+    """
+    Put each chosen player in a roster slot, the extra flex players last
+    """
+
+    slots = {}
+    remaining = list(lineup)
+
+    for pos, count in roster['slots'].items():
+        matching = [row for row in remaining if players['position'].iat[row] == pos]
+        matching = sorted(matching, key=lambda row: -players['salary'].iat[row])[:count]
+        for i, row in enumerate(matching):
+            slots[pos if count == 1 else f'{pos}{i + 1}'] = players['player_id'].iat[row]
+            remaining.remove(row)
+
+    for i, row in enumerate(remaining):
+        slots['FLEX' if len(remaining) == 1 else f'FLEX{i + 1}'] = players['player_id'].iat[row]
+
+    return slots
+
+
+def build_lineups(players: pd.DataFrame = None, sims: np.ndarray = None, n_lineups: int = 150,
+                  site: str = 'dk', objective: str = 'mean', target: float = None,
+                  payouts: list = None, max_exposure=0.5, stack: int = 1,
+                  bring_back: int = 0, min_unique: int = 1, n_candidates: int = None,
+                  sample_size: int = 50, max_rounds: int = 10, n_jobs: int = None,
+                  seed: int = 0):
+    """
+    A function that builds diversified DFS lineups from simulated fantasy points.
+
+    Each candidate lineup is the exact best lineup for the mean points of a
+    random sample of the simulations, so candidates follow the correlated
+    outcomes the simulations contain; the first candidate uses every
+    simulation. The searches are independent and run on a process pool.
+    Candidates are then scored over all simulations and added best first,
+    skipping any that would push a player past his exposure limit or that
+    share too many players with a lineup already chosen. Players at their
+    limit are excluded from the next round of searches.
+
+    Args:
+        players (pd.DataFrame): One row per player with player_id, position, team,
+            salary and, for bring_back, opp (the opposing team)
+        sims (np.ndarray): The (players, simulations) fantasy points, e.g. from simulate_slate
+        n_lineups (int, optional): The number of lineups. Defaults to 150.
+        site (str, optional): The roster rules, 'dk' or 'fd'. Defaults to 'dk'.
+        objective (str, optional): 'mean', 'hit_rate' or 'payout', see score_lineups.
+            Defaults to 'mean'.
+        target (float, optional): The points to reach for 'hit_rate'. Defaults to the
+            99th percentile of the first candidate's totals.
+        payouts (list, optional): (min_points, prize) pairs for 'payout'.
+        max_exposure (float or dict, optional): The largest share of lineups a player
+            may be in, or a mapping of player_id to that share. Defaults to 0.5.
+        stack (int, optional): The QB's teammates (WR/TE) each lineup needs. Defaults to 1.
+        bring_back (int, optional): The opponents of the stack each lineup needs.
+            Defaults to 0.
+        min_unique (int, optional): The players each lineup must not share with every
+            other lineup. Defaults to 1.
+        n_candidates (int, optional): The searches per round. Defaults to 3 * n_lineups.
+        sample_size (int, optional): The simulations each search averages. Defaults to 50.
+        max_rounds (int, optional): The most rounds of searches. Defaults to 10.
+        n_jobs (int, optional): The number of processes. Defaults to every core.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        df (pd.DataFrame): One row per lineup with the player_id in each slot, its
+            salary, mean points and, unless 'mean', objective, best first
+    """
+
+    roster = SITE_ROSTERS[site]
+    players = players.reset_index(drop=True)
+    pool = _build_pool(players, roster)
+    rng = np.random.default_rng(seed)
+
+    if n_candidates is None:
+        n_candidates = 3 * n_lineups
+
+    if isinstance(max_exposure, dict):
+        limits = players['player_id'].map(max_exposure).fillna(1.).to_numpy()
+    else:
+        limits = np.full(len(players), float(max_exposure))
+    max_count = np.floor(limits * n_lineups + 1e-9).astype(int)
+
+    mean_points = sims.mean(axis=1)
+    chosen, chosen_sets = [], []
+    exposure = np.zeros(len(players), dtype=int)
+    seen = set()
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    executor = (ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                    initargs=(pool,)) if n_jobs > 1 else None)
+
+    try:
+        for round_number in range(max_rounds):
+            if len(chosen) >= n_lineups:
+                break
+
+            allowed = exposure < max_count
+            tasks = []
+            for i in range(n_candidates):
+                if round_number == 0 and i == 0:
+                    values = mean_points
+                else:
+                    sample = rng.integers(0, sims.shape[1], size=sample_size)
+                    values = sims[:, sample].mean(axis=1, dtype=np.float64)
+                tasks.append((values, allowed, stack, bring_back))
+
+            if executor is None:
+                results = [_best_lineup(values, pool, mask, s, b) for values, mask, s, b in tasks]
+            else:
+                results = list(executor.map(_run_search, tasks, chunksize=4))
+
+            candidates = []
+            for lineup in results:
+                if lineup is not None and tuple(lineup) not in seen:
+                    seen.add(tuple(lineup))
+                    candidates.append(lineup)
+
+            if not candidates:
+                break
+
+            totals = _lineup_points(candidates, sims)
+            if objective == 'hit_rate' and target is None:
+                target = float(np.percentile(totals[0], 99))
+            scores = score_lineups(totals, objective, target=target, payouts=payouts)
+
+            for i in np.argsort(-scores, kind='stable'):
+                if len(chosen) >= n_lineups:
+                    break
+                lineup = candidates[i]
+                if (exposure[lineup] >= max_count[lineup]).any():
+                    continue
+                lineup_set = set(lineup)
+                if any(len(lineup_set - other) < min_unique for other in chosen_sets):
+                    continue
+                chosen.append((lineup, scores[i], totals[i].mean()))
+                chosen_sets.append(lineup_set)
+                exposure[lineup] += 1
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    rows = []
+    for lineup, score, mean in chosen:
+        rows.append({
+            **_assign_slots(lineup, players, roster),
+            'salary': int(players['salary'].iloc[lineup].sum()),
+            'mean_points': mean,
+            **({objective: score} if objective != 'mean' else {})
+        })
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,157 @@
+import pandas as pd
+import numpy as np
+
+
+class PbpFrame:
+    """
+    A play-by-play container that factorizes group keys once and shares
+    the resulting integer codes between the pbp_utils aggregators.
+
+    Each key column (game_id, posteam, defteam, player ids, ...) is hashed
+    a single time into sorted integer codes. Combinations of keys are then
+    mapped to dense group ids in sorted key order, so aggregating over a
+    group only has to work on integers rather than re-hashing strings.
+
+    Args:
+        df (pd.DataFrame): A dataframe of play-by-play data
+    """
+
+    def __init__(self, df: pd.DataFrame = None):
+        self.df = df
+        self._codes = {}
+        self._groups = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self, key):
+        return self.df[key]
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def codes(self, col: str = None):
+        """
+        Get the factorized codes for a single key column
+
+        Args:
+            col (str): The name of the key column
+
+        Returns:
+            tuple: An array of integer codes (-1 for missing values) and
+            the sorted unique values they index into
+        """
+
+        if col not in self._codes:
+            self._codes[col] = pd.factorize(self.df[col], sort=True)
+
+        return self._codes[col]
+
+    def groups(self, keys: list = None):
+        """
+        Get the dense group ids for a combination of key columns
+
+        Args:
+            keys (list): The key columns to group by
+
+        Returns:
+            tuple: The group id of each row (-1 where any key is missing),
+            a dataframe with the key values of each group, the start offset
+            of each group in `order` and `order`, the row positions sorted
+            by group id
+        """
+
+        keys = tuple(keys)
+
+        if keys not in self._groups:
+            combined = np.zeros(len(self.df), dtype=np.int64)
+            valid = np.ones(len(self.df), dtype=bool)
+            sizes = []
+
+            for col in keys:
+                codes, uniques = self.codes(col)
+                combined = combined * len(uniques) + codes
+                valid &= codes >= 0
+                sizes.append(len(uniques))
+
+            uniq, inverse = np.unique(combined[valid], return_inverse=True)
+            ids = np.full(len(self.df), -1, dtype=np.int64)
+            ids[valid] = inverse
+
+            # decoding the combined codes back into one code per key column
+            key_values = {}
+            remainder = uniq
+            for col, size in zip(reversed(keys), reversed(sizes)):
+                remainder, code = np.divmod(remainder, size)
+                key_values[col] = self.codes(col)[1].take(code)
+
+            key_df = pd.DataFrame({col: key_values[col] for col in keys})
+
+            order = np.argsort(ids, kind='stable')
+            order = order[np.count_nonzero(~valid):]
+            starts = np.searchsorted(ids[order], np.arange(len(uniq)))
+
+            self._groups[keys] = (ids, key_df, starts, order)
+
+        return self._groups[keys]
+
+    def agg(self, keys: list = None, spec: dict = None, mask=None):
+        """
+        Aggregate play-by-play columns over a combination of key columns.
+
+        Produces the same result as `df[mask].groupby(keys, as_index=False)
+        .agg(spec)`, with the keys taken from the shared factorization. The
+        special aggregation 'first_seen' returns each group's first value,
+        including missing values, like `lambda x: x.unique()[0]`.
+
+        Args:
+            keys (list): The key columns to group by
+            spec (dict): A mapping of column name to aggregation
+            mask (array-like, optional): A boolean row filter. Defaults to None.
+
+        Returns:
+            df (pd.DataFrame): A dataframe with one row per observed group
+        """
+
+        ids, key_df, _, _ = self.groups(keys)
+
+        if mask is not None:
+            ids = np.where(np.asarray(mask, dtype=bool), ids, -1)
+
+        rows = np.flatnonzero(ids >= 0)
+        ids = ids[rows]
+        present, first_rows = np.unique(ids, return_index=True)
+
+        result = key_df.take(present).reset_index(drop=True)
+        sub = self.df[list(spec)].take(rows).reset_index(drop=True)
+
+        cython_spec = {col: how for col, how in spec.items()
+                       if how != 'first_seen'}
+        if cython_spec:
+            aggregated = sub.groupby(ids, sort=True).agg(cython_spec)
+
+        for col, how in spec.items():
+            if how == 'first_seen':
+                result[col] = sub[col].take(first_rows).array
+            else:
+                result[col] = aggregated[col].array
+
+        return result
+
+
+def as_pbp_frame(df=None):
+    """
+    Wrap play-by-play data in a PbpFrame unless it already is one
+
+    Args:
+        df (pd.DataFrame or PbpFrame): Play-by-play data
+
+    Returns:
+        PbpFrame: The shared play-by-play container
+    """
+
+    if isinstance(df, PbpFrame):
+        return df
+
+    return PbpFrame(df)
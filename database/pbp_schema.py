@@ -0,0 +1,154 @@
+import pandas as pd
+import numpy as np
+
+
+# 0/1 indicator columns from nflfastR, stored as int8 when they have no missing values
+FLAG_COLUMNS = [
+    'pass_attempt', 'rush_attempt', 'sack', 'touchdown', 'interception',
+    'complete_pass', 'incomplete_pass', 'qb_dropback', 'qb_kneel', 'qb_spike',
+    'qb_scramble', 'success', 'fumble', 'fumble_lost', 'fumble_forced',
+    'fumble_not_forced', 'fumble_out_of_bounds', 'return_touchdown', 'safety',
+    'two_point_attempt', 'field_goal_attempt', 'extra_point_attempt',
+    'kickoff_attempt', 'punt_attempt', 'first_down', 'first_down_rush',
+    'first_down_pass', 'first_down_penalty', 'third_down_converted',
+    'third_down_failed', 'fourth_down_converted', 'fourth_down_failed',
+    'penalty', 'tackled_for_loss', 'pass_touchdown', 'rush_touchdown',
+    'punt_blocked', 'shotgun', 'no_huddle', 'goal_to_go', 'aborted_play',
+    'special_teams_play', 'out_of_bounds', 'replay_or_challenge'
+]
+
+# columns holding team abbreviations, which share a single categorical dtype
+TEAM_COLUMNS = ['posteam', 'defteam', 'home_team', 'away_team', 'side_of_field',
+                'td_team', 'timeout_team', 'return_team', 'penalty_team']
+
+CATEGORY_COLUMNS = ['game_id', 'play_type', 'play_type_nfl', 'season_type',
+                    'passer', 'passer_id', 'rusher', 'rusher_id', 'receiver',
+                    'receiver_id', 'fantasy', 'fantasy_id', 'name', 'id']
+
+# play types process_pbp can assign that may not appear in the raw data
+EXTRA_PLAY_TYPES = ['two_point_att']
+
+
+def _is_player_column(col: str = None):
+    """
+    Whether a column holds player ids or names
+    """
+
+    return col.endswith('_player_id') or col.endswith('_player_name')
+
+
+def _categorical(values: list = None):
+    """
+    An ordered categorical dtype over the sorted values, so grouping,
+    min and max behave the same as on the original strings
+    """
+
+    return pd.CategoricalDtype(sorted(set(values)), ordered=True)
+
+
+def get_pbp_schema(df: pd.DataFrame = None):
+    """
+    Get the compact dtype of each column of a play-by-play dataframe.
+
+    Flags without missing values become int8, other floats become float32,
+    integers are downcast and team, play type, game and player columns become
+    ordered categoricals. All team columns share one dtype so they can still
+    be compared with each other.
+
+    Args:
+        df (pd.DataFrame): A dataframe of play-by-play data
+
+    Returns:
+        dict: A mapping of column name to compact dtype
+    """
+
+    schema = {}
+
+    team_cols = [col for col in TEAM_COLUMNS if col in df.columns]
+    if team_cols:
+        teams = pd.unique(df[team_cols].to_numpy().ravel())
+        team_dtype = _categorical(x for x in teams if isinstance(x, str))
+
+    for col in df.columns:
+        values = df[col]
+
+        if col in team_cols:
+            schema[col] = team_dtype
+
+        elif col in CATEGORY_COLUMNS or _is_player_column(col):
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                continue
+            if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+                continue
+            extra = EXTRA_PLAY_TYPES if col == 'play_type' else []
+            schema[col] = _categorical(
+                [x for x in values.dropna().unique() if isinstance(x, str)] + extra)
+
+        elif col in FLAG_COLUMNS and pd.api.types.is_numeric_dtype(values):
+            schema[col] = np.int8 if values.notna().all() else np.float32
+
+        elif pd.api.types.is_float_dtype(values):
+            schema[col] = np.float32
+
+        elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            schema[col] = pd.to_numeric(values, downcast='integer').dtype
+
+    return schema
+
+
+def compact_pbp(df: pd.DataFrame = None, schema: dict = None, inplace: bool = False):
+    """
+    Convert a play-by-play dataframe to compact dtypes.
+
+    Args:
+        df (pd.DataFrame): A dataframe of play-by-play data
+        schema (dict, optional): Column dtypes to use, as returned by
+            get_pbp_schema. Defaults to the schema of df.
+        inplace (bool, optional): Whether to replace the columns of df itself,
+            releasing each original column as it is converted. Defaults to False.
+
+    Returns:
+        df (pd.DataFrame): The play-by-play data with compact dtypes
+    """
+
+    if schema is None:
+        schema = get_pbp_schema(df)
+
+    if not inplace:
+        df = df.copy(deep=False)
+
+    for col, dtype in schema.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def memory_report(before: pd.DataFrame = None, after: pd.DataFrame = None):
+    """
+    Compare the memory usage of each column before and after compaction
+
+    Args:
+        before (pd.DataFrame): The original dataframe
+        after (pd.DataFrame): The compacted dataframe
+
+    Returns:
+        df (pd.DataFrame): A dataframe with the dtype and bytes of each column
+        before and after, sorted by the bytes saved, with a total row
+    """
+
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'bytes_after': after.memory_usage(index=False, deep=True)
+    })
+
+    report['bytes_saved'] = report['bytes_before'].sub(report['bytes_after'])
+    report = report.sort_values(by='bytes_saved', ascending=False)
+
+    report.loc['total'] = ['', '', report['bytes_before'].sum(),
+                           report['bytes_after'].sum(), report['bytes_saved'].sum()]
+    report['ratio'] = report['bytes_after'].div(report['bytes_before']).round(3)
+
+    return report
@@ -2,101 +2,193 @@
 import pandas as pd
 import numpy as np
 
-
-def get_qb_pass(df: pd.DataFrame = None):
+from .pbp_frame import as_pbp_frame
+from .instrumentation import instrumented
+
+
+# display names only. to join players across sources use the player_key
+# of player_index, which resolves these spellings through the gsis id
+QB_NAME_FIXES = {
+    'Ty.Taylor': 'T.Taylor',
+    'Aa.Rodgers': 'A.Rodgers',
+    'Alex Smith': 'A.Smith',
+    'Jos.Smith': 'J.Smith'
+}
+
+# the play-by-play columns each function reads. the aggregators read the
+# output of process_pbp, so some of their columns are made by process_pbp
+PBP_COLUMNS = {
+    'process_pbp': ['game_id', 'game_date', 'two_point_conv_result', 'spread_line',
+                    'field_goal_result', 'game_seconds_remaining', 'play_type',
+                    'two_point_attempt', 'air_yards', 'ydstogo', 'blocked_player_name',
+                    'kick_distance', 'extra_point_result'],
+    'get_qb_pass': ['game_id', 'passer_player_name', 'passer_player_id', 'posteam', 'play_type',
+                    'pass_attempt', 'sack', 'interception', 'complete_pass', 'yards_gained',
+                    'air_yards', 'yards_after_catch', 'air_yards_to_sticks', 'success', 'epa',
+                    'cpoe', 'total_line', 'temp', 'wind', 'touchdown', 'season_type',
+                    'home_team', 'away_team'],
+    'get_rushing': ['game_id', 'rusher_player_id', 'rusher_player_name', 'posteam',
+                    'rush_attempt', 'yards_gained', 'success', 'touchdown', 'total_line', 'epa',
+                    'fumble_lost', 'home_team', 'away_team'],
+    'get_receiving': ['game_id', 'receiver_player_id', 'receiver_player_name', 'posteam',
+                      'qb_dropback', 'pass_attempt', 'complete_pass', 'air_yards',
+                      'yards_after_catch', 'yards_gained', 'touchdown'],
+    'get_opp_pass': ['game_id', 'defteam', 'pass_attempt', 'yards_gained'],
+    'get_opp_rush': ['game_id', 'defteam', 'rush_attempt', 'yards_gained'],
+    'get_def_stats': ['game_id', 'defteam', 'desc', 'interception', 'season', 'return_touchdown',
+                      'fumble_lost', 'sack', 'safety', 'blocked_player_name'],
+    'get_kicker_stats': ['game_id', 'kicker_player_id', 'kicker_player_name', 'posteam', 'desc',
+                         'play_type', 'field_goal_result', 'extra_point_result', 'fg_0_39',
+                         'fg_40_49', 'fg_50_on'],
+    'get_team_adjusted_epa': ['game_id', 'season', 'posteam', 'defteam', 'epa', 'play_type'],
+    'get_team_epa_state': ['season', 'posteam', 'defteam', 'epa', 'play_type'],
+    'get_team_pass_yds': ['game_id', 'posteam', 'pass_attempt', 'yards_gained'],
+    'get_team_rush_yds': ['game_id', 'posteam', 'rush_attempt', 'yards_gained'],
+    'get_team_scores': ['game_id', 'posteam', 'td_team', 'touchdown', 'field_goal_result',
+                        'two_point_conv_result'],
+    'get_game_results': ['game_id', 'posteam', 'year', 'week', 'season_type', 'home_team',
+                         'away_team', 'home_score', 'away_score', 'spread_line', 'total_line'],
+    'get_drive_stats': ['game_id', 'posteam', 'drive', 'time_between', 'score_differential',
+                        'score_differential_post', 'rush_attempt', 'pass_attempt',
+                        'yards_gained', 'interception', 'fumble', 'sack', 'success', 'epa']
+}
+
+# the columns process_pbp adds, so they are never read from the raw files
+PROCESSED_COLUMNS = ['year', 'season', 'time_between', 'air_yards_to_sticks', 'fg_0_39',
+                     'fg_40_49', 'fg_50_on']
+
+
+def get_required_columns(funcs: list = None):
     """
-    Get QB passing stats from raw play-by-play data
+    A function that returns the raw play-by-play columns needed to run
+    process_pbp and then each of funcs, so a loader can read nothing else.
 
     Args:
-        df (pd.DataFrame): Must be a pandas dataframe with play by play data
+        funcs (list): The functions, or their names, as in PBP_COLUMNS
 
     Returns:
-        df: Pandas dataframe with QB passing statistics
+        list: The columns, in the order they are first needed
     """
-    qb_df = (
-        df.loc[((df['pass_attempt'] == 1) & (
-            ~df['play_type'].isin(['two_point_att']) & (df['sack'] == 0)))]
-        .groupby(['game_id', 'passer_player_name', 'posteam'], as_index=False)
-        .agg({
-            'passer_player_id': lambda x: x.unique()[0],
-            'season_type': lambda x: x.unique()[0],
-            'pass_attempt': 'sum',
-            'complete_pass': 'sum',
-            'yards_gained': 'sum',
-            'air_yards': 'sum',
-            'yards_after_catch': 'sum',
-            'air_yards_to_sticks': 'sum',
-            'interception': 'sum',
-            'total_line': 'max',
-            'home_team': lambda x: x.unique()[0],
-            'away_team': lambda x: x.unique()[0],
-            'success': 'sum',
-            'temp': 'max',
-            'wind': 'max',
-            'epa': 'sum',
-            'cpoe': 'sum'
-        })
-    )
 
-    qb_df.rename(
-        columns={
-            'passer_player_name': 'player',
-            'passer_player_id': 'player_id',
-            'pass_attempt': 'att',
-            'complete_pass': 'com',
-            'yards_gained': 'pass_yards',
-            'posteam': 'team',
-            'air_yards_to_sticks': 'AYTS'},
-        inplace=True)
+    columns = []
 
-    sacks = (
-        df.groupby(['game_id', 'posteam', 'passer_player_name'],
-                   as_index=False)['sack']
-        .sum()
-        .rename(columns={'passer_player_name': 'player',
-                         'posteam': 'team'})
-    )
+    for func in ['process_pbp'] + list(funcs):
+        name = func if isinstance(func, str) else func.__name__
+        if name not in PBP_COLUMNS:
+            raise ValueError(f'no column requirements for {name}, add them to PBP_COLUMNS')
+        for col in PBP_COLUMNS[name]:
+            if col not in columns and col not in PROCESSED_COLUMNS:
+                columns.append(col)
 
-    qb_df = qb_df.merge(sacks, how='left', on=['game_id', 'team', 'player'])
-    qb_df['att'] = qb_df['att'].add(qb_df['sack'])
-    qb_df['comp_perc'] = qb_df['com'].div(qb_df['att']).round(3) * 100
+    return columns
 
-    qb_td = (
-        df.loc[((df['pass_attempt'] == 1) & (~df['play_type'].isin(
-            ['two_point_att']) & (df['sack'] == 0) & (df['interception'] == 0)))]
-        .groupby(['game_id', 'passer_player_id'], as_index=False)['touchdown']
-        .sum()
-        .rename(columns={'passer_player_id': 'player_id'})
-    )
 
-    qb_df = qb_df.merge(qb_td, how='left', on=['game_id', 'player_id'])
+def _masked(values: pd.Series = None, mask: pd.Series = None):
+    """
+    Mask out the values of a column that fall outside a condition. Float
+    columns are masked with NaN so grouped sums and maxes skip them, other
+    columns are masked with 0 so they keep their dtype.
+    """
 
-    ay_complete = (
-        df[df['complete_pass'] == 1]
-        .groupby(['game_id', 'posteam', 'passer_player_name'], as_index=False)['air_yards']
-        .sum()
-        .rename(columns={
-            'air_yards': 'ay_completions',
-            'passer_player_name': 'player',
-            'posteam': 'team'})
-    )
+    if pd.api.types.is_float_dtype(values):
+        return values.where(mask)
 
-    ay_incomplete = (
-        df[((df['complete_pass'] == 0) & (df['play_type'] != 'two_point_att'))]
-        .groupby(['game_id', 'posteam', 'passer_player_name', 'complete_pass'], as_index=False)['air_yards']
-        .sum()
-        .rename(columns={
-            'passer_player_name': 'player',
-            'air_yards': 'ay_incompletions',
-            'posteam': 'team'
-        })
+    return values.where(mask, 0)
+
+
+@instrumented
+def get_qb_pass(df: pd.DataFrame = None):
+    """
+    Get QB passing stats from raw play-by-play data
+
+    Every statistic is computed in a single grouped pass over
+    (game_id, passer_player_name, posteam), with each conditional sum taken
+    over a masked copy of its column rather than a separate groupby and merge.
+
+    Args:
+        df (pd.DataFrame): Must be a pandas dataframe or PbpFrame with play by play data
+
+    Returns:
+        df: Pandas dataframe with QB passing statistics
+    """
+    pbp = as_pbp_frame(df)
+    df = pbp.df
+
+    ids, key_df, _, _ = pbp.groups(['game_id', 'passer_player_name', 'posteam'])
+    rows = np.flatnonzero(ids >= 0)
+    ids = ids[rows]
+    df = df.take(rows).reset_index(drop=True)
+
+    not_two_point = ~df['play_type'].isin(['two_point_att'])
+    dropback = (df['pass_attempt'] == 1) & not_two_point & (df['sack'] == 0)
+    td_play = dropback & (df['interception'] == 0)
+    completion = df['complete_pass'] == 1
+    incompletion = (df['complete_pass'] == 0) & (df['play_type'] != 'two_point_att')
+
+    sum_cols = ['pass_attempt', 'complete_pass', 'yards_gained', 'air_yards',
+                'yards_after_catch', 'air_yards_to_sticks', 'interception',
+                'success', 'epa', 'cpoe']
+    max_cols = ['total_line', 'temp', 'wind']
+
+    masked = pd.DataFrame({
+        **{col: _masked(df[col], dropback) for col in sum_cols + max_cols},
+        'sack': df['sack'],
+        'touchdown': _masked(df['touchdown'], td_play),
+        'ay_completions': _masked(df['air_yards'], completion),
+        'ay_incompletions': _masked(df['air_yards'], incompletion),
+        'dropbacks': dropback.astype(int),
+        'td_plays': td_play.astype(int),
+        'completions': completion.astype(int),
+        'incompletions': incompletion.astype(int)
+    })
+
+    sums = (
+        masked
+        .groupby(ids, sort=True)
+        .agg({col: 'max' if col in max_cols else 'sum' for col in masked.columns})
     )
 
-    qb_df = qb_df.merge(ay_complete, how='left', on=[
-                        'game_id', 'team', 'player'])
+    # only passers with at least one dropback make it into the box score
+    sums = sums[sums['dropbacks'] > 0]
+    keys = key_df.take(sums.index).reset_index(drop=True)
+    sums = sums.reset_index(drop=True)
+
+    dropback_rows = np.flatnonzero(dropback)
+    _, first_rows = np.unique(ids[dropback_rows], return_index=True)
+    first_seen = df.take(dropback_rows[first_rows]).reset_index(drop=True)
+
+    # conditional sums over no plays are missing, as a left merge would leave them
+    qb_df = pd.DataFrame({
+        'game_id': keys['game_id'],
+        'player': keys['passer_player_name'],
+        'team': keys['posteam'],
+        'player_id': first_seen['passer_player_id'],
+        'season_type': first_seen['season_type'],
+        'att': sums['pass_attempt'],
+        'com': sums['complete_pass'],
+        'pass_yards': sums['yards_gained'],
+        'air_yards': sums['air_yards'],
+        'yards_after_catch': sums['yards_after_catch'],
+        'AYTS': sums['air_yards_to_sticks'],
+        'interception': sums['interception'],
+        'total_line': sums['total_line'],
+        'home_team': first_seen['home_team'],
+        'away_team': first_seen['away_team'],
+        'success': sums['success'],
+        'temp': sums['temp'],
+        'wind': sums['wind'],
+        'epa': sums['epa'],
+        'cpoe': sums['cpoe'],
+        'sack': sums['sack'],
+        'touchdown': sums['touchdown'].where(sums['td_plays'] > 0),
+        'ay_completions': sums['ay_completions'].where(sums['completions'] > 0),
+        'complete_pass': np.where(sums['incompletions'] > 0, 0.0, np.nan),
+        'ay_incompletions': sums['ay_incompletions'].where(sums['incompletions'] > 0)
+    })
+
+    qb_df['att'] = qb_df['att'].add(qb_df['sack'])
+    qb_df['comp_perc'] = qb_df['com'].div(qb_df['att']).round(3) * 100
     qb_df['avg_ay_comp'] = qb_df['ay_completions'].div(qb_df['com']).round(1)
-    qb_df = qb_df.merge(ay_incomplete, how='left', on=[
-                        'game_id', 'team', 'player'])
     qb_df['avg_ay_incomp'] = qb_df['ay_incompletions'].div(
         qb_df['att'] - qb_df['com']).round(1)
     qb_df['att'] = qb_df['att'].sub(qb_df['sack'])
@@ -104,56 +196,53 @@ def get_qb_pass(df: pd.DataFrame = None):
     qb_df['epa_per_dropback'] = qb_df['epa'].div(
         qb_df['att'] + qb_df['sack']).round(3)
 
-    # fixing qb names
-
-    qb_df['player'].replace('Ty.Taylor', 'T.Taylor', inplace=True)
-    qb_df['player'].replace('Aa.Rodgers', 'A.Rodgers', inplace=True)
-    qb_df['player'].replace('Alex Smith', 'A.Smith', inplace=True)
-    qb_df['player'].replace('Jos.Smith', 'J.Smith', inplace=True)
-
-    qb_dict = {x: x.split('.') for x in qb_df['player'].unique()}
-
-    new_values = []
+    qb_df = qb_df[
+        ['game_id', 'player', 'team', 'player_id', 'season_type', 'att', 'com',
+         'pass_yards', 'air_yards', 'yards_after_catch', 'AYTS', 'interception',
+         'total_line', 'home_team', 'away_team', 'success', 'temp', 'wind', 'epa',
+         'cpoe', 'sack', 'comp_perc', 'touchdown', 'ay_completions', 'avg_ay_comp',
+         'complete_pass', 'ay_incompletions', 'avg_ay_incomp', 'epa_per_dropback']
+    ].copy()
 
-    for values in qb_dict.values():
-        new_last = values[1].lstrip()
-        new_values.append('.'.join([values[0], new_last]))
+    # fixing qb names, keeping the first initial and the first last name part
 
-    new_qb_dict = {k: v for k, v in zip(qb_dict.keys(), new_values)}
-    qb_df['player'] = qb_df['player'].map(new_qb_dict).fillna(qb_df['player'])
+    qb_df['player'] = (
+        qb_df['player']
+        .replace(QB_NAME_FIXES)
+        .str.replace(r'^([^.]*)\.\s*([^.]*).*$', r'\1.\2', regex=True)
+    )
 
     return qb_df
 
 
+@instrumented
 def get_rushing(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of rushing stats
 
     Args:
-        df (pd.DataFrame): Must be a dataframe of play-by-play data
+        df (pd.DataFrame): Must be a dataframe or PbpFrame of play-by-play data
 
     Returns:
         df (pd.DataFrame): A dataframe of each player's rushing stats
     """
+    pbp = as_pbp_frame(df)
 
-    run_df = (
-        df[df['rush_attempt'] == 1]
-        .groupby(['game_id', 'rusher_player_id', 'posteam'])
-        .agg({
+    run_df = pbp.agg(
+        ['game_id', 'rusher_player_id', 'posteam'],
+        {
             'rush_attempt': 'sum',
-            'rusher_player_name': lambda x: x.unique()[0],
+            'rusher_player_name': 'first_seen',
             'yards_gained': 'sum',
             'success': 'sum',
             'touchdown': 'sum',
             'total_line': 'mean',
             'epa': 'sum',
             'fumble_lost': 'sum',
-            'home_team': lambda x: x.unique()[0],
-            'away_team': lambda x: x.unique()[0]
-        })
-        .sort_index()
-        .reset_index()
-    )
+            'home_team': 'first_seen',
+            'away_team': 'first_seen'
+        },
+        mask=pbp['rush_attempt'] == 1)
 
     run_df.rename(
         columns={
@@ -177,21 +266,22 @@ def get_rushing(df: pd.DataFrame = None):
     return run_df
 
 
+@instrumented
 def get_opp_pass(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of opponent passing stats
 
     Args:
-        df (pd.DataFrame,): A dataframe of play-by-play data
+        df (pd.DataFrame,): A dataframe or PbpFrame of play-by-play data
 
     Returns:
         df: A dataframe of each team's opponent's passing stats
     """
+    pbp = as_pbp_frame(df)
 
     opp_pass = (
-        df[df['pass_attempt'] == 1]
-        .groupby(['game_id', 'defteam'], as_index=False)['yards_gained']
-        .sum()
+        pbp.agg(['game_id', 'defteam'], {'yards_gained': 'sum'},
+                mask=pbp['pass_attempt'] == 1)
         .rename(columns={'defteam': 'team',
                          'yards_gained': 'opp_pass_yds'})
     )
@@ -199,21 +289,22 @@ def get_opp_pass(df: pd.DataFrame = None):
     return opp_pass
 
 
+@instrumented
 def get_opp_rush(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of opponent rushing stats
 
     Args:
-        df (pd.DataFrame): A dataframe of play-by-play data
+        df (pd.DataFrame): A dataframe or PbpFrame of play-by-play data
 
     Returns:
         df: A dataframe of each team's opponent's rushing stats
     """
+    pbp = as_pbp_frame(df)
 
     opp_rush = (
-        df[df['rush_attempt'] == 1]
-        .groupby(['game_id', 'defteam'], as_index=False)['yards_gained']
-        .sum()
+        pbp.agg(['game_id', 'defteam'], {'yards_gained': 'sum'},
+                mask=pbp['rush_attempt'] == 1)
         .rename(columns={'defteam': 'team',
                          'yards_gained': 'opp_rush_yds'})
     )
@@ -221,32 +312,35 @@ def get_opp_rush(df: pd.DataFrame = None):
     return opp_rush
 
 
+@instrumented
 def get_def_stats(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of defensive stats
 
     Args:
-        df: A dataframe of play-by-play data
+        df: A dataframe or PbpFrame of play-by-play data
 
     Returns:
         df: A dataframe of each team's defensive stats
     """
+    pbp = as_pbp_frame(df)
 
     def_cols = ['interception', 'season', 'return_touchdown', 'fumble',
                 'sack', 'epa']
 
     def_stats = (
-        df[~df['desc'].str.contains('Aborted')].copy()
-        .groupby(['game_id', 'defteam'], as_index=False)
-        .agg({
+        pbp.agg(
+            ['game_id', 'defteam'],
+            {
             'interception': 'sum',
-            'season': lambda x: x.unique()[0],
+            'season': 'first_seen',
             'return_touchdown': 'sum',
             'fumble_lost': 'sum',
             'sack': 'sum',
             'safety': 'sum',
             'blocked_player_name': 'sum'
-        })
+            },
+            mask=~pbp['desc'].str.contains('Aborted'))
         .rename(columns={
             'defteam': 'team',
             'interception': 'def_int',
@@ -259,35 +353,38 @@ def get_def_stats(df: pd.DataFrame = None):
     return def_stats
 
 
+@instrumented
 def get_kicker_stats(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of kicker stats
 
     Args:
-        df (pd.DataFrame): A dataframe of play-by-play data
+        df (pd.DataFrame): A dataframe or PbpFrame of play-by-play data
 
     Returns:
         df (pd.DataFrame): A dataframe of each kicker's stats
     """
+    pbp = as_pbp_frame(df)
 
     kicks = ['field_goal', 'extra_point']
 
-    df = df[df['desc'].str.contains('GOOD')].copy()
+    good = pbp['desc'].str.contains('GOOD')
 
     kick_df = (
 
-        df[df['play_type'].isin(kicks)]
-        .groupby(['game_id', 'kicker_player_id'], as_index=False)
-        .agg({
-            'kicker_player_name': lambda x: x.unique()[0],
-            'posteam': lambda x: x.unique()[0],
+        pbp.agg(
+            ['game_id', 'kicker_player_id'],
+            {
+            'kicker_player_name': 'first_seen',
+            'posteam': 'first_seen',
             'field_goal_result': 'sum',
             'extra_point_result': 'sum',
             'fg_0_39': 'sum',
             'fg_40_49': 'sum',
             'fg_50_on': 'sum'
 
-        })
+            },
+            mask=good & pbp['play_type'].isin(kicks))
         .rename(columns={
             'kicker_player_name': 'player',
             'field_goal_result': 'fgs',
@@ -299,13 +396,61 @@ def get_kicker_stats(df: pd.DataFrame = None):
     return kick_df
 
 
-def get_team_adjusted_epa(df: pd.DataFrame = None):
+EPA_LEVELS = {
+    'season_epa_play': ['season', 'play_type'],
+    'season_epa_def': ['season', 'defteam', 'play_type'],
+    'season_epa_off': ['season', 'posteam', 'play_type']
+}
+
+
+def _prior_epa_mean(season_epa_def: pd.DataFrame = None, keys: list = None,
+                    state: pd.DataFrame = None):
+    """
+    Mean EPA of all earlier plays in each play's group, computed from
+    running sums and counts so no play ever sees its own result.
+
+    Args:
+        season_epa_def (pd.DataFrame): Pass and run plays in play order
+        keys (list): The columns that define the group
+        state (pd.DataFrame, optional): Running sums and counts of each group
+            from plays before these ones. Defaults to None.
+
+    Returns:
+        pd.Series: The mean EPA of the prior plays, NaN before the first play
+    """
+
+    running = pd.DataFrame({
+        'epa_sum': season_epa_def['epa'].fillna(0),
+        'plays': season_epa_def['epa'].notna().astype(int)
+    })
+
+    totals = running.groupby([season_epa_def[key] for key in keys]).cumsum()
+    prior_sum = totals['epa_sum'].sub(running['epa_sum'])
+    prior_plays = totals['plays'].sub(running['plays'])
+
+    if state is not None:
+        offsets = season_epa_def[keys].merge(state, how='left', on=keys)
+        prior_sum = prior_sum.add(offsets['epa_sum'].fillna(0).to_numpy())
+        prior_plays = prior_plays.add(offsets['plays'].fillna(0).to_numpy())
+
+    return prior_sum.div(prior_plays).where(prior_plays > 0)
+
+
+@instrumented
+def get_team_adjusted_epa(df: pd.DataFrame = None, state: dict = None):
     """
     Processes play-by-play data to calculate team adjusted Defensive EPA.
 
+    Each play gets the mean EPA of the earlier plays of its season and play
+    type, league-wide and for the offense and defense involved. Passing the
+    state returned by get_team_epa_state for the plays already processed lets
+    a new week of plays be added without rescanning the season.
+
     Args:
         df (pandas dataframe): Must be a play-by-play dataframe with game_id, season, posteam, \
             defteam, epa, play_type columns.
+        state (dict, optional): Running EPA sums and counts from earlier plays, as returned
+            by get_team_epa_state. Defaults to None.
 
     Raises:
         ValueError: If dataframe does not contain required columns.
@@ -314,8 +459,9 @@ def get_team_adjusted_epa(df: pd.DataFrame = None):
         pd.DataFrame: A dataframe with team adjusted Defensive EPA.
     """
 
-    def_epa_cols = ['game_id', 'season', 'posteam', 'defteam', 'epa',
-                    'play_type']
+    df = as_pbp_frame(df).df
+
+    def_epa_cols = PBP_COLUMNS['get_team_adjusted_epa']
 
     if not all([x in df.columns for x in def_epa_cols]):
 
@@ -326,12 +472,9 @@ def get_team_adjusted_epa(df: pd.DataFrame = None):
         df[df['play_type'].isin(['pass', 'run'])][def_epa_cols]
     )
 
-    season_epa_def['season_epa_play'] = season_epa_def.groupby(
-        ['season', 'play_type'])['epa'].transform(lambda x: x.shift().expanding().mean())
-    season_epa_def['season_epa_def'] = season_epa_def.groupby(['season', 'defteam', 'play_type'])[
-        'epa'].transform(lambda x: x.shift().expanding().mean())
-    season_epa_def['season_epa_off'] = season_epa_def.groupby(['season', 'posteam', 'play_type'])[
-        'epa'].transform(lambda x: x.shift().expanding().mean())
+    for col, keys in EPA_LEVELS.items():
+        season_epa_def[col] = _prior_epa_mean(
+            season_epa_def, keys, None if state is None else state[col])
 
     season_epa_def['team_adjusted_off_epa'] = season_epa_def['season_epa_off'].sub(
         season_epa_def['season_epa_play']).round(3)
@@ -341,22 +484,62 @@ def get_team_adjusted_epa(df: pd.DataFrame = None):
     return season_epa_def
 
 
+@instrumented
+def get_team_epa_state(df: pd.DataFrame = None, state: dict = None):
+    """
+    Running EPA sums and play counts per (season, play_type) and per
+    (season, team, play_type), used to update team adjusted EPA incrementally.
+
+    Args:
+        df (pd.DataFrame): Play-by-play data for the plays to add
+        state (dict, optional): The state before these plays. Defaults to None.
+
+    Returns:
+        dict: A dataframe of running sums and counts for each EPA level
+    """
+
+    df = as_pbp_frame(df).df
+    plays = df[df['play_type'].isin(['pass', 'run'])]
+
+    new_state = {}
+
+    for col, keys in EPA_LEVELS.items():
+        totals = (
+            plays
+            .assign(plays=plays['epa'].notna().astype(int))
+            .groupby(keys, as_index=False, observed=True)
+            .agg(epa_sum=('epa', 'sum'), plays=('plays', 'sum'))
+        )
+
+        if state is not None:
+            totals = (
+                pd.concat([state[col], totals])
+                .groupby(keys, as_index=False, observed=True)[['epa_sum', 'plays']]
+                .sum()
+            )
+
+        new_state[col] = totals
+
+    return new_state
+
+
+@instrumented
 def get_team_pass_yds(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of each team's passing yards
     for each game
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each team's passing yards
     """
+    pbp = as_pbp_frame(df)
 
     team_pass_yds = (
-        df.loc[df['pass_attempt'] == 1]
-        .groupby(['game_id', 'posteam'], as_index=False)['yards_gained']
-        .sum()
+        pbp.agg(['game_id', 'posteam'], {'yards_gained': 'sum'},
+                mask=pbp['pass_attempt'] == 1)
         .rename(columns={'posteam': 'team',
                          'yards_gained': 'pass_yards'})
     )
@@ -364,22 +547,23 @@ def get_team_pass_yds(df: pd.DataFrame = None):
     return team_pass_yds
 
 
+@instrumented
 def get_team_rush_yds(df: pd.DataFrame = None):
     """
     A function that returns a dataframe of each team's rushing yards
     for each game
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each team's rushing yards
     """
+    pbp = as_pbp_frame(df)
 
     team_rush_yds = (
-        df.loc[df['rush_attempt'] == 1]
-        .groupby(['game_id', 'posteam'], as_index=False)['yards_gained']
-        .sum()
+        pbp.agg(['game_id', 'posteam'], {'yards_gained': 'sum'},
+                mask=pbp['rush_attempt'] == 1)
         .rename(columns={'posteam': 'team',
                          'yards_gained': 'rush_yards'})
     )
@@ -387,35 +571,38 @@ def get_team_rush_yds(df: pd.DataFrame = None):
     return team_rush_yds
 
 
+@instrumented
 def get_team_scores(df: pd.DataFrame = None):
     """
     A function that returns each team's offensive scores (TD, FG, etc.)
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each team's offensive scores
     """
+    pbp = as_pbp_frame(df)
 
-    condition = df['td_team'] == df['posteam']
+    condition = pbp['td_team'] == pbp['posteam']
 
     team_scores = (
-        df[condition]
-        .groupby(['game_id', 'posteam'], as_index=False)[['touchdown', 'field_goal_result', 'two_point_conv_result']]
-        .sum()
+        pbp.agg(['game_id', 'posteam'],
+                {'touchdown': 'sum', 'field_goal_result': 'sum', 'two_point_conv_result': 'sum'},
+                mask=condition)
         .rename(columns={
             'touchdown': 'off_td',
             'posteam': 'team',
             'two_point_conv_result': 'two_pts_conv',
             'field_goal_result': 'fgs'
         })
-        .fillna(0)
+        .fillna({'off_td': 0, 'fgs': 0, 'two_pts_conv': 0})
     )
 
     return team_scores
 
 
+@instrumented
 def get_game_results(df: pd.DataFrame = None, team_rush_yds: pd.DataFrame = None,
                      team_pass_yds: pd.DataFrame = None, team_scores: pd.DataFrame = None,
                      opp_rush: pd.DataFrame = None, opp_pass: pd.DataFrame = None,
@@ -424,7 +611,7 @@ def get_game_results(df: pd.DataFrame = None, team_rush_yds: pd.DataFrame = None
     A dataframe returning each team's aggregate stats for each game
 
     Args:
-        df (pd.DataFrame, optional): _description_. Defaults to None.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data. Defaults to None.
         team_rush_yds (pd.DataFrame, optional): _description_. Defaults to None.
         team_pass_yds (pd.DataFrame, optional): _description_. Defaults to None.
         team_scores (pd.DataFrame, optional): _description_. Defaults to None.
@@ -438,11 +625,8 @@ def get_game_results(df: pd.DataFrame = None, team_rush_yds: pd.DataFrame = None
 
     game_results_cols = ['year', 'week', 'season_type', 'home_team', 'away_team',
                          'home_score', 'away_score', 'spread_line', 'total_line']
-    game_results = (
-        df
-        .groupby(['game_id', 'posteam'], as_index=False)[game_results_cols]
-        .max()
-    )
+    game_results = as_pbp_frame(df).agg(
+        ['game_id', 'posteam'], {col: 'max' for col in game_results_cols})
 
     game_results['home'] = (game_results['posteam'] ==
                             game_results['home_team']).astype(int)
@@ -492,26 +676,26 @@ def get_game_results(df: pd.DataFrame = None, team_rush_yds: pd.DataFrame = None
     return game_results
 
 
+@instrumented
 def get_drive_stats(df: pd.DataFrame = None):
     """
     A function that returns the results of each drive for each team
     for each game
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each team's drive results for each game
     """
+    pbp = as_pbp_frame(df)
 
     drive_cols = ['time_between', 'score_differential', 'score_differential_post', 'rush_attempt',
                   'pass_attempt', 'yards_gained', 'interception', 'fumble', 'sack', 'epa',
                   'success']
 
     drive_details = (
-        df
-        .groupby(['game_id', 'posteam', 'drive'], as_index=False)[drive_cols]
-        .agg({
+        pbp.agg(['game_id', 'posteam', 'drive'], {
             'time_between': 'sum',
             'score_differential': 'first',
             'score_differential_post': 'last',
@@ -523,8 +707,7 @@ def get_drive_stats(df: pd.DataFrame = None):
             'sack': 'sum',
             'success': 'sum',
             'epa': 'sum'
-        }
-        )
+        })
         .rename(
             columns={'time_between': 'poss_time',
                      'score_differential': 'score_diff_start',
@@ -546,32 +729,31 @@ def get_drive_stats(df: pd.DataFrame = None):
     return drive_details
 
 
+@instrumented
 def get_receiving(df: pd.DataFrame = None):
     """
     A function returning each player's receiving stats for each game.
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each player's receiving stats for each game
     """
+    pbp = as_pbp_frame(df)
 
-    rec_df = (
-        df.loc[df['qb_dropback'] == 1]
-        .groupby(['game_id', 'receiver_player_id', 'posteam'])
-        .agg({
-            'receiver_player_name': lambda x: x.unique()[0],
+    rec_df = pbp.agg(
+        ['game_id', 'receiver_player_id', 'posteam'],
+        {
+            'receiver_player_name': 'first_seen',
             'pass_attempt': 'count',
             'complete_pass': 'sum',
             'air_yards': 'sum',
             'yards_after_catch': 'sum',
             'yards_gained': 'sum',
             'touchdown': 'sum'
-        })
-        .sort_index()
-        .reset_index()
-    )
+        },
+        mask=pbp['qb_dropback'] == 1)
 
     rec_df.rename(
         columns={
@@ -603,21 +785,22 @@ def get_receiving(df: pd.DataFrame = None):
     return rec_df
 
 
+@instrumented
 def get_opp_pass(df: pd.DataFrame = None):
     """
     A function returning each opponent's passing stats for each game.
 
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each opponent's passing stats for each game
     """
+    pbp = as_pbp_frame(df)
 
     opp_pass = (
-      df[df['pass_attempt'] == 1]
-      .groupby(['game_id', 'defteam'], as_index=False)['yards_gained']
-      .sum()
+      pbp.agg(['game_id', 'defteam'], {'yards_gained': 'sum'},
+              mask=pbp['pass_attempt'] == 1)
       .rename(columns={'defteam' : 'team',
                       'yards_gained' : 'opp_pass_yds'})
   )
@@ -626,32 +809,35 @@ def get_opp_pass(df: pd.DataFrame = None):
 
 
 
+@instrumented
 def get_def_stats(df: pd.DataFrame = None):
     """
     A function returning each team's defensive stats for each game.
     
     Args:
-        df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        df (pd.DataFrame, optional): A dataframe or PbpFrame of play-by-play data.
 
     Returns:
         df (pd.DataFrame): A dataframe of each team's defensive stats for each game
-    """    
+    """
+    pbp = as_pbp_frame(df)
 
     def_cols = ['interception', 'season', 'return_touchdown', 'fumble', 
                 'sack', 'epa']
 
     def_stats = (
-        df[~df['desc'].str.contains('Aborted')].copy()
-        .groupby(['game_id', 'defteam'], as_index=False)
-        .agg({
+        pbp.agg(
+            ['game_id', 'defteam'],
+            {
             'interception' : 'sum',
-            'season' : lambda x: x.unique()[0],
+            'season' : 'first_seen',
             'return_touchdown' : 'sum',
             'fumble_lost' : 'sum',
             'sack' : 'sum',
             'safety' : 'sum',
             'blocked_player_name' : 'sum'
-        })
+            },
+            mask=~pbp['desc'].str.contains('Aborted'))
         .rename(columns={
             'defteam' : 'team',
             'interception' : 'def_int',
@@ -664,17 +850,28 @@ def get_def_stats(df: pd.DataFrame = None):
   
     return def_stats
 
-def process_pbp(df: pd.DataFrame = None):
+@instrumented
+def process_pbp(df: pd.DataFrame = None, inplace: bool = False):
     """
     A function that processes pbp data to add useful features.
-    
+
+    By default the input dataframe is left untouched and the features are
+    added to a shallow copy that shares every column it does not change.
+    With inplace=True the columns are replaced on the input dataframe itself,
+    so the old version of each column is released as soon as it is replaced.
+
     Args:
         df (pd.DataFrame, optional): A dataframe of play-by-play data.
+        inplace (bool, optional): Whether to modify df in place. Defaults to False.
 
     Returns:
         df (pd.DataFrame): A dataframe of play-by-play data with added features
-    """    
-    df['year'] = pd.to_datetime(df['game_date']).dt.year
+    """
+    if not inplace:
+        df = df.copy(deep=False)
+
+    game_date = pd.to_datetime(df['game_date'])
+    df['year'] = game_date.dt.year
     df['two_point_conv_result'] = (
         df['two_point_conv_result']
         .map(
@@ -685,17 +882,29 @@ def process_pbp(df: pd.DataFrame = None):
         .fillna('None')
     )
 
-    df['game_date'] = pd.to_datetime(df['game_date'])
-    df['spread_line'] = df['spread_line'] * -1
-    df['field_goal_result'] = np.where(df['field_goal_result'] == 'made', 1, 0)
-    df['time_between'] = df.groupby(['game_id'])['game_seconds_remaining'].transform(lambda x: x.sub(x.shift(-1)).fillna(0))
-    df['play_type'] = np.where(df['two_point_attempt'] > 0.5, 'two_point_att', df['play_type'])
+    df['game_date'] = game_date
+    del game_date
+
+    df['spread_line'] = df['spread_line'].mul(-1)
+    df['field_goal_result'] = (df['field_goal_result'] == 'made').astype(int)
+    df['time_between'] = (
+        df.groupby('game_id', sort=False)['game_seconds_remaining']
+        .diff(-1)
+        .fillna(0)
+    )
+    df['play_type'] = df['play_type'].mask(df['two_point_attempt'] > 0.5, 'two_point_att')
     df['air_yards_to_sticks'] = df['air_yards'].sub(df['ydstogo'])
-    df['season'] = [int(x.split('_')[0]) for x in df.game_id]
-    df['blocked_player_name'] = np.where(df['blocked_player_name'].notnull(), 1, 0)
-    df['fg_0_39'] = np.where(((df['play_type'] == 'field_goal') & (df['kick_distance'].between(0,39))), 1, 0)
-    df['fg_40_49'] = np.where(((df['play_type'] == 'field_goal') & (df['kick_distance'].between(40,49))), 1, 0)
-    df['fg_50_on'] = np.where(((df['play_type'] == 'field_goal') & (df['kick_distance'].between(50,100))), 1, 0)
-    df['extra_point_result'] = np.where(df['extra_point_result'] == 'good', 1, 0)
-    
-    return df
\ No newline at end of file
+
+    # the season is the leading year of the game id, sliced once per game
+    game_codes, game_ids = pd.factorize(df['game_id'])
+    df['season'] = game_ids.str[:4].astype(int).to_numpy()[game_codes]
+
+    df['blocked_player_name'] = df['blocked_player_name'].notnull().astype(int)
+
+    field_goal = df['play_type'] == 'field_goal'
+    df['fg_0_39'] = (field_goal & df['kick_distance'].between(0, 39)).astype(int)
+    df['fg_40_49'] = (field_goal & df['kick_distance'].between(40, 49)).astype(int)
+    df['fg_50_on'] = (field_goal & df['kick_distance'].between(50, 100)).astype(int)
+    df['extra_point_result'] = (df['extra_point_result'] == 'good').astype(int)
+
+    return df
@@ -0,0 +1,540 @@
+import sys
+
+import pandas as pd
+
+from sqlalchemy import text
+
+from .engines import get_engine, raw_connection, database_url
+from .pbp_frame import PbpFrame
+from .query_cache import invalidate
+from .pbp_utils import (QB_NAME_FIXES, get_team_pass_yds, get_team_rush_yds, get_opp_pass,
+                        get_opp_rush, get_team_scores, get_def_stats, get_kicker_stats,
+                        get_rushing, get_receiving, get_drive_stats, get_qb_pass)
+
+
+# the SQL each database spells differently: the case-sensitive position of a
+# substring, concatenating the text of a group and positive infinity
+SQL_DIALECTS = {
+    'postgresql': {'find': 'strpos', 'string_agg': 'string_agg',
+                   'infinity': "cast('Infinity' as double precision)"},
+    'sqlite': {'find': 'instr', 'string_agg': 'group_concat', 'infinity': '9e999'}
+}
+
+# the SQL of each pandas aggregation, over the rows matching {cond}. first,
+# last and first_seen are taken by a window over each group ordered by
+# play_id, the order nflfastR stores the plays of a game in
+AGG_SQL = {
+    'sum': 'cast(coalesce(sum(case when {cond} then {col} end), 0) as double precision)',
+    'mean': 'cast(avg(case when {cond} then {col} end) as double precision)',
+    'max': 'max(case when {cond} then {col} end)',
+    'count': 'count(case when {cond} then {col} end)',
+    # pandas sums text by concatenating it, e.g. the 'None' two_point_conv_result
+    # values process_pbp leaves outside two point attempts
+    'concat': "{string_agg}(cast(case when {cond} then {col} end as text), '')"
+}
+
+# the window order picking the value of each ordered aggregation
+WINDOW_ORDER = {
+    'first_seen': 'case when {cond} then 0 else 1 end, "play_id"',
+    'first': 'case when {cond} and {col} is not null then 0 else 1 end, "play_id"',
+    'last': 'case when {cond} and {col} is not null then 0 else 1 end, "play_id" desc'
+}
+
+
+def _quote(name: str = None):
+    """
+    Quote an identifier, keeping reserved words like desc and mixed case like aDOT
+    """
+
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _div(num: str = None, den: str = None):
+    """
+    Divide like pandas, giving +/-infinity for x / 0 and NULL (NaN) for 0 / 0
+    """
+
+    return (f"case when ({den}) = 0 then case when ({num}) > 0 then {{infinity}} "
+            f"when ({num}) < 0 then -{{infinity}} end "
+            f"else cast({num} as double precision) / ({den}) end")
+
+
+def _round(expr: str = None, decimals: int = 0):
+    """
+    Round like numpy, scaling then rounding half to even. The round of SQLite
+    rounds halves away from zero, so the halves are handled with floor
+    """
+
+    scaled = f'(({expr}) * {10 ** decimals})'
+
+    return (f'case when {scaled} - floor({scaled}) = 0.5 then 2 * floor({scaled} / 2 + 0.5) '
+            f'else floor({scaled} + 0.5) end / {10 ** decimals}')
+
+
+def _team_sum(col: str = None):
+    """
+    The team total of a column for each game, like groupby(['game_id', 'team']).transform('sum')
+    """
+
+    return f'sum({_quote(col)}) over (partition by "game_id", "team")'
+
+
+def _contains(col: str = None, text: str = None):
+    """
+    Whether a text column contains a substring, case-sensitive like
+    str.contains. LIKE ignores case in SQLite
+    """
+
+    return f"{{find}}({_quote(col)}, '{text}') > 0"
+
+
+def _fix_qb_name(col: str = None):
+    """
+    The QB name fixes of get_qb_pass: QB_NAME_FIXES, then the first initial
+    and the first last name part, like the regex '^([^.]*)\\.\\s*([^.]*).*$'
+    """
+
+    fixes = ' '.join(f"when '{old}' then '{new}'" for old, new in QB_NAME_FIXES.items())
+    name = f'case {col} {fixes} else {col} end'
+    dot = f"{{find}}({name}, '.')"
+    rest = f'ltrim(substr({name}, {dot} + 1))'
+    last = (f"case when {{find}}({rest}, '.') > 0 "
+            f"then substr({rest}, 1, {{find}}({rest}, '.') - 1) else {rest} end")
+
+    return f"case when {dot} > 0 then substr({name}, 1, {dot} - 1) || '.' || {last} else {name} end"
+
+
+# each view mirrors a pbp_utils aggregator column for column: the group keys
+# and aggregations (source column, aggregation, output name and optionally
+# the rows it covers) of its pbp.agg call, its row filter, flag columns added
+# to each play, the columns it derives from the aggregates, the groups it
+# keeps and, if it reorders or drops columns, its output columns
+PBP_VIEWS = {
+    'team_pass_yds': {
+        'func': get_team_pass_yds,
+        'keys': [('game_id', 'game_id'), ('posteam', 'team')],
+        'aggs': [('yards_gained', 'sum', 'pass_yards')],
+        'where': '"pass_attempt" = 1'
+    },
+    'team_rush_yds': {
+        'func': get_team_rush_yds,
+        'keys': [('game_id', 'game_id'), ('posteam', 'team')],
+        'aggs': [('yards_gained', 'sum', 'rush_yards')],
+        'where': '"rush_attempt" = 1'
+    },
+    'opp_pass': {
+        'func': get_opp_pass,
+        'keys': [('game_id', 'game_id'), ('defteam', 'team')],
+        'aggs': [('yards_gained', 'sum', 'opp_pass_yds')],
+        'where': '"pass_attempt" = 1'
+    },
+    'opp_rush': {
+        'func': get_opp_rush,
+        'keys': [('game_id', 'game_id'), ('defteam', 'team')],
+        'aggs': [('yards_gained', 'sum', 'opp_rush_yds')],
+        'where': '"rush_attempt" = 1'
+    },
+    'team_scores': {
+        'func': get_team_scores,
+        'keys': [('game_id', 'game_id'), ('posteam', 'team')],
+        'aggs': [('touchdown', 'sum', 'off_td'),
+                 ('field_goal_result', 'sum', 'fgs'),
+                 ('two_point_conv_result', 'concat', 'two_pts_conv')],
+        'where': '"td_team" = "posteam"'
+    },
+    'def_stats': {
+        'func': get_def_stats,
+        'keys': [('game_id', 'game_id'), ('defteam', 'team')],
+        'aggs': [('interception', 'sum', 'def_int'),
+                 ('season', 'first_seen', 'season'),
+                 ('return_touchdown', 'sum', 'def_td'),
+                 ('fumble_lost', 'sum', 'fumble_lost'),
+                 ('sack', 'sum', 'def_sack'),
+                 ('safety', 'sum', 'safety'),
+                 ('blocked_player_name', 'sum', 'kick_blocked')],
+        'where': 'not ' + _contains('desc', 'Aborted')
+    },
+    'kicker_stats': {
+        'func': get_kicker_stats,
+        'keys': [('game_id', 'game_id'), ('kicker_player_id', 'kicker_player_id')],
+        'aggs': [('kicker_player_name', 'first_seen', 'player'),
+                 ('posteam', 'first_seen', 'team'),
+                 ('field_goal_result', 'sum', 'fgs'),
+                 ('extra_point_result', 'sum', 'pats'),
+                 ('fg_0_39', 'sum', 'fg_0_39'),
+                 ('fg_40_49', 'sum', 'fg_40_49'),
+                 ('fg_50_on', 'sum', 'fg_50_on')],
+        'where': (_contains('desc', 'GOOD') +
+                  ' and "play_type" in (\'field_goal\', \'extra_point\')')
+    },
+    'rushing': {
+        'func': get_rushing,
+        'keys': [('game_id', 'game_id'), ('rusher_player_id', 'player_id'),
+                 ('posteam', 'team')],
+        'aggs': [('rush_attempt', 'sum', 'rush_att'),
+                 ('rusher_player_name', 'first_seen', 'player'),
+                 ('yards_gained', 'sum', 'rush_yds'),
+                 ('success', 'sum', 'success'),
+                 ('touchdown', 'sum', 'rush_td'),
+                 ('total_line', 'mean', 'total_line'),
+                 ('epa', 'sum', 'rush_epa'),
+                 ('fumble_lost', 'sum', 'fumbles'),
+                 ('home_team', 'first_seen', 'home_team'),
+                 ('away_team', 'first_seen', 'away_team')],
+        'where': '"rush_attempt" = 1',
+        'derived': [
+            ('rush_yds_per_att', _round(_div('"rush_yds"', '"rush_att"'), 1)),
+            ('success_perc', _round(_div('"success"', '"rush_att"'), 3)),
+            ('team_rush_atts', _team_sum('rush_att')),
+            ('rush_att_share', _round(_div('"rush_att"', _team_sum('rush_att')), 2))
+        ]
+    },
+    'receiving': {
+        'func': get_receiving,
+        'keys': [('game_id', 'game_id'), ('receiver_player_id', 'player_id'),
+                 ('posteam', 'team')],
+        'aggs': [('receiver_player_name', 'first_seen', 'player'),
+                 ('pass_attempt', 'count', 'targets'),
+                 ('complete_pass', 'sum', 'rec'),
+                 ('air_yards', 'sum', 'air_yards'),
+                 ('yards_after_catch', 'sum', 'yac'),
+                 ('yards_gained', 'sum', 'rec_yards'),
+                 ('touchdown', 'sum', 'td')],
+        'where': '"qb_dropback" = 1',
+        'derived': [
+            ('target_share', _round(_div('"targets"', _team_sum('targets')), 3) + ' * 100'),
+            ('aDOT', _div('"air_yards"', '"targets"')),
+            ('yrds_per_rec', _round(_div('"rec_yards"', '"rec"'), 1)),
+            ('team_air_yards', _team_sum('air_yards')),
+            ('air_yards_share',
+             _round(_div('"air_yards"', _team_sum('air_yards')), 3) + ' * 100'),
+            ('yac_per_rec', _round(_div('"yac"', '"rec"'), 1))
+        ]
+    },
+    'drive_stats': {
+        'func': get_drive_stats,
+        'keys': [('game_id', 'game_id'), ('posteam', 'team'), ('drive', 'drive')],
+        'aggs': [('time_between', 'sum', 'poss_time'),
+                 ('score_differential', 'first', 'score_diff_start'),
+                 ('score_differential_post', 'last', 'score_diff_end'),
+                 ('rush_attempt', 'sum', 'rush_attempt'),
+                 ('pass_attempt', 'sum', 'pass_attempt'),
+                 ('yards_gained', 'sum', 'yards_gained'),
+                 ('interception', 'sum', 'int'),
+                 ('fumble', 'sum', 'fumble'),
+                 ('sack', 'sum', 'sack'),
+                 ('success', 'sum', 'success'),
+                 ('epa', 'sum', 'epa')],
+        'derived': [
+            ('td', 'case when "score_diff_end" - "score_diff_start" >= 6 then 1 else 0 end'),
+            ('fg', 'case when "score_diff_end" - "score_diff_start" = 3 then 1 else 0 end'),
+            ('total_plays', 'cast("rush_attempt" + "pass_attempt" as bigint)')
+        ]
+    },
+    'qb_pass': {
+        'func': get_qb_pass,
+        'keys': [('game_id', 'game_id'), ('passer_player_name', 'player'), ('posteam', 'team')],
+        'columns': [
+            ('dropback', ('case when "pass_attempt" = 1 and "sack" = 0 and '
+                          'coalesce("play_type", \'\') <> \'two_point_att\' then 1 else 0 end')),
+            ('td_play', ('case when "pass_attempt" = 1 and "sack" = 0 and "interception" = 0 and '
+                         'coalesce("play_type", \'\') <> \'two_point_att\' then 1 else 0 end')),
+            ('completion', 'case when "complete_pass" = 1 then 1 else 0 end'),
+            ('incompletion', ('case when "complete_pass" = 0 and '
+                              'coalesce("play_type", \'\') <> \'two_point_att\' then 1 else 0 end'))
+        ],
+        'aggs': [('passer_player_id', 'first_seen', 'player_id', '"dropback" = 1'),
+                 ('season_type', 'first_seen', 'season_type', '"dropback" = 1'),
+                 ('pass_attempt', 'sum', 'att', '"dropback" = 1'),
+                 ('complete_pass', 'sum', 'com', '"dropback" = 1'),
+                 ('yards_gained', 'sum', 'pass_yards', '"dropback" = 1'),
+                 ('air_yards', 'sum', 'air_yards', '"dropback" = 1'),
+                 ('yards_after_catch', 'sum', 'yards_after_catch', '"dropback" = 1'),
+                 ('air_yards_to_sticks', 'sum', 'AYTS', '"dropback" = 1'),
+                 ('interception', 'sum', 'interception', '"dropback" = 1'),
+                 ('total_line', 'max', 'total_line', '"dropback" = 1'),
+                 ('home_team', 'first_seen', 'home_team', '"dropback" = 1'),
+                 ('away_team', 'first_seen', 'away_team', '"dropback" = 1'),
+                 ('success', 'sum', 'success', '"dropback" = 1'),
+                 ('temp', 'max', 'temp', '"dropback" = 1'),
+                 ('wind', 'max', 'wind', '"dropback" = 1'),
+                 ('epa', 'sum', 'epa', '"dropback" = 1'),
+                 ('cpoe', 'sum', 'cpoe', '"dropback" = 1'),
+                 ('sack', 'sum', 'sack'),
+                 ('touchdown', 'sum', 'touchdown', '"td_play" = 1'),
+                 ('air_yards', 'sum', 'ay_completions', '"completion" = 1'),
+                 ('air_yards', 'sum', 'ay_incompletions', '"incompletion" = 1'),
+                 ('dropback', 'sum', 'dropbacks'),
+                 ('td_play', 'sum', 'td_plays'),
+                 ('completion', 'sum', 'completions'),
+                 ('incompletion', 'sum', 'incompletions')],
+        'derived': [
+            ('player', _fix_qb_name('"player"')),
+            ('cpoe', '"cpoe" / 100'),
+            ('comp_perc', _round(_div('"com"', '"att" + "sack"'), 3) + ' * 100'),
+            ('touchdown', 'case when "td_plays" > 0 then "touchdown" end'),
+            ('ay_completions', 'case when "completions" > 0 then "ay_completions" end'),
+            ('avg_ay_comp', _round(_div(
+                'case when "completions" > 0 then "ay_completions" end', '"com"'), 1)),
+            ('complete_pass', 'case when "incompletions" > 0 then 0.0 end'),
+            ('ay_incompletions', 'case when "incompletions" > 0 then "ay_incompletions" end'),
+            ('avg_ay_incomp', _round(_div(
+                'case when "incompletions" > 0 then "ay_incompletions" end',
+                '"att" + "sack" - "com"'), 1)),
+            ('epa_per_dropback', _round(_div('"epa"', '"att" + "sack"'), 3))
+        ],
+        # only passers with at least one dropback make it into the box score
+        'having': '"dropbacks" > 0',
+        'output': ['game_id', 'player', 'team', 'player_id', 'season_type', 'att', 'com',
+                   'pass_yards', 'air_yards', 'yards_after_catch', 'AYTS', 'interception',
+                   'total_line', 'home_team', 'away_team', 'success', 'temp', 'wind', 'epa',
+                   'cpoe', 'sack', 'comp_perc', 'touchdown', 'ay_completions', 'avg_ay_comp',
+                   'complete_pass', 'ay_incompletions', 'avg_ay_incomp', 'epa_per_dropback']
+    }
+}
+
+
+def view_sql(name: str = None, source: str = 'pbp', dialect: str = 'postgresql'):
+    """
+    Generate the select statement of a view from its entry in PBP_VIEWS
+
+    Args:
+        name (str): The name of the view
+        source (str, optional): The play-by-play table to aggregate. Defaults to 'pbp'.
+        dialect (str, optional): The database, a key of SQL_DIALECTS. Defaults to 'postgresql'.
+
+    Returns:
+        str: The select statement
+    """
+
+    view = PBP_VIEWS[name]
+    spelling = SQL_DIALECTS[dialect]
+
+    key_cols = [_quote(col) for col, _ in view['keys']]
+    partition = ', '.join(key_cols)
+
+    plays = _quote(source)
+    if view.get('columns'):
+        flags = [f'{expr} as {_quote(out)}' for out, expr in view['columns']]
+        plays = f"(select *, {', '.join(flags)} from {plays}) as plays"
+
+    windows, aggs = [], []
+    for col, how, out, *cond in view['aggs']:
+        cond = cond[0] if cond else '1 = 1'
+        if how in WINDOW_ORDER:
+            # the value of the chosen row is repeated over the group, so max picks it
+            window = _quote(f'__{out}')
+            order = WINDOW_ORDER[how].format(col=_quote(col), cond=cond)
+            windows.append(f'first_value({_quote(col)}) over '
+                           f'(partition by {partition} order by {order}) as {window}')
+            aggs.append(f'max({window}) as {_quote(out)}')
+        else:
+            aggs.append(AGG_SQL[how].format(col=_quote(col), cond=cond, **spelling) +
+                        f' as {_quote(out)}')
+
+    conditions = [f'{col} is not null' for col in key_cols]
+    if 'where' in view:
+        conditions.append(f"({view['where']})")
+
+    rows = f"{plays}\nwhere {' and '.join(conditions)}"
+    if windows:
+        rows = f"(select *, {', '.join(windows)}\nfrom {rows}) as plays"
+
+    keys = [f'{col} as {_quote(out)}' for col, (_, out) in zip(key_cols, view['keys'])]
+    query = (
+        f"select {', '.join(keys + aggs)}\n"
+        f"from {rows}\n"
+        f"group by {partition}"
+    )
+
+    if view.get('derived') or view.get('having') or view.get('output'):
+        derived = dict(view.get('derived', []))
+        if view.get('output'):
+            columns = [f'{derived[out]} as {_quote(out)}' if out in derived else _quote(out)
+                       for out in view['output']]
+        else:
+            columns = ['*'] + [f'{expr} as {_quote(out)}' for out, expr in derived.items()]
+        query = f"select {', '.join(columns)}\nfrom (\n{query}\n) as agg"
+        if view.get('having'):
+            query += f"\nwhere {view['having']}"
+
+    return query.format(**spelling)
+
+
+def create_views(URI: str = None, names: list = None, materialized: bool = True,
+                 source: str = 'pbp'):
+    """
+    Create the views mirroring the pbp_utils aggregators, replacing any
+    existing ones.
+
+    Materialized views get a unique index on their group keys, which the
+    merges on game_id and team use and which REFRESH ... CONCURRENTLY needs.
+    The play-by-play table gets an index on (game_id, play_id) for the
+    windows behind the ordered first/last aggregations.
+
+    Args:
+        URI (str, optional): Credentials for the database. Defaults to the environment.
+        names (list, optional): The views to create. Defaults to every view in PBP_VIEWS.
+        materialized (bool, optional): Whether to create materialized views. Defaults to True.
+        source (str, optional): The play-by-play table. Defaults to 'pbp'.
+    """
+
+    if names is None:
+        names = list(PBP_VIEWS)
+
+    kind = 'materialized view' if materialized else 'view'
+
+    with raw_connection(URI) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'create index if not exists {_quote(source + "_game_id_play_id_idx")} '
+                        f'on {_quote(source)} ("game_id", "play_id")')
+
+            for name in names:
+                cur.execute('select relkind from pg_class where relname = %s', (name,))
+                existing = cur.fetchone()
+                if existing is not None:
+                    old_kind = 'materialized view' if existing[0] == 'm' else 'view'
+                    cur.execute(f'drop {old_kind} {_quote(name)}')
+
+                cur.execute(f'create {kind} {_quote(name)} as\n{view_sql(name, source)}')
+
+                if materialized:
+                    key_cols = ', '.join(_quote(out) for _, out in PBP_VIEWS[name]['keys'])
+                    cur.execute(f'create unique index {_quote(name + "_keys_idx")} '
+                                f'on {_quote(name)} ({key_cols})')
+
+                print(f'created {kind} {name}')
+
+        conn.commit()
+
+    for name in names:
+        invalidate(name, database=database_url(URI))
+
+
+def refresh_views(URI: str = None, names: list = None, concurrently: bool = False):
+    """
+    Refresh the materialized views after the play-by-play table is reloaded.
+
+    Args:
+        URI (str, optional): Credentials for the database. Defaults to the environment.
+        names (list, optional): The views to refresh. Defaults to every view in PBP_VIEWS.
+        concurrently (bool, optional): Refresh without locking out readers of the
+            views, at the cost of a slower refresh. Defaults to False.
+    """
+
+    if names is None:
+        names = list(PBP_VIEWS)
+
+    option = 'concurrently ' if concurrently else ''
+
+    with raw_connection(URI) as conn:
+        with conn.cursor() as cur:
+            for name in names:
+                cur.execute(f'refresh materialized view {option}{_quote(name)}')
+                print(f'refreshed {name}')
+
+        conn.commit()
+
+    for name in names:
+        invalidate(name, database=database_url(URI))
+
+
+def _compare(expected: pd.DataFrame = None, result: pd.DataFrame = None, keys: list = None):
+    """
+    Compare a pandas aggregate with its SQL version, ignoring row order and
+    integer vs float dtypes. Returns a description of the first difference,
+    or None when they match.
+    """
+
+    if list(expected.columns) != list(result.columns):
+        return f'columns differ: {list(expected.columns)} vs {list(result.columns)}'
+
+    if len(expected) != len(result):
+        return f'row counts differ: {len(expected)} vs {len(result)}'
+
+    # compacted frames carry categorical keys, the database returns plain values
+    expected = expected.astype({col: object for col in expected.columns
+                                if isinstance(expected[col].dtype, pd.CategoricalDtype)})
+
+    expected = expected.sort_values(by=keys, ignore_index=True)
+    result = result.sort_values(by=keys, ignore_index=True)
+
+    try:
+        pd.testing.assert_frame_equal(expected, result, check_dtype=False,
+                                      check_exact=False, rtol=1e-9)
+    except AssertionError as e:
+        return str(e).strip().splitlines()[0]
+
+    return None
+
+
+def check_views(df: pd.DataFrame = None, URI: str = None, names: list = None,
+                source: str = 'pbp_view_check'):
+    """
+    Check that the SQL views return the same rows as the pandas aggregators.
+
+    The play-by-play data, such as a synthetic dataset run through
+    process_pbp, is loaded into a scratch table, each view's select statement
+    is run against it and the result is compared with the pandas function.
+    The scratch table is dropped afterwards. The database can be Postgres or
+    a local SQLite stand-in, e.g. 'sqlite:///views.db'.
+
+    Args:
+        df (pd.DataFrame): Processed play-by-play data
+        URI (str, optional): Credentials for a scratch database. Defaults to the environment.
+        names (list, optional): The views to check. Defaults to every view in PBP_VIEWS.
+        source (str, optional): The name of the scratch table. Defaults to 'pbp_view_check'.
+
+    Returns:
+        df (pd.DataFrame): The pandas and SQL row counts of each view and the
+            first difference found, if any
+    """
+
+    if names is None:
+        names = list(PBP_VIEWS)
+
+    engine = get_engine(URI)
+    dialect = engine.dialect.name
+    pbp = PbpFrame(df)
+
+    # multi-row inserts of wide frames pass SQLite's limit on bound parameters
+    df.to_sql(source, engine, if_exists='replace', index=False,
+              method=None if dialect == 'sqlite' else 'multi', chunksize=1000)
+
+    report = []
+
+    try:
+        for name in names:
+            view = PBP_VIEWS[name]
+            keys = [out for _, out in view['keys']]
+
+            expected = view['func'](pbp)
+            result = pd.read_sql(text(view_sql(name, source, dialect)), con=engine)
+            difference = _compare(expected, result, keys)
+
+            report.append({
+                'view': name,
+                'pandas_rows': len(expected),
+                'sql_rows': len(result),
+                'matches': difference is None,
+                'difference': difference
+            })
+
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'drop table if exists {_quote(source)}'))
+
+    return pd.DataFrame(report)
+
+
+if __name__ == '__main__':
+    # python -m database.pbp_views [create|refresh] [view ...]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'refresh'
+    views = sys.argv[2:] or None
+
+    if command == 'create':
+        create_views(names=views)
+    elif command == 'refresh':
+        refresh_views(names=views)
+    else:
+        print(f'unknown command {command}, expected create or refresh')
@@ -0,0 +1,185 @@
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .feature_store import DATA_DIR, list_season_files, read_season_files
+from .pbp_frame import PbpFrame
+from .pbp_utils import (get_team_rush_yds, get_team_pass_yds, get_team_scores, get_opp_rush,
+                        get_opp_pass, get_drive_stats, process_pbp, get_required_columns)
+from .derived_tables import DERIVED_TABLES, get_games
+from .instrumentation import instrumented
+
+
+PBP_DIR = os.path.join(DATA_DIR, 'pbp')
+
+# every game-level table built from play-by-play data. each groups by
+# game_id first, so seasons can be built independently and concatenated
+PIPELINE_TABLES = {
+    **DERIVED_TABLES,
+    'team_rush_yds': get_team_rush_yds,
+    'team_pass_yds': get_team_pass_yds,
+    'team_scores': get_team_scores,
+    'opp_rush': get_opp_rush,
+    'opp_pass': get_opp_pass,
+    'drive_stats': get_drive_stats
+}
+
+# the functions get_games runs
+GAMES_FUNCS = ['get_game_results', 'get_team_rush_yds', 'get_team_pass_yds', 'get_team_scores',
+               'get_opp_rush', 'get_opp_pass']
+
+
+def list_pbp_seasons(directory: str = PBP_DIR):
+    """
+    A function that returns the seasons with a play-by-play file, such as
+    data/pbp/play_by_play_2021.parquet
+
+    Args:
+        directory (str, optional): The play-by-play directory. Defaults to PBP_DIR.
+
+    Returns:
+        list: The seasons in order
+    """
+
+    return [int(re.search(r'_(\d{4})\.parquet$', file).group(1))
+            for file in list_season_files(directory)]
+
+
+@instrumented
+def read_pbp(seasons: list = None, tables: dict = None, games: bool = False,
+             directory: str = PBP_DIR):
+    """
+    A function that reads only the play-by-play columns and seasons that
+    some tables need. nflfastR files have about 370 columns and each table
+    reads at most about 20 of them.
+
+    Args:
+        seasons (list, optional): The seasons to read. Defaults to every season.
+        tables (dict, optional): A mapping of table name to the function building it.
+            Defaults to PIPELINE_TABLES.
+        games (bool, optional): Whether the games table will be built too. Defaults to False.
+        directory (str, optional): The play-by-play directory. Defaults to PBP_DIR.
+
+    Returns:
+        df (pd.DataFrame): The raw play-by-play data, ready for process_pbp
+    """
+
+    if tables is None:
+        tables = PIPELINE_TABLES
+
+    funcs = list(tables.values()) + (GAMES_FUNCS if games else [])
+
+    return read_season_files(directory, seasons=seasons, columns=get_required_columns(funcs))
+
+
+@instrumented
+def build_seasons(seasons: list = None, directory: str = PBP_DIR, tables: dict = None,
+                  ls: pd.DataFrame = None, columns: list = None):
+    """
+    Read, process and aggregate the play-by-play data of some seasons.
+
+    Args:
+        seasons (list): The seasons to build
+        directory (str, optional): The play-by-play directory. Defaults to PBP_DIR.
+        tables (dict, optional): A mapping of table name to the function building it.
+            Defaults to PIPELINE_TABLES.
+        ls (pd.DataFrame, optional): Lee Sharpe's games data, needed for the games
+            table. Defaults to None, which skips the games table.
+        columns (list, optional): The play-by-play columns to read. Defaults to the
+            columns the tables need.
+
+    Returns:
+        dict: A dataframe for each table
+    """
+
+    if tables is None:
+        tables = PIPELINE_TABLES
+
+    if columns is None:
+        df = read_pbp(seasons, tables, games=ls is not None, directory=directory)
+    else:
+        df = read_season_files(directory, seasons=seasons, columns=columns)
+    df = process_pbp(df, inplace=True)
+
+    pbp = PbpFrame(df)
+
+    results = {name: func(pbp) for name, func in tables.items()}
+
+    if ls is not None:
+        results['games'] = get_games(pbp, ls)
+
+    return results
+
+
+def _run_seasons(args: tuple = None):
+    """
+    Build a chunk of seasons in a worker
+    """
+
+    return build_seasons(*args)
+
+
+def _concat(frames: list = None):
+    """
+    Concatenate the chunks of a table, keeping categorical columns categorical
+    """
+
+    frames = [frame for frame in frames if frame is not None]
+    result = pd.concat(frames, ignore_index=True)
+
+    for col in frames[0].columns:
+        if (isinstance(frames[0][col].dtype, pd.CategoricalDtype) and
+                not isinstance(result[col].dtype, pd.CategoricalDtype)):
+            result[col] = result[col].astype('category')
+
+    return result
+
+
+def run_pipeline(seasons: list = None, directory: str = PBP_DIR, tables: dict = None,
+                 ls: pd.DataFrame = None, columns: list = None, chunk_size: int = 1,
+                 n_jobs: int = None):
+    """
+    A function that builds the game-level tables of many seasons on a process pool.
+
+    Each task reads, processes and aggregates its own chunk of seasons, so
+    only the small aggregated tables are sent back between processes rather
+    than the play-by-play frames. Every table is then concatenated in season
+    order, so the result does not depend on n_jobs or on which task finishes
+    first.
+
+    Args:
+        seasons (list, optional): The seasons to build. Defaults to every season in directory.
+        directory (str, optional): The play-by-play directory. Defaults to PBP_DIR.
+        tables (dict, optional): A mapping of table name to the function building it.
+            The functions must be importable by the workers. Defaults to PIPELINE_TABLES.
+        ls (pd.DataFrame, optional): Lee Sharpe's games data, needed for the games
+            table. Defaults to None, which skips the games table.
+        columns (list, optional): The play-by-play columns to read. Defaults to the
+            columns the tables need.
+        chunk_size (int, optional): The seasons per task. Defaults to 1.
+        n_jobs (int, optional): The number of processes. Defaults to every core.
+
+    Returns:
+        dict: A dataframe for each table, in season order
+    """
+
+    if seasons is None:
+        seasons = list_pbp_seasons(directory)
+
+    seasons = sorted(seasons)
+    chunks = [seasons[i:i + chunk_size] for i in range(0, len(seasons), chunk_size)]
+    tasks = [(chunk, directory, tables, ls, columns) for chunk in chunks]
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+
+    if n_jobs <= 1:
+        results = [build_seasons(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_run_seasons, tasks))
+
+    return {name: _concat([result.get(name) for result in results])
+            for name in results[0]}
@@ -0,0 +1,302 @@
+import os
+import json
+import inspect
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from .feature_store import DATA_DIR
+from .pbp_frame import PbpFrame
+from .instrumentation import stage_context, worker_stage
+from .pbp_utils import (get_team_rush_yds, get_team_pass_yds, get_team_scores, get_opp_rush,
+                        get_opp_pass, get_game_results)
+
+
+DAG_CACHE_DIR = os.path.join(DATA_DIR, 'dag_cache')
+
+# the nodes building the game results table. each maps the keyword arguments
+# of its function to the node or source passed in. 'pbp' is processed
+# play-by-play data and 'ls' is Lee Sharpe's games data. bump a node's
+# version to rebuild it after changing code its function calls
+GAME_RESULTS_DAG = {
+    'team_rush_yds': {'func': get_team_rush_yds, 'inputs': {'df': 'pbp'}},
+    'team_pass_yds': {'func': get_team_pass_yds, 'inputs': {'df': 'pbp'}},
+    'team_scores': {'func': get_team_scores, 'inputs': {'df': 'pbp'}},
+    'opp_rush': {'func': get_opp_rush, 'inputs': {'df': 'pbp'}},
+    'opp_pass': {'func': get_opp_pass, 'inputs': {'df': 'pbp'}},
+    'game_results': {
+        'func': get_game_results,
+        'inputs': {
+            'df': 'pbp',
+            'team_rush_yds': 'team_rush_yds',
+            'team_pass_yds': 'team_pass_yds',
+            'team_scores': 'team_scores',
+            'opp_rush': 'opp_rush',
+            'opp_pass': 'opp_pass',
+            'ls': 'ls'
+        }
+    }
+}
+
+
+def _hash(payload: dict = None):
+    """
+    Hash a JSON-serializable payload
+    """
+
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str)
+                          .encode('utf-8')).hexdigest()
+
+
+def frame_hash(df: pd.DataFrame = None):
+    """
+    Hash the contents, column names and dtypes of a dataframe or PbpFrame
+    """
+
+    if isinstance(df, PbpFrame):
+        df = df.df
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()])
+                  .encode('utf-8'))
+    for col in df.columns:
+        digest.update(pd.util.hash_pandas_object(df[col], index=False).values.tobytes())
+
+    return digest.hexdigest()
+
+
+def code_hash(func=None):
+    """
+    Hash the source code of a function, looking through decorators
+    """
+
+    source = inspect.getsource(inspect.unwrap(func))
+
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def _check_dag(dag: dict = None, sources: dict = None):
+    """
+    Raise if a node reads an unknown input or the nodes form a cycle, and
+    return the nodes in an order where each follows its inputs
+    """
+
+    for name, node in dag.items():
+        for source in node['inputs'].values():
+            if source not in dag and source not in sources:
+                raise KeyError(f'{name} reads {source}, which is neither a node nor a source')
+
+    order, done, visiting = [], set(), set()
+
+    def visit(name):
+        if name in done or name in sources:
+            return
+        if name in visiting:
+            raise ValueError(f'the dag has a cycle through {name}')
+        visiting.add(name)
+        for source in dag[name]['inputs'].values():
+            visit(source)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in dag:
+        visit(name)
+
+    return order
+
+
+def node_keys(sources: dict = None, dag: dict = None):
+    """
+    A function that returns the cache key of every source and node.
+
+    A source's key is a hash of its contents. A node's key is a hash of its
+    function's code, its version and the keys of its inputs, so it changes
+    whenever anything upstream of it changes, without hashing any outputs.
+
+    Args:
+        sources (dict): A mapping of source name to dataframe, e.g. pbp and ls
+        dag (dict, optional): The nodes. Defaults to GAME_RESULTS_DAG.
+
+    Returns:
+        dict: The key of each source and node
+    """
+
+    if dag is None:
+        dag = GAME_RESULTS_DAG
+
+    keys = {name: frame_hash(df) for name, df in sources.items()}
+
+    for name in _check_dag(dag, sources):
+        node = dag[name]
+        keys[name] = _hash({
+            'node': name,
+            'code': code_hash(node['func']),
+            'version': node.get('version'),
+            'inputs': {arg: keys[source] for arg, source in node['inputs'].items()}
+        })
+
+    return keys
+
+
+def _cache_path(name: str = None, key: str = None, cache_dir: str = DAG_CACHE_DIR):
+    """
+    The cached output of a node
+    """
+
+    return os.path.join(cache_dir, f'{name}-{key[:24]}.pkl')
+
+
+def plan_dag(sources: dict = None, dag: dict = None, targets: list = None,
+             cache_dir: str = DAG_CACHE_DIR, use_cache: bool = True, keys: dict = None):
+    """
+    A function that returns what a run of the dag would do.
+
+    Only the nodes the targets depend on are planned. A node with a cached
+    output is read from the cache, and its inputs are not needed at all.
+
+    Args:
+        sources (dict): A mapping of source name to dataframe, e.g. pbp and ls
+        dag (dict, optional): The nodes. Defaults to GAME_RESULTS_DAG.
+        targets (list, optional): The nodes wanted. Defaults to every node.
+        cache_dir (str, optional): The cache directory. Defaults to DAG_CACHE_DIR.
+        use_cache (bool, optional): Whether to read cached outputs. Defaults to True.
+        keys (dict, optional): The output of node_keys, if already computed.
+
+    Returns:
+        dict: 'cached' or 'run' for each planned node
+    """
+
+    if dag is None:
+        dag = GAME_RESULTS_DAG
+    if keys is None:
+        keys = node_keys(sources, dag)
+
+    plan = {}
+
+    def visit(name):
+        if name in sources or name in plan:
+            return
+        if use_cache and os.path.exists(_cache_path(name, keys[name], cache_dir)):
+            plan[name] = 'cached'
+            return
+        plan[name] = 'run'
+        for source in dag[name]['inputs'].values():
+            visit(source)
+
+    for name in targets or list(dag):
+        visit(name)
+
+    return plan
+
+
+def _run_node(name: str = None, node: dict = None, inputs: dict = None, path: str = None,
+              context: dict = None):
+    """
+    Build a node's output on a pool thread, as a child of the stage that
+    started the run, and write it to the cache
+    """
+
+    with worker_stage(context):
+        result = node['func'](**inputs)
+
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so an interrupted run never leaves a partial entry
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        # pickled rather than parquet, which reads integer categoricals back as
+        # plain integers, so a cached output is identical to a rebuilt one
+        result.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    return result
+
+
+def run_dag(sources: dict = None, dag: dict = None, targets: list = None,
+            cache_dir: str = DAG_CACHE_DIR, use_cache: bool = True, n_jobs: int = None):
+    """
+    A function that builds the nodes of a dag, reusing cached outputs whose
+    inputs and code have not changed.
+
+    Nodes run on a thread pool as soon as their inputs are ready, so
+    independent nodes such as the five team tables under game_results run
+    at the same time and share the factorized keys of one PbpFrame. After a
+    change to get_opp_pass, for example, only opp_pass and game_results are
+    rebuilt and the other team tables are read from the cache.
+
+    With instrumentation enabled the nodes are recorded as children of the
+    stage calling run_dag, without their own peak memory, which tracemalloc
+    cannot tell apart between threads.
+
+    Args:
+        sources (dict): A mapping of source name to dataframe. For GAME_RESULTS_DAG,
+            pbp (processed play-by-play data, a dataframe or PbpFrame) and ls
+            (Lee Sharpe's games data)
+        dag (dict, optional): A mapping of node name to a dict with its function
+            ('func'), a mapping of keyword argument to input node or source
+            ('inputs') and optionally a 'version'. Defaults to GAME_RESULTS_DAG.
+        targets (list, optional): The nodes to return. Defaults to every node.
+        cache_dir (str, optional): The cache directory. Defaults to DAG_CACHE_DIR.
+        use_cache (bool, optional): Whether to read and write cached outputs. Defaults to True.
+        n_jobs (int, optional): The number of threads. Defaults to the executor's default.
+
+    Returns:
+        dict: A dataframe for each target
+    """
+
+    if dag is None:
+        dag = GAME_RESULTS_DAG
+    if targets is None:
+        targets = list(dag)
+
+    sources = {name: PbpFrame(df) if name == 'pbp' and not isinstance(df, PbpFrame) else df
+               for name, df in sources.items()}
+
+    keys = node_keys(sources, dag)
+    plan = plan_dag(sources, dag, targets, cache_dir, use_cache, keys)
+    context = stage_context()
+
+    values = dict(sources)
+    pending = set(plan)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                path = _cache_path(name, keys[name], cache_dir)
+                if plan[name] == 'cached':
+                    running[pool.submit(pd.read_pickle, path)] = name
+                elif all(source in values for source in dag[name]['inputs'].values()):
+                    inputs = {arg: values[source]
+                              for arg, source in dag[name]['inputs'].items()}
+                    running[pool.submit(_run_node, name, dag[name], inputs,
+                                        path if use_cache else None, context)] = name
+                else:
+                    continue
+                pending.discard(name)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                values[running.pop(future)] = future.result()
+
+    return {name: values[name] for name in targets}
+
+
+def clear_dag_cache(cache_dir: str = DAG_CACHE_DIR):
+    """
+    Delete every cached node output
+
+    Returns:
+        int: The number of outputs deleted
+    """
+
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    files = [file for file in os.listdir(cache_dir) if file.endswith('.pkl')]
+    for file in files:
+        os.remove(os.path.join(cache_dir, file))
+
+    return len(files)
@@ -0,0 +1,386 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import DATA_DIR
+
+
+PLAYER_INDEX_PATH = os.path.join(DATA_DIR, 'player_index.parquet')
+
+# where each source keeps its player ids and names. a source can have several
+# players per row, like the passer, rusher and receiver of a play. the fields
+# are gsis_id, pfr_id, name (the abbreviated pbp name, e.g. 'A.Rodgers'),
+# full_name, team and season
+PLAYER_ID_SOURCES = {
+    'pbp': [
+        {'gsis_id': f'{role}_player_id', 'name': f'{role}_player_name', 'team': 'posteam',
+         'season': 'season'}
+        for role in ['passer', 'rusher', 'receiver', 'kicker']
+    ],
+    'player_stats': [{'gsis_id': 'player_id', 'name': 'player_name',
+                      'full_name': 'player_display_name', 'team': 'recent_team',
+                      'season': 'season'}],
+    'depth_charts': [{'gsis_id': 'gsis_id', 'full_name': 'full_name', 'team': 'club_code',
+                      'season': 'season'}],
+    'snap_counts': [{'pfr_id': 'pfr_player_id', 'full_name': 'player', 'team': 'team',
+                     'season': 'season'}],
+    'pfr_advanced': [{'pfr_id': 'pfr_player_id', 'full_name': 'pfr_player_name',
+                      'team': 'team', 'season': 'season'}],
+    'ngs': [{'gsis_id': 'player_gsis_id', 'name': 'player_short_name',
+             'full_name': 'player_display_name', 'team': 'team_abbr', 'season': 'season'}],
+    'draft_picks': [{'gsis_id': 'gsis_id', 'pfr_id': 'pfr_player_id',
+                     'full_name': 'pfr_player_name'}],
+    'rosters': [{'gsis_id': 'gsis_id', 'pfr_id': 'pfr_id', 'full_name': 'full_name',
+                 'team': 'team', 'season': 'season'}]
+}
+
+# ids that name one player on their own. names only do within a season and team
+ID_KINDS = ['gsis_id', 'pfr_id']
+NAME_KINDS = ['name', 'full_name']
+
+INDEX_COLUMNS = ['kind', 'value', 'season', 'team', 'player_key']
+
+
+def normalize_names(names: pd.Series = None):
+    """
+    Lower-case full names and drop punctuation and suffixes, so 'D.K. Metcalf'
+    matches 'DK Metcalf' and 'Odell Beckham Jr.' matches 'Odell Beckham'
+    """
+
+    return (
+        names.astype('string').str.lower()
+        .str.replace(r"[.',]", '', regex=True)
+        .str.replace('-', ' ', regex=False)
+        .str.replace(r'\s+(jr|sr|ii|iii|iv|v)$', '', regex=True)
+        .str.split().str.join(' ')
+    )
+
+
+def _observations(sources: dict = None):
+    """
+    Stack the ids and names of every source into one frame of gsis_id,
+    pfr_id, name, full_name, team and season
+    """
+
+    fields = ['gsis_id', 'pfr_id', 'name', 'full_name', 'team', 'season']
+    frames = []
+
+    for source, df in sources.items():
+        for spec in PLAYER_ID_SOURCES[source]:
+            cols = {col: field for field, col in spec.items() if col in df.columns}
+            if not set(cols.values()) & set(ID_KINDS):
+                continue
+            frame = df[list(cols)].rename(columns=cols).drop_duplicates()
+            frames.append(frame.reindex(columns=fields))
+
+    obs = pd.concat(frames, ignore_index=True)
+    obs = obs[obs['gsis_id'].notna() | obs['pfr_id'].notna()]
+
+    obs['season'] = obs['season'].fillna(-1).astype(int)
+    obs['team'] = obs['team'].fillna('').astype(str)
+    obs['full_name'] = normalize_names(obs['full_name'])
+
+    return obs.drop_duplicates().reset_index(drop=True)
+
+
+def _unique_links(df: pd.DataFrame = None, on: list = None):
+    """
+    Keep the rows of on that point to one player_key, dropping ambiguous ones
+    """
+
+    df = df.drop_duplicates(subset=on + ['player_key'])
+
+    return df[~df.duplicated(subset=on, keep=False)]
+
+
+def build_player_index(sources: dict = None, index: pd.DataFrame = None):
+    """
+    A function that builds or extends the player identity index, which maps
+    every id and name a source uses for a player to one integer player_key.
+
+    Each GSIS id gets a key. PFR ids are linked to a GSIS id through a source
+    carrying both (draft picks or rosters), or failing that through a unique
+    normalized full-name match within a season and team, e.g. snap counts
+    against depth charts. A PFR id with no link gets a key of its own.
+    Names are kept per season and team, where they are unique, so a pbp
+    name like 'Aa.Rodgers' or 'Jos.Smith' resolves to the same key as the
+    player's GSIS id.
+
+    The keys of GSIS ids never change, so tables keyed on them stay valid as
+    sources are added. A PFR id with a key of its own is linked again
+    whenever a build brings in new GSIS ids or names, with the season and
+    team names already in the index, so adding sources one at a time links
+    the same players as adding them at once. When it links, its old key is
+    retired: every entry moves to the GSIS id's key, and a 'merged_key' entry
+    records the move (see current_keys).
+
+    Args:
+        sources (dict): A mapping of source name in PLAYER_ID_SOURCES to its dataframe,
+            e.g. {'pbp': pbp, 'depth_charts': depth_charts, 'snap_counts': snaps}
+        index (pd.DataFrame, optional): An index to extend. Defaults to None.
+
+    Returns:
+        df (pd.DataFrame): The index, one row per kind (gsis_id, pfr_id, name,
+            full_name, merged_key) and value, with the season and team the value
+            is scoped to (-1 and '' for ids) and its player_key
+    """
+
+    if index is None:
+        index = pd.DataFrame({'kind': pd.Series(dtype=object), 'value': pd.Series(dtype=object),
+                              'season': pd.Series(dtype=int), 'team': pd.Series(dtype=object),
+                              'player_key': pd.Series(dtype=np.int32)})
+
+    obs = _observations(sources)
+    next_key = int(index['player_key'].max()) + 1 if len(index) else 0
+
+    def new_keys(values):
+        nonlocal next_key
+        keys = np.arange(next_key, next_key + len(values), dtype=np.int32)
+        next_key += len(values)
+        return pd.Series(keys, index=values)
+
+    def existing(kind):
+        kept = index[index['kind'] == kind]
+        return pd.Series(kept['player_key'].to_numpy(), index=kept['value'].to_numpy())
+
+    # every gsis id, new ones numbered in sorted order so a build is reproducible
+    gsis = existing('gsis_id')
+    unseen = pd.Index(obs['gsis_id'].dropna().unique()).difference(gsis.index)
+    gsis = pd.concat([gsis, new_keys(unseen.sort_values())])
+
+    obs['player_key'] = obs['gsis_id'].map(gsis)
+
+    # pfr ids: a crosswalk, then the existing index, then a name match, then a
+    # new key. pfr ids of the index without a gsis id are matched again
+    crosswalk = _unique_links(obs.dropna(subset=['pfr_id', 'player_key'])
+                              [['pfr_id', 'player_key']], ['pfr_id'])
+    old_pfr = existing('pfr_id')
+    pfr_only = old_pfr[~old_pfr.isin(gsis)]
+    pfr = pd.concat([old_pfr[old_pfr.isin(gsis) & ~old_pfr.index.isin(crosswalk['pfr_id'])],
+                     crosswalk.set_index('pfr_id')['player_key']])
+
+    names = index[index['kind'] == 'full_name'].rename(columns={'value': 'full_name'})
+    # the pfr ids to match by name, with the names they were seen under
+    unlinked = pd.concat([
+        obs[obs['pfr_id'].notna() & ~obs['pfr_id'].isin(pfr.index)],
+        names.assign(pfr_id=names['player_key'].map(
+            pd.Series(pfr_only.index, index=pfr_only.to_numpy())))
+        .dropna(subset=['pfr_id'])
+    ])
+    unlinked = unlinked[~unlinked['pfr_id'].isin(pfr.index)]
+
+    if len(unlinked):
+        # only names of gsis ids are candidates, so the unlinked names already in
+        # the index never make a new name ambiguous
+        candidates = pd.concat([
+            obs.dropna(subset=['player_key', 'full_name'])[['season', 'team', 'full_name',
+                                                           'player_key']],
+            names[names['player_key'].isin(gsis)][['season', 'team', 'full_name', 'player_key']]
+        ])
+        # a name two pfr ids share within a season and team links neither, as the
+        # index drops it
+        seen = unlinked.drop_duplicates(subset=['pfr_id', 'season', 'team', 'full_name'])
+        seen = seen[~seen.duplicated(subset=['season', 'team', 'full_name'], keep=False)]
+        matched = (
+            seen[['pfr_id', 'season', 'team', 'full_name']]
+            .merge(_unique_links(candidates, ['season', 'team', 'full_name']),
+                   on=['season', 'team', 'full_name'])
+        )
+        matched = _unique_links(matched[['pfr_id', 'player_key']], ['pfr_id'])
+        pfr = pd.concat([pfr, matched.set_index('pfr_id')['player_key'],
+                         pfr_only[~pfr_only.index.isin(matched['pfr_id'])]])
+        unseen = pd.Index(unlinked['pfr_id'].unique()).difference(pfr.index)
+        pfr = pd.concat([pfr, new_keys(unseen.sort_values())])
+
+    pfr = pfr[~pfr.index.duplicated(keep='first')]
+
+    # the keys of pfr ids now linked to a gsis id are retired, and every entry
+    # under them moves to the gsis id's key
+    relinked = pfr.reindex(pfr_only.index)
+    remap = pd.Series(relinked.to_numpy(), index=pfr_only.to_numpy())
+    remap = remap[remap.notna() & (remap.index != remap)].astype(np.int32)
+    if len(remap):
+        index = index.assign(player_key=index['player_key'].replace(remap.to_dict()))
+        index = pd.concat([index, pd.DataFrame({
+            'kind': 'merged_key', 'value': remap.index.astype(str), 'season': -1, 'team': '',
+            'player_key': remap.to_numpy()})])
+
+    obs['player_key'] = obs['player_key'].fillna(obs['pfr_id'].map(pfr)).astype(np.int32)
+
+    parts = [
+        pd.DataFrame({'kind': kind, 'value': keys.index, 'season': -1, 'team': '',
+                      'player_key': keys.to_numpy()})
+        for kind, keys in [('gsis_id', gsis), ('pfr_id', pfr)]
+    ]
+    parts.append(index[index['kind'] == 'merged_key'][INDEX_COLUMNS])
+
+    for kind in NAME_KINDS:
+        names = pd.concat([
+            index[index['kind'] == kind],
+            obs.dropna(subset=[kind]).assign(kind=kind).rename(columns={kind: 'value'})
+        ])[INDEX_COLUMNS]
+        parts.append(_unique_links(names, ['kind', 'value', 'season', 'team']))
+
+    index = pd.concat(parts, ignore_index=True)[INDEX_COLUMNS]
+    index['season'] = index['season'].astype(int)
+    index['player_key'] = index['player_key'].astype(np.int32)
+
+    return index.sort_values(by=['kind', 'player_key', 'season'], ignore_index=True)
+
+
+def current_keys(index: pd.DataFrame = None, keys=None):
+    """
+    A function that maps player_keys saved before the index was extended to
+    their current keys, following the merged_key entries of retired keys.
+
+    Args:
+        index (pd.DataFrame): The player index
+        keys (array-like): The saved player_keys
+
+    Returns:
+        np.ndarray: The current player_key of each key
+    """
+
+    keys = np.asarray(keys, dtype=np.int32)
+    merged = index[index['kind'] == 'merged_key']
+    moves = pd.Series(merged['player_key'].to_numpy(),
+                      index=merged['value'].astype(np.int64).to_numpy())
+
+    return pd.Series(keys).map(moves).fillna(pd.Series(keys)).to_numpy().astype(np.int32)
+
+
+def player_keys(index: pd.DataFrame = None, values=None, kind: str = 'gsis_id',
+                season=None, team=None):
+    """
+    A function that looks up the player_key of ids or names.
+
+    Args:
+        index (pd.DataFrame): The player index
+        values (array-like): The ids or names
+        kind (str, optional): gsis_id, pfr_id, name or full_name. Defaults to 'gsis_id'.
+        season (array-like, optional): The season of each value, needed for names
+        team (array-like, optional): The team of each value, needed for names
+
+    Returns:
+        np.ndarray: The player_key of each value, -1 where it is not in the index
+    """
+
+    entries = index[index['kind'] == kind]
+    values = pd.Series(np.asarray(values, dtype=object))
+
+    if kind in ID_KINDS:
+        positions = pd.Index(entries['value']).get_indexer(values)
+    else:
+        if kind == 'full_name':
+            values = normalize_names(values).astype(object)
+        lookup = pd.MultiIndex.from_arrays(
+            [entries['season'].to_numpy(), entries['team'].to_numpy(),
+             entries['value'].to_numpy()])
+        positions = lookup.get_indexer(pd.MultiIndex.from_arrays(
+            [np.asarray(season, dtype=int), np.asarray(team, dtype=object), values]))
+
+    return np.where(positions >= 0, entries['player_key'].to_numpy()[positions],
+                    -1).astype(np.int32)
+
+
+def add_player_key(df: pd.DataFrame = None, index: pd.DataFrame = None,
+                   col: str = 'player_id', kind: str = 'gsis_id', team_col: str = 'team',
+                   key_col: str = 'player_key'):
+    """
+    A function that adds the player_key of an id or name column, so tables
+    from different sources can be merged on one integer column.
+
+    The season of a name is taken from a season column, or else from the
+    game_id, as in the pbp_utils outputs.
+
+    Args:
+        df (pd.DataFrame): The dataframe
+        index (pd.DataFrame): The player index
+        col (str, optional): The id or name column. Defaults to 'player_id'.
+        kind (str, optional): gsis_id, pfr_id, name or full_name. Defaults to 'gsis_id'.
+        team_col (str, optional): The team column, for names. Defaults to 'team'.
+        key_col (str, optional): The column to add. Defaults to 'player_key'.
+
+    Returns:
+        df (pd.DataFrame): df with key_col, -1 where the player is not in the index.
+            Drop those rows before merging, since -1 would match -1.
+    """
+
+    season = team = None
+    if kind in NAME_KINDS:
+        season = (df['season'] if 'season' in df.columns
+                  else df['game_id'].astype(str).str[:4].astype(int))
+        team = df[team_col].astype(str)
+
+    return df.assign(**{key_col: player_keys(index, df[col], kind, season, team)})
+
+
+def get_players(index: pd.DataFrame = None):
+    """
+    A function that returns one row per player with their ids and latest names.
+
+    Args:
+        index (pd.DataFrame): The player index
+
+    Returns:
+        df (pd.DataFrame): The gsis_id, pfr_id, name and full_name of each player_key
+    """
+
+    latest = (
+        index
+        .sort_values(by=['player_key', 'season'], kind='stable')
+        .drop_duplicates(subset=['player_key', 'kind'], keep='last')
+        .pivot(index='player_key', columns='kind', values='value')
+    )
+
+    return latest.reindex(columns=ID_KINDS + NAME_KINDS).rename_axis(columns=None).reset_index()
+
+
+def save_player_index(index: pd.DataFrame = None, path: str = PLAYER_INDEX_PATH):
+    """
+    Save the player index
+
+    Args:
+        index (pd.DataFrame): The player index
+        path (str, optional): The file to write. Defaults to PLAYER_INDEX_PATH.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    index.to_parquet(path, index=False)
+
+
+def load_player_index(path: str = PLAYER_INDEX_PATH):
+    """
+    A function that returns the saved player index, or None if there is none
+
+    Args:
+        path (str, optional): The saved index. Defaults to PLAYER_INDEX_PATH.
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    index = pd.read_parquet(path)
+    index['player_key'] = index['player_key'].astype(np.int32)
+
+    return index
+
+
+def update_player_index(sources: dict = None, path: str = PLAYER_INDEX_PATH):
+    """
+    A function that adds new sources to the saved player index, keeping the
+    keys already given out.
+
+    Args:
+        sources (dict): A mapping of source name in PLAYER_ID_SOURCES to its dataframe
+        path (str, optional): The saved index. Defaults to PLAYER_INDEX_PATH.
+
+    Returns:
+        df (pd.DataFrame): The updated index
+    """
+
+    index = build_player_index(sources, load_player_index(path))
+    save_player_index(index, path)
+
+    return index
@@ -1,36 +1,115 @@
-import os
 import pandas as pd
-from sqlalchemy import create_engine
-import psycopg2
 
-from dotenv import load_dotenv
-load_dotenv()
+from sqlalchemy import text
 
+from . import query_cache
+from .instrumentation import instrumented
+from .engines import get_engine, get_db_uri, database_url
 
-def get_game_stats(min_year=2000) -> int:
+
+def stream_query(query: str = None, params: dict = None, chunksize: int = 50000,
+                 URI: str = None):
+    """
+    Run a query through a server-side cursor and yield the result in chunks,
+    so only one chunk of rows is held in memory at a time.
+
+    Args:
+        query (str): The SQL text, with :name placeholders for the parameters
+        params (dict, optional): The bound parameters. Defaults to None.
+        chunksize (int, optional): The number of rows in each chunk. Defaults to 50000.
+        URI (str, optional): Credentials for the database. Defaults to the environment.
+
+    Yields:
+        df (pd.DataFrame): The next chunk of rows
+    """
+
+    engine = get_engine(URI or get_db_uri())
+
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), con=conn, params=params, chunksize=chunksize):
+            yield chunk
+
+
+@instrumented(result_bytes=True)
+def run_query(query: str = None, params: dict = None, tables: list = None,
+              chunksize: int = None, use_cache: bool = True,
+              ttl: int = query_cache.CACHE_TTL, URI: str = None):
+    """
+    Run a query with bound parameters, reusing a cached result when one exists.
+
+    Cached results are keyed on the database URL as well as the query, with
+    the password left out, so results from a stand-in database are never
+    returned for the real one.
+
+    Args:
+        query (str): The SQL text, with :name placeholders for the parameters
+        params (dict, optional): The bound parameters. Defaults to None.
+        tables (list, optional): The tables the query reads. Reloading one of
+            them with db_utils invalidates the cached result. Defaults to None.
+        chunksize (int, optional): If given, stream the result in chunks of this
+            many rows instead, bypassing the cache. Defaults to None.
+        use_cache (bool, optional): Whether to read and write the result cache.
+            Defaults to True.
+        ttl (int, optional): The maximum age of a cached result in seconds.
+            Defaults to query_cache.CACHE_TTL.
+        URI (str, optional): Credentials for the database. Defaults to the environment.
+
+    Returns:
+        df (pd.DataFrame): The query result, or a generator of chunks if chunksize is given
+    """
+
+    if chunksize is not None:
+        return stream_query(query, params, chunksize=chunksize, URI=URI)
+
+    engine = get_engine(URI or get_db_uri())
+    database = database_url(URI)
+
+    if use_cache:
+        cached = query_cache.get(query, params, ttl=ttl, database=database)
+        if cached is not None:
+            return cached
+
+    result = pd.read_sql(text(query), con=engine, params=params)
+
+    if use_cache:
+        query_cache.put(query, params, result, tables=tables, database=database)
+
+    return result
+
+
+@instrumented(result_bytes=True)
+def get_game_stats(min_year=2000, max_year=None, chunksize=None, use_cache=True, URI=None):
     """
     This function takes a minimum year and return a dataframe with team stats for each game.
-        """
 
-    # loading up the postgres credentials
-    user = os.getenv('DB_USER')
-    password = os.getenv('DB_PASSWORD')
-    host = os.getenv('DB_HOST')
-    database = os.getenv('DB_NAME')
-    port = os.getenv('DB_PORT')
+    The season range is passed as bound parameters. Results are cached on
+    disk until the pbp table is reloaded; with chunksize the rows are
+    streamed from a server-side cursor instead.
+
+    Args:
+        min_year (int, optional): The first season. Defaults to 2000.
+        max_year (int, optional): The last season. Defaults to no limit.
+        chunksize (int, optional): Stream the result in chunks of this many rows.
+            Defaults to None.
+        use_cache (bool, optional): Whether to use the query result cache. Defaults to True.
+        URI (str, optional): Credentials for the database. Defaults to the environment.
 
-    # # creating the URI for the database
-    URI = f'postgresql://{user}:{password}@{host}:{port}/{database}'
+    Returns:
+        df (pd.DataFrame): Team stats for each game, or a generator of chunks
+    """
 
-    # # establishing a connection to the database
-    engine = create_engine(URI)    
-    
     if min_year < 2000:
         return "Please enter a year greater than 2000"
-    
 
-    game_stat_query = """
-        select 
+    params = {'min_year': min_year}
+    season_filter = 'season >= :min_year'
+
+    if max_year is not None:
+        params['max_year'] = max_year
+        season_filter += ' and season <= :max_year'
+
+    game_stat_query = f"""
+        select
             game_id,
             home_team,
             away_team,
@@ -45,11 +124,10 @@ def get_game_stats(min_year=2000) -> int:
             sum(case when posteam = away_team and play_type_nfl = 'PASS' then epa else 0 end) as away_pass_epa,
             sum(case when posteam = home_team and play_type_nfl = 'SACK' then 1 else 0 end) as away_team_sacks
         from pbp
-        where season >=2016
+        where {season_filter}
         group by game_id, home_team, away_team
         order by game_id asc
     """
 
-    game_stats = pd.read_sql(game_stat_query, con=engine)
-    
-    return game_stats
\ No newline at end of file
+    return run_query(game_stat_query, params, tables=['pbp'], chunksize=chunksize,
+                     use_cache=use_cache, URI=URI)
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+
+import pandas as pd
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'data', 'query_cache')
+
+# cached results older than this many seconds are treated as missing
+CACHE_TTL = 7 * 24 * 60 * 60
+
+# once the cache grows past this many bytes the least recently used results are dropped
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def cache_key(query: str = None, params: dict = None, database: str = None):
+    """
+    Hash the SQL text, its bound parameters and the database it runs on into
+    a cache key, so the same query against two databases never shares a result
+    """
+
+    payload = json.dumps({'query': ' '.join(query.split()), 'params': params or {},
+                          'database': database},
+                         sort_keys=True, default=str)
+
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _paths(key: str = None, cache_dir: str = CACHE_DIR):
+    """
+    The result and metadata files of a cache entry
+    """
+
+    base = os.path.join(cache_dir, key)
+
+    return f'{base}.parquet', f'{base}.json'
+
+
+def _entries(cache_dir: str = CACHE_DIR):
+    """
+    Yield the key and metadata of every cache entry
+    """
+
+    if not os.path.isdir(cache_dir):
+        return
+
+    for file in os.listdir(cache_dir):
+        if not file.endswith('.json'):
+            continue
+        key = file[:-len('.json')]
+        try:
+            with open(os.path.join(cache_dir, file)) as f:
+                yield key, json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def remove(key: str = None, cache_dir: str = CACHE_DIR):
+    """
+    Delete one cache entry
+    """
+
+    for path in _paths(key, cache_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get(query: str = None, params: dict = None, ttl: int = CACHE_TTL,
+        cache_dir: str = CACHE_DIR, database: str = None):
+    """
+    Look up a cached query result.
+
+    Args:
+        query (str): The SQL text
+        params (dict, optional): The bound parameters. Defaults to None.
+        ttl (int, optional): The maximum age in seconds. Defaults to CACHE_TTL.
+        cache_dir (str, optional): The cache directory. Defaults to CACHE_DIR.
+        database (str, optional): The database URL, without the password. Defaults to None.
+
+    Returns:
+        df (pd.DataFrame): The cached result, or None if it is missing or expired
+    """
+
+    key = cache_key(query, params, database)
+    data_path, meta_path = _paths(key, cache_dir)
+
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    if time.time() - meta['created'] > ttl:
+        remove(key, cache_dir)
+        return None
+
+    # touching the result marks it as recently used for eviction
+    os.utime(data_path)
+
+    return pd.read_parquet(data_path)
+
+
+def put(query: str = None, params: dict = None, df: pd.DataFrame = None,
+        tables: list = None, max_bytes: int = CACHE_MAX_BYTES,
+        cache_dir: str = CACHE_DIR, database: str = None):
+    """
+    Store a query result, then evict the least recently used results while
+    the cache is larger than max_bytes.
+
+    Args:
+        query (str): The SQL text
+        params (dict, optional): The bound parameters. Defaults to None.
+        df (pd.DataFrame): The query result
+        tables (list, optional): The tables the query reads, so reloading one
+            of them invalidates the result. Defaults to None.
+        max_bytes (int, optional): The size limit of the cache. Defaults to CACHE_MAX_BYTES.
+        cache_dir (str, optional): The cache directory. Defaults to CACHE_DIR.
+        database (str, optional): The database URL, without the password. Defaults to None.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    key = cache_key(query, params, database)
+    data_path, meta_path = _paths(key, cache_dir)
+
+    df.to_parquet(data_path, index=False)
+
+    with open(meta_path, 'w') as f:
+        json.dump({'query': query, 'params': params or {}, 'database': database,
+                   'tables': list(tables or []), 'created': time.time()}, f, default=str)
+
+    evict(max_bytes, cache_dir)
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES, cache_dir: str = CACHE_DIR):
+    """
+    Drop the least recently used results until the cache fits in max_bytes
+    """
+
+    sizes = []
+    for key, _ in _entries(cache_dir):
+        data_path, _ = _paths(key, cache_dir)
+        if os.path.exists(data_path):
+            stat = os.stat(data_path)
+            sizes.append((stat.st_mtime, stat.st_size, key))
+
+    total = sum(size for _, size, _ in sizes)
+
+    for _, size, key in sorted(sizes):
+        if total <= max_bytes:
+            break
+        remove(key, cache_dir)
+        total -= size
+
+
+def invalidate(table_name: str = None, cache_dir: str = CACHE_DIR, database: str = None):
+    """
+    Drop every cached result that reads a table, or the whole cache when no
+    table is given. Called whenever a table is reloaded, with the database it
+    was reloaded in, so results of the same table in other databases are kept.
+
+    Args:
+        table_name (str, optional): The reloaded table. Defaults to None.
+        cache_dir (str, optional): The cache directory. Defaults to CACHE_DIR.
+        database (str, optional): The database URL, without the password, as from
+            engines.database_url. Defaults to None, which drops the results of every database.
+
+    Returns:
+        int: The number of results dropped
+    """
+
+    dropped = 0
+
+    for key, meta in list(_entries(cache_dir)):
+        if database is not None and meta.get('database') != database:
+            continue
+        if table_name is None or table_name in meta.get('tables', []):
+            remove(key, cache_dir)
+            dropped += 1
+
+    return dropped
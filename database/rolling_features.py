@@ -0,0 +1,335 @@
+import pandas as pd
+import numpy as np
+
+
+# the lagged features of the feature_processing notebook. each feature is
+# the column it averages, the window type and its span or window, as in
+# x.shift(shift).ewm(span=span, adjust=adjust, min_periods=min_periods).mean()
+# or x.shift(shift).rolling(window, min_periods=min_periods).mean(), and the
+# grouping when the notebook does not group by player_id
+
+# add_qb_rolling_stats(df=qb_df, n=15), grouped by the player name
+QB_FEATURES = {
+    'rolling_pass_attempts': {'col': 'att', 'kind': 'ewm', 'span': 9, 'by': 'player'},
+    'rolling_pass_yards': {'col': 'pass_yards', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_air_yards': {'col': 'air_yards', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_ints': {'col': 'interception', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_pass_tds': {'col': 'touchdown', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_pass_success': {'col': 'pass_success_perc', 'kind': 'rolling', 'window': 15,
+                             'min_periods': 1, 'by': 'player'},
+    'rolling_rush_att': {'col': 'rush_att', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_rush_yds': {'col': 'rush_yds', 'kind': 'ewm', 'span': 15, 'by': 'player'},
+    'rolling_rush_tds': {'col': 'rush_td', 'kind': 'rolling', 'window': 15, 'min_periods': 1,
+                         'by': 'player'},
+    'rolling_rush_att_share': {'col': 'rush_att_share', 'kind': 'rolling', 'window': 15,
+                               'min_periods': 1, 'by': 'player'},
+    'rolling_epa_total': {'col': 'total_epa', 'kind': 'ewm', 'span': 15, 'min_periods': 1,
+                          'by': 'player'},
+    'rolling_pass_epa': {'col': 'epa', 'kind': 'ewm', 'span': 10, 'min_periods': 1,
+                         'by': 'player'},
+    'rolling_dk_points': {'col': 'dk_points', 'kind': 'ewm', 'span': 12, 'by': 'player'}
+}
+
+# get_rolling_rec(df=rec_df), which also fills the missing rolling_rec_dk_points
+# with 0. that is left to the caller, like the notebook's other fillna calls
+REC_FEATURES = {
+    'rolling_targets': {'col': 'targets', 'kind': 'ewm', 'span': 5},
+    'rolling_receptions': {'col': 'rec', 'kind': 'ewm', 'span': 10},
+    'rolling_air_yards': {'col': 'air_yards', 'kind': 'ewm', 'span': 12},
+    'rolling_rec_yards': {'col': 'rec_yards', 'kind': 'ewm', 'span': 12},
+    'rolling_target_share': {'col': 'target_share', 'kind': 'ewm', 'span': 4},
+    'rolling_aDOT': {'col': 'aDOT', 'kind': 'rolling', 'window': 12, 'min_periods': 1},
+    'rolling_td': {'col': 'td', 'kind': 'ewm', 'span': 12},
+    'rolling_rec_dk_points': {'col': 'rec_dk_points', 'kind': 'ewm', 'span': 12}
+}
+
+# get_rolling_rush(df=run_df). the notebook also rounds rolling_rush_att_share
+# to 1 decimal and multiplies it by 100, which is left to the caller
+RUSH_FEATURES = {
+    'rolling_rush_att': {'col': 'rush_att', 'kind': 'ewm', 'span': 6},
+    'rolling_rush_yds': {'col': 'rush_yds', 'kind': 'ewm', 'span': 15},
+    'rolling_rush_td': {'col': 'rush_td', 'kind': 'ewm', 'span': 15},
+    'rolling_rush_att_share': {'col': 'rush_att_share', 'kind': 'ewm', 'span': 4},
+    'rolling_rush_dk_pts': {'col': 'rush_dk_points', 'kind': 'ewm', 'span': 15}
+}
+
+# grouped by kicker and team. the notebook rounds the kicker table to 2 decimals
+# afterwards, which is left to the caller
+KICKER_FEATURES = {
+    'rolling_pat': {'col': 'pats', 'kind': 'ewm', 'span': 15,
+                    'by': ['kicker_player_id', 'team']},
+    'rolling_39': {'col': 'fg_0_39', 'kind': 'ewm', 'span': 15,
+                   'by': ['kicker_player_id', 'team']},
+    'rolling_49': {'col': 'fg_40_49', 'kind': 'ewm', 'span': 15,
+                   'by': ['kicker_player_id', 'team']},
+    'rolling_50': {'col': 'fg_50_on', 'kind': 'ewm', 'span': 15,
+                   'by': ['kicker_player_id', 'team']},
+    'rolling_dk_points': {'col': 'kicker_dk_points', 'kind': 'ewm', 'span': 15,
+                          'by': ['kicker_player_id', 'team']},
+    'rolling_fd_points': {'col': 'kicker_fd_points', 'kind': 'ewm', 'span': 15,
+                          'by': ['kicker_player_id', 'team']}
+}
+
+# add_rolling_stats(df=df), grouped by team or by opponent
+TEAM_FEATURES = {
+    'team_rolling_pass_att': {'col': 'pass_attempt', 'kind': 'rolling', 'window': 6},
+    'team_rolling_run_att': {'col': 'rush_attempt', 'kind': 'rolling', 'window': 6},
+    'team_rolling_pass_yds': {'col': 'pass_yards', 'kind': 'rolling', 'window': 6},
+    'team_rolling_run_yds': {'col': 'rush_yards', 'kind': 'rolling', 'window': 6},
+    'team_pass_speed': {'col': 'sec_per_play', 'kind': 'rolling', 'window': 6},
+    'opp_rolling_pass_yds': {'col': 'opp_pass_yds', 'kind': 'rolling', 'window': 6,
+                             'by': 'opp_team'},
+    'opp_rolling_rush_yds': {'col': 'opp_rush_yds', 'kind': 'rolling', 'window': 6,
+                             'by': 'opp_team'},
+    'opp_rolling_sacks': {'col': 'def_sack', 'kind': 'rolling', 'window': 6,
+                          'by': 'opp_team'}
+}
+
+
+def _group_layout(df: pd.DataFrame = None, by=None):
+    """
+    Sort the rows by group, keeping their order within each group.
+
+    Returns:
+        tuple: The row positions in group order, the group code of each
+        sorted row (-1 where a key is missing) and each sorted row's position
+        within its group
+    """
+
+    by = [by] if isinstance(by, str) else list(by)
+
+    codes = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+
+    for col in by:
+        col_codes, uniques = pd.factorize(df[col])
+        codes = codes * max(len(uniques), 1) + col_codes
+        valid &= col_codes >= 0
+
+    codes = np.where(valid, pd.factorize(codes)[0], -1)
+
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    sizes = np.diff(np.r_[starts, len(order)])
+    position = np.arange(len(order)) - np.repeat(starts, sizes)
+
+    return order, sorted_codes, position
+
+
+def _shifted(values: np.ndarray = None, position: np.ndarray = None, shift: int = 1):
+    """
+    Shift group-sorted values down by shift rows within each group
+    """
+
+    if shift == 0:
+        return values
+
+    out = np.full_like(values, np.nan)
+    out[shift:] = values[:-shift]
+    out[position < shift] = np.nan
+
+    return out
+
+
+def _ewm_params(spans: list = None, adjust: list = None, min_periods: list = None):
+    """
+    The per-feature constants of pandas' ewm recurrence: the decay of the
+    old weight, the weight of a new value, the adjust flag and min_periods
+    """
+
+    com = (np.asarray(spans, dtype=np.float64) - 1) / 2.
+    alpha = 1. / (1. + com)
+    adjust = np.asarray(adjust, dtype=bool)
+
+    return (1. - alpha, np.where(adjust, 1., alpha), adjust,
+            np.maximum(np.asarray(min_periods, dtype=np.int64), 1))
+
+
+def _ewm_step(cur: np.ndarray = None, weighted: np.ndarray = None, old_wt: np.ndarray = None,
+              nobs: np.ndarray = None, params: tuple = None):
+    """
+    Add one value per group and feature to the ewm accumulators, exactly as
+    pandas' ewm does for each new row of a group.
+
+    Returns:
+        tuple: The new weighted mean, old weight and observation count
+    """
+
+    old_wt_factor, new_wt, adjust, _ = params
+
+    is_observation = ~np.isnan(cur)
+    nobs = nobs + is_observation
+    started = ~np.isnan(weighted)
+
+    old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+    update = started & is_observation
+    changed = update & (weighted != cur)
+
+    blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+    weighted = np.where(changed, blended, weighted)
+    old_wt = np.where(update, np.where(adjust, old_wt + new_wt, 1.), old_wt)
+    weighted = np.where(~started & is_observation, cur, weighted)
+
+    return weighted, old_wt, nobs
+
+
+def _by_position(position: np.ndarray = None):
+    """
+    Yield the rows at each position within their group, first rows first
+    """
+
+    if not len(position):
+        return
+
+    order = np.argsort(position, kind='stable')
+    bounds = np.searchsorted(position[order], np.arange(position.max() + 2))
+
+    for k in range(len(bounds) - 1):
+        yield order[bounds[k]:bounds[k + 1]]
+
+
+def _ewm_mean(values: np.ndarray = None, codes: np.ndarray = None,
+              position: np.ndarray = None, spans: list = None, adjust: list = None,
+              min_periods: list = None):
+    """
+    Exponentially weighted means of several group-sorted columns at once.
+
+    The loop runs over the position within a group, updating every group
+    and every column together, and applies the same recurrence as pandas'
+    ewm so the results are identical.
+
+    Args:
+        values (np.ndarray): A (rows, features) array sorted by group
+        codes (np.ndarray): The group code of each row
+        position (np.ndarray): Each row's position within its group
+        spans (list): The span of each feature
+        adjust (list): The adjust flag of each feature
+        min_periods (list): The min_periods of each feature
+
+    Returns:
+        np.ndarray: The (rows, features) array of means
+    """
+
+    params = _ewm_params(spans, adjust, min_periods)
+
+    n_groups = codes.max() + 1 if len(codes) else 0
+    n_features = values.shape[1]
+
+    weighted = np.full((n_groups, n_features), np.nan)
+    old_wt = np.ones((n_groups, n_features))
+    nobs = np.zeros((n_groups, n_features), dtype=np.int64)
+
+    out = np.full_like(values, np.nan)
+
+    for rows in _by_position(position):
+        groups = codes[rows]
+
+        w, ow, n = _ewm_step(values[rows], weighted[groups], old_wt[groups],
+                             nobs[groups], params)
+
+        weighted[groups] = w
+        old_wt[groups] = ow
+        nobs[groups] = n
+
+        out[rows] = np.where(n >= params[3], w, np.nan)
+
+    return out
+
+
+def _rolling_mean(values: np.ndarray = None, position: np.ndarray = None,
+                  window: int = None, min_periods: int = None):
+    """
+    The mean of the last window values of each group-sorted row, skipping
+    missing values, like rolling(window, min_periods).mean()
+    """
+
+    if min_periods is None:
+        min_periods = window
+
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.)
+
+    total = filled.copy()
+    count = present.astype(np.int64)
+
+    for lag in range(1, window):
+        in_group = position[lag:] >= lag
+        total[lag:] += np.where(in_group, filled[:-lag], 0.)
+        count[lag:] += np.where(in_group, present[:-lag], 0)
+
+    return np.where((count >= max(min_periods, 1)) & (count > 0),
+                    total / np.maximum(count, 1), np.nan)
+
+
+def add_rolling_features(df: pd.DataFrame = None, spec: dict = None, by='player_id',
+                         inplace: bool = False):
+    """
+    A function that adds lagged rolling and exponentially weighted averages,
+    replacing per-column transform lambdas like
+    df.groupby(by)[col].transform(lambda x: x.shift().ewm(span=n).mean()).
+
+    The rows are sorted by group once per grouping, then every EWM feature
+    is computed in one pass over the position within a group and every
+    rolling feature from a sum of lagged copies. Rows keep their order
+    within each group, as in groupby().transform.
+
+    Args:
+        df (pd.DataFrame): A dataframe with one row per group per game, in game order
+        spec (dict): A mapping of feature name to a dict with the source 'col',
+            the 'kind' ('ewm' or 'rolling'), its 'span' or 'window', and optionally
+            'shift' (default 1), 'min_periods', 'adjust' (default True) and 'by'
+        by (str or list, optional): The group key(s) of features without their own.
+            Defaults to 'player_id'.
+        inplace (bool, optional): Whether to add the features to df itself. Defaults to False.
+
+    Returns:
+        df (pd.DataFrame): The dataframe with a column for each feature
+    """
+
+    if not inplace:
+        df = df.copy(deep=False)
+
+    groupings = {}
+    for name, feature in spec.items():
+        key = feature.get('by', by)
+        key = (key,) if isinstance(key, str) else tuple(key)
+        groupings.setdefault(key, []).append(name)
+
+    for key, names in groupings.items():
+        order, codes, position = _group_layout(df, list(key))
+        keep = codes >= 0
+        order, codes, position = order[keep], codes[keep], position[keep]
+
+        results = {}
+
+        ewm_names = [name for name in names if spec[name]['kind'] == 'ewm']
+        if ewm_names:
+            values = np.column_stack([
+                _shifted(df[spec[name]['col']].to_numpy(dtype=np.float64, na_value=np.nan)[order],
+                         position, spec[name].get('shift', 1))
+                for name in ewm_names])
+            means = _ewm_mean(values, codes, position,
+                              spans=[spec[name]['span'] for name in ewm_names],
+                              adjust=[spec[name].get('adjust', True) for name in ewm_names],
+                              min_periods=[spec[name].get('min_periods', 0) for name in ewm_names])
+            results.update({name: means[:, i] for i, name in enumerate(ewm_names)})
+
+        for name in names:
+            feature = spec[name]
+            if feature['kind'] == 'rolling':
+                values = _shifted(
+                    df[feature['col']].to_numpy(dtype=np.float64, na_value=np.nan)[order],
+                    position, feature.get('shift', 1))
+                results[name] = _rolling_mean(values, position, feature['window'],
+                                              feature.get('min_periods'))
+            elif feature['kind'] != 'ewm':
+                raise ValueError(f"unknown window type {feature['kind']} for {name}")
+
+        for name in names:
+            column = np.full(len(df), np.nan)
+            column[order] = results[name]
+            df[name] = column
+
+    return df
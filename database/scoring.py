@@ -0,0 +1,209 @@
+import pandas as pd
+import numpy as np
+
+
+# the fantasy scoring rules of each site for each box score table. 'points'
+# maps a stat column of the pbp_utils output to its points per unit,
+# 'bonuses' are (stat, threshold, points) awarded when the stat reaches the
+# threshold, and 'brackets' are (stat, edges, points): points[i] is awarded
+# when edges[i - 1] <= stat < edges[i]
+
+DK_RULES = {
+    'receiving': {
+        'points': {'rec_yards': 0.1, 'td': 6, 'rec': 1},
+        'bonuses': [('rec_yards', 100, 3)]
+    },
+    'rushing': {
+        'points': {'rush_yds': 0.1, 'rush_td': 6, 'fumbles': -1},
+        'bonuses': [('rush_yds', 100, 3)]
+    },
+    'qb': {
+        'points': {'touchdown': 4, 'pass_yards': 0.04, 'interception': -1, 'rush_td': 6,
+                   'rush_yds': 0.1, 'fumbles': -1},
+        'bonuses': [('pass_yards', 300, 3), ('rush_yds', 100, 3)]
+    },
+    'kicker': {
+        'points': {'pats': 1, 'fg_0_39': 3, 'fg_40_49': 4, 'fg_50_on': 5}
+    },
+    'defense': {
+        'points': {'def_int': 2, 'def_sack': 1, 'safety': 2, 'kick_blocked': 2, 'def_td': 6},
+        'brackets': [('opp_points', [7, 14, 21, 28, 35, 101], [7, 4, 1, 0, -1, -4, 0])]
+    }
+}
+
+FD_RULES = {
+    'receiving': {
+        'points': {'rec_yards': 0.1, 'td': 6, 'rec': 0.5}
+    },
+    'rushing': {
+        'points': {'rush_yds': 0.1, 'rush_td': 6, 'fumbles': -2}
+    },
+    'qb': {
+        'points': {'rush_yds': 0.1, 'rush_td': 6, 'pass_yards': 0.04, 'interception': -1,
+                   'fumbles': -2, 'touchdown': 4}
+    },
+    'kicker': DK_RULES['kicker'],
+    'defense': DK_RULES['defense']
+}
+
+SCORING_RULES = {
+    'dk': DK_RULES,
+    'fd': FD_RULES
+}
+
+
+def get_rules(site: str = 'dk', table: str = 'receiving'):
+    """
+    Look up the scoring rules of a site for a box score table
+
+    Args:
+        site (str, optional): 'dk' or 'fd'. Defaults to 'dk'.
+        table (str, optional): 'receiving', 'rushing', 'qb', 'kicker' or 'defense'.
+            Defaults to 'receiving'.
+
+    Returns:
+        dict: The scoring rules
+    """
+
+    if site not in SCORING_RULES:
+        raise ValueError(f'unknown site {site}, expected one of {list(SCORING_RULES)}')
+    if table not in SCORING_RULES[site]:
+        raise ValueError(f'no {site} rules for {table}, expected one of '
+                         f'{list(SCORING_RULES[site])}')
+
+    return SCORING_RULES[site][table]
+
+
+def combine_rules(*rules):
+    """
+    Merge rule sets into one, adding the points of shared stats. Used to
+    score players with more than one kind of box score, e.g. a running back's
+    rushing and receiving stats together.
+    """
+
+    combined = {'points': {}, 'bonuses': [], 'brackets': []}
+
+    for rule in rules:
+        for stat, points in rule.get('points', {}).items():
+            combined['points'][stat] = combined['points'].get(stat, 0) + points
+        combined['bonuses'] += list(rule.get('bonuses', []))
+        combined['brackets'] += list(rule.get('brackets', []))
+
+    return combined
+
+
+def compile_rules(rules: dict = None):
+    """
+    Compile a rule set into arrays, so scoring is one weighted sum over the
+    stats plus a comparison per bonus and a lookup per bracket.
+
+    Args:
+        rules (dict): A rule set, as in DK_RULES
+
+    Returns:
+        dict: The stats used, their weights, and the bonuses and brackets
+    """
+
+    stats = list(rules.get('points', {}))
+    for stat, *_ in list(rules.get('bonuses', [])) + list(rules.get('brackets', [])):
+        if stat not in stats:
+            stats.append(stat)
+
+    return {
+        'stats': stats,
+        'weights': np.array([rules.get('points', {}).get(stat, 0.) for stat in stats],
+                            dtype=np.float64),
+        'bonuses': [(stat, float(threshold), float(points))
+                    for stat, threshold, points in rules.get('bonuses', [])],
+        'brackets': [(stat, np.asarray(edges, dtype=np.float64),
+                      np.asarray(points, dtype=np.float64))
+                     for stat, edges, points in rules.get('brackets', [])]
+    }
+
+
+def _evaluate(compiled: dict = None, get_stat=None, shape: tuple = None, dtype=np.float64):
+    """
+    Score stat arrays of any shape, accumulating in place to keep the number
+    of temporaries constant however many stats there are. Missing stats
+    score nothing.
+    """
+
+    total = np.zeros(shape, dtype=dtype)
+    buffer = np.empty(shape, dtype=dtype)
+    hit = np.empty(shape, dtype=bool)
+
+    for stat, weight in zip(compiled['stats'], compiled['weights']):
+        if weight == 0:
+            continue
+        np.multiply(get_stat(stat), weight, out=buffer, casting='unsafe')
+        np.equal(buffer, buffer, out=hit)
+        np.add(total, buffer, out=total, where=hit)
+
+    for stat, threshold, points in compiled['bonuses']:
+        np.greater_equal(get_stat(stat), threshold, out=hit)
+        np.add(total, points, out=total, where=hit, casting='unsafe')
+
+    for stat, edges, points in compiled['brackets']:
+        values = get_stat(stat)
+        bracket = points[np.searchsorted(edges, values, side='right')]
+        total += np.where(np.isnan(values), 0, bracket).astype(dtype, copy=False)
+
+    return total
+
+
+def score_frame(df: pd.DataFrame = None, site: str = 'dk', table: str = 'receiving',
+                rules: dict = None):
+    """
+    A function that returns the fantasy points of each row of a box score
+    dataframe, such as the output of get_receiving or get_qb_pass.
+
+    Args:
+        df (pd.DataFrame): A dataframe with the stat columns of the rules
+        site (str, optional): 'dk' or 'fd'. Defaults to 'dk'.
+        table (str, optional): The kind of box score. Defaults to 'receiving'.
+        rules (dict, optional): A rule set overriding site and table. Defaults to None.
+
+    Returns:
+        pd.Series: The fantasy points of each row
+    """
+
+    compiled = compile_rules(rules if rules is not None else get_rules(site, table))
+
+    missing = [stat for stat in compiled['stats'] if stat not in df.columns]
+    if missing:
+        raise ValueError(f'Dataframe must contain columns: {", ".join(missing)}')
+
+    points = _evaluate(
+        compiled,
+        lambda stat: df[stat].to_numpy(dtype=np.float64, na_value=np.nan),
+        shape=(len(df),)
+    )
+
+    return pd.Series(points, index=df.index, name=f'{site}_points')
+
+
+def score_sims(sims: dict = None, site: str = 'dk', table: str = 'receiving',
+               rules: dict = None, dtype=np.float64):
+    """
+    A function that scores simulated stat lines.
+
+    Args:
+        sims (dict): A mapping of stat name to an array of simulated values,
+            e.g. of shape (players, simulations). Every array has the same shape;
+            stats the rules use but sims lacks score nothing.
+        site (str, optional): 'dk' or 'fd'. Defaults to 'dk'.
+        table (str, optional): The kind of box score. Defaults to 'receiving'.
+        rules (dict, optional): A rule set overriding site and table. Defaults to None.
+        dtype (optional): The dtype of the points. Defaults to np.float64; np.float32
+            halves the memory of large simulations.
+
+    Returns:
+        np.ndarray: The fantasy points, with the shape of the stat arrays
+    """
+
+    compiled = compile_rules(rules if rules is not None else get_rules(site, table))
+
+    shape = np.shape(next(iter(sims.values())))
+    zeros = np.zeros(shape, dtype=dtype)
+
+    return _evaluate(compiled, lambda stat: sims.get(stat, zeros), shape=shape, dtype=dtype)
@@ -0,0 +1,304 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from .scoring import get_rules, combine_rules, score_sims
+
+
+# the standard deviation of an NFL game's total points and of the final
+# margin around the betting lines
+SCRIPT_SD = {
+    'total': 13.0,
+    'margin': 13.5
+}
+
+# how strongly each position's outcome moves with the game's total points
+# ('game', shared by both teams, so opponents bring each other back), with
+# its own team's margin ('script') and with its team's passing game ('pass',
+# which stacks a QB with his receivers). the rest of the variance is the
+# player's own
+POSITION_LOADINGS = {
+    'QB': {'game': 0.35, 'script': 0.1, 'pass': 0.6},
+    'WR': {'game': 0.3, 'script': 0.0, 'pass': 0.45},
+    'TE': {'game': 0.25, 'script': 0.0, 'pass': 0.35},
+    'RB': {'game': 0.25, 'script': 0.35, 'pass': 0.05},
+    'K': {'game': 0.3, 'script': 0.25, 'pass': 0.0},
+    'DST': {'game': -0.4, 'script': 0.35, 'pass': 0.0}
+}
+
+# the box scores each position is scored on
+POSITION_TABLES = {
+    'QB': ['qb'],
+    'RB': ['rushing', 'receiving'],
+    'WR': ['receiving', 'rushing'],
+    'TE': ['receiving'],
+    'K': ['kicker'],
+    'DST': ['defense']
+}
+
+# set in each worker by _init_worker, so the slate is sent to a worker once
+_SLATE = None
+
+
+def _normal_cdf(z: np.ndarray = None):
+    """
+    The standard normal CDF, accurate to about 1e-7 (Abramowitz and Stegun 26.2.17)
+    """
+
+    t = 1. / (1. + 0.2316419 * np.abs(z))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 +
+                t * (-1.821255978 + t * 1.330274429))))
+    tail = 0.3989422804014327 * np.exp(-0.5 * z * z) * poly
+
+    return np.where(z >= 0, 1. - tail, tail)
+
+
+def get_slate_games(game_results: pd.DataFrame = None, game_ids: list = None):
+    """
+    A function that returns the betting lines of the slate's games from
+    get_game_results output, one row per team with the spread from that
+    team's side (negative when favored) and the game total.
+
+    Args:
+        game_results (pd.DataFrame): The output of get_game_results
+        game_ids (list, optional): The slate's games. Defaults to every game.
+
+    Returns:
+        df (pd.DataFrame): The game_id, team, spread_line and total_line of each team
+    """
+
+    games = game_results
+    if game_ids is not None:
+        games = games[games['game_id'].isin(game_ids)]
+
+    return (
+        games[['game_id', 'team', 'spread_line', 'total_line']]
+        .drop_duplicates(subset=['game_id', 'team'])
+        .reset_index(drop=True)
+    )
+
+
+def _build_slate(players: pd.DataFrame = None, draws: dict = None, games: pd.DataFrame = None,
+                 site: str = 'dk', loadings: dict = None, script_sd: dict = None):
+    """
+    Turn the slate into the arrays every simulation chunk needs
+    """
+
+    loadings = loadings or POSITION_LOADINGS
+    script_sd = script_sd or SCRIPT_SD
+
+    unknown = set(players['position']) - set(POSITION_TABLES)
+    if unknown:
+        raise ValueError(f'no scoring tables for positions {sorted(unknown)}')
+
+    game_codes, game_ids = pd.factorize(games['game_id'])
+    team_codes, teams = pd.factorize(games['team'])
+
+    # the first listed team of each game is the one the margin is measured for
+    first = ~pd.Series(game_codes).duplicated().to_numpy()
+    first_spread = np.zeros(len(game_ids))
+    first_spread[game_codes[first]] = games['spread_line'].to_numpy(dtype=np.float64)[first]
+    total_line = np.zeros(len(game_ids))
+    total_line[game_codes] = games['total_line'].to_numpy(dtype=np.float64)
+
+    team_game = np.full(len(teams), -1)
+    team_game[team_codes] = game_codes
+    team_sign = np.ones(len(teams))
+    team_sign[team_codes] = np.where(first, 1., -1.)
+
+    # each team's opponent, for the points a defense allows
+    opponent = np.full(len(teams), -1)
+    for code in range(len(game_ids)):
+        pair = team_codes[game_codes == code]
+        if len(pair) == 2:
+            opponent[pair[0]], opponent[pair[1]] = pair[1], pair[0]
+
+    player_team = pd.Index(teams).get_indexer(players['team'])
+    in_slate = player_team >= 0
+    player_team = np.where(in_slate, player_team, 0)
+
+    def loading(kind):
+        values = players['position'].map(lambda pos: loadings[pos][kind]).to_numpy(np.float64)
+        return np.where(in_slate, values, 0.)
+
+    game_loading = loading('game')
+    script_loading = loading('script') * team_sign[player_team]
+    pass_loading = loading('pass')
+    own = 1. - game_loading ** 2 - script_loading ** 2 - pass_loading ** 2
+    if (own < 0).any():
+        raise ValueError('the loadings of a position must have squares summing to at most 1')
+
+    # each player's draws sorted once, so a quantile is a single lookup
+    sorted_draws = {stat: np.sort(np.asarray(values, dtype=np.float64), axis=1)
+                    for stat, values in draws.items()}
+
+    rules = {}
+    if 'points' not in draws:
+        for position, tables in POSITION_TABLES.items():
+            rows = np.flatnonzero(players['position'].to_numpy() == position)
+            if len(rows):
+                rules[position] = (rows, combine_rules(*[get_rules(site, table)
+                                                         for table in tables]))
+
+    return {
+        'n_players': len(players),
+        'first_spread': first_spread,
+        'total_line': total_line,
+        'team_game': team_game,
+        'team_sign': team_sign,
+        'opponent': opponent,
+        'in_slate': in_slate,
+        'player_team': player_team,
+        'player_game': team_game[player_team],
+        'game_loading': game_loading,
+        'script_loading': script_loading,
+        'pass_loading': pass_loading,
+        'own_loading': np.sqrt(own),
+        'script_sd': script_sd,
+        'sorted_draws': sorted_draws,
+        'rules': rules
+    }
+
+
+def _simulate_chunk(slate: dict = None, size: int = None, seed=None, dtype=np.float32):
+    """
+    Simulate one chunk of joint slate outcomes and score them.
+
+    Returns:
+        np.ndarray: The (players, size) fantasy points
+    """
+
+    rng = np.random.default_rng(seed)
+    n_games = len(slate['total_line'])
+    n_teams = len(slate['team_game'])
+
+    # game scripts: the total and the first team's margin around the lines
+    game = rng.standard_normal((n_games, size))
+    script = rng.standard_normal((n_games, size))
+    team_pass = rng.standard_normal((n_teams, size))
+
+    total = slate['total_line'][:, None] + slate['script_sd']['total'] * game
+    margin = -slate['first_spread'][:, None] + slate['script_sd']['margin'] * script
+    team_points = np.maximum(
+        (total[slate['team_game']] + slate['team_sign'][:, None] * margin[slate['team_game']]) / 2,
+        0)
+
+    latent = rng.standard_normal((slate['n_players'], size))
+    latent *= slate['own_loading'][:, None]
+    latent += slate['game_loading'][:, None] * game[slate['player_game']]
+    latent += slate['script_loading'][:, None] * script[slate['player_game']]
+    latent += slate['pass_loading'][:, None] * team_pass[slate['player_team']]
+
+    quantile = _normal_cdf(latent)
+    del latent
+
+    # stats with the same number of draws share the quantile's draw index
+    indexes = {}
+    stats = {}
+    for stat, values in slate['sorted_draws'].items():
+        n_draws = values.shape[1]
+        if n_draws not in indexes:
+            indexes[n_draws] = np.minimum((quantile * n_draws).astype(np.int64), n_draws - 1)
+        stats[stat] = np.take_along_axis(values, indexes[n_draws], axis=1)
+    del quantile, indexes
+
+    if 'points' in stats:
+        return stats['points'].astype(dtype)
+
+    # players outside the slate's games have no opponent
+    opponent = np.where(slate['in_slate'], slate['opponent'][slate['player_team']], -1)
+    stats['opp_points'] = np.where((opponent >= 0)[:, None],
+                                   team_points[np.maximum(opponent, 0)], np.nan)
+
+    points = np.zeros((slate['n_players'], size), dtype=dtype)
+    for rows, rules in slate['rules'].values():
+        points[rows] = score_sims({stat: values[rows] for stat, values in stats.items()},
+                                  rules=rules, dtype=dtype)
+
+    return points
+
+
+def _init_worker(slate: dict = None):
+    """
+    Keep the slate in the worker for every chunk it runs
+    """
+
+    global _SLATE
+    _SLATE = slate
+
+
+def _run_chunk(args: tuple = None):
+    """
+    Simulate a chunk in a worker
+    """
+
+    size, seed, dtype = args
+    return _simulate_chunk(_SLATE, size, seed, dtype)
+
+
+def simulate_slate(players: pd.DataFrame = None, draws: dict = None, games: pd.DataFrame = None,
+                   n_sims: int = 10000, site: str = 'dk', chunk_size: int = 10000,
+                   n_jobs: int = None, seed: int = 0, loadings: dict = None,
+                   script_sd: dict = None, dtype=np.float32):
+    """
+    A function that simulates correlated fantasy outcomes for a whole slate.
+
+    Each simulation draws a game script for every game (total points and
+    margin around the betting lines) and a passing-game shock for every team.
+    A player's outcome is the quantile of his own predictive draws at a
+    latent normal that loads on those shocks by position, so QBs move with
+    their receivers, opponents bring each other back and defenses suffer in
+    shootouts, while every player keeps his own predictive distribution.
+    All of a player's stats use the same quantile, then are scored per site.
+
+    Simulations run in chunks of chunk_size, so memory is bounded by one
+    chunk per worker, and the chunks are spread over a process pool. Each
+    chunk has its own seed, so the result does not depend on n_jobs.
+
+    Args:
+        players (pd.DataFrame): One row per player with team and position
+            ('QB', 'RB', 'WR', 'TE', 'K' or 'DST'; a defense's team is its own)
+        draws (dict): A mapping of stat name, e.g. 'rec_yards', to a (players, draws)
+            array of predictive or posterior draws in the order of players. A single
+            'points' entry of fantasy point draws skips the scoring.
+        games (pd.DataFrame): The lines of the slate's games, from get_slate_games
+        n_sims (int, optional): The number of simulations. Defaults to 10000.
+        site (str, optional): The site rules to score by. Defaults to 'dk'.
+        chunk_size (int, optional): The simulations per chunk. Defaults to 10000.
+        n_jobs (int, optional): The number of processes. Defaults to every core.
+        seed (int, optional): The random seed. Defaults to 0.
+        loadings (dict, optional): The factor loadings of each position.
+            Defaults to POSITION_LOADINGS.
+        script_sd (dict, optional): The spread of totals and margins. Defaults to SCRIPT_SD.
+        dtype (optional): The dtype of the points. Defaults to np.float32.
+
+    Returns:
+        np.ndarray: The (players, n_sims) simulated fantasy points
+    """
+
+    slate = _build_slate(players, draws, games, site=site, loadings=loadings,
+                         script_sd=script_sd)
+
+    sizes = [min(chunk_size, n_sims - start) for start in range(0, n_sims, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(size, chunk_seed, dtype) for size, chunk_seed in zip(sizes, seeds)]
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+
+    points = np.empty((len(players), n_sims), dtype=dtype)
+    starts = np.cumsum([0] + sizes[:-1])
+
+    if n_jobs <= 1:
+        for start, (size, chunk_seed, _) in zip(starts, tasks):
+            points[:, start:start + size] = _simulate_chunk(slate, size, chunk_seed, dtype)
+        return points
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(slate,)) as pool:
+        for start, (size, _, _), chunk in zip(starts, tasks, pool.map(_run_chunk, tasks)):
+            points[:, start:start + size] = chunk
+
+    return points
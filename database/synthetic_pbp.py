@@ -0,0 +1,318 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+
+TEAMS = ['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN', 'DET', 'GB',
+         'HOU', 'IND', 'JAX', 'KC', 'LA', 'LAC', 'LV', 'MIA', 'MIN', 'NE', 'NO', 'NYG',
+         'NYJ', 'PHI', 'PIT', 'SEA', 'SF', 'TB', 'TEN', 'WAS']
+
+# the share of each play type, with None for timeouts and quarter ends
+PLAY_TYPES = {
+    'pass': 0.42,
+    'run': 0.30,
+    'no_play': 0.07,
+    'kickoff': 0.06,
+    'punt': 0.05,
+    'extra_point': 0.03,
+    'field_goal': 0.025,
+    None: 0.045
+}
+
+PLAY_TYPES_NFL = {
+    'pass': 'PASS',
+    'run': 'RUSH',
+    'no_play': 'PENALTY',
+    'kickoff': 'KICK_OFF',
+    'punt': 'PUNT',
+    'extra_point': 'XP_KICK',
+    'field_goal': 'FIELD_GOAL'
+}
+
+# the players each team uses at a position, with the share of plays each gets
+ROSTER_SHARES = {
+    'QB': [0.92, 0.08],
+    'RB': [0.55, 0.3, 0.15],
+    'WR': [0.3, 0.25, 0.18, 0.1, 0.05],
+    'TE': [0.09, 0.03]
+}
+
+
+def _season_games(season: int = None, weeks: int = None, rng=None):
+    """
+    One row per game of a season, every team playing every week
+    """
+
+    if weeks is None:
+        weeks = 18 if season >= 2021 else 17
+
+    games = []
+    for week in range(1, weeks + 1):
+        teams = rng.permutation(TEAMS)
+        games.append(pd.DataFrame({'week': week, 'away_team': teams[0::2],
+                                   'home_team': teams[1::2]}))
+
+    games = pd.concat(games, ignore_index=True)
+    games['season'] = season
+    games['game_id'] = (str(season) + '_' + games['week'].astype(str).str.zfill(2) + '_' +
+                        games['away_team'] + '_' + games['home_team'])
+    games['game_date'] = (pd.Timestamp(f'{season}-09-08') +
+                          pd.to_timedelta((games['week'] - 1) * 7, unit='D')).dt.strftime('%Y-%m-%d')
+
+    return games
+
+
+def _players(position: str = None, team_codes: np.ndarray = None, rng=None):
+    """
+    Pick a player of a position for each play's offense, returning ids and names
+    """
+
+    shares = np.array(ROSTER_SHARES[position])
+    slot = rng.choice(len(shares), size=len(team_codes), p=shares / shares.sum())
+
+    # every team's players at the position, looked up by team and slot
+    number = np.arange(len(TEAMS) * len(shares))
+    team = np.array(TEAMS)[number // len(shares)]
+    ids = np.array([f'00-{"QRWT".index(position[0]) + 1}{i:06d}' for i in number], dtype=object)
+    names = np.array([f'{"ABCDEFGHJKLMNPRSTW"[i % 18]}.{t}{position}{i % len(shares) + 1}'
+                      for i, t in zip(number, team)], dtype=object)
+
+    player = team_codes * len(shares) + slot
+
+    return ids[player], names[player]
+
+
+def make_pbp(seasons=1, weeks: int = None, first_season: int = 2022, extra_columns: int = 0,
+             seed: int = 0):
+    """
+    A function that generates synthetic play-by-play data with the schema,
+    cardinalities and null rates of nflfastR data, for benchmarking the
+    pipeline without downloading it.
+
+    Every season has 32 teams playing each week and about 175 plays per game,
+    with a realistic mix of play types, drives alternating between the teams,
+    player ids and names that repeat across games, and missing values where
+    nflfastR has them (player columns off their play types, air yards off
+    pass plays, weather in domes, team columns on timeouts).
+
+    Args:
+        seasons (int or list, optional): The number of seasons, ending with
+            first_season, or a list of seasons. Defaults to 1.
+        weeks (int, optional): The weeks per season. Defaults to 17, or 18 from 2021.
+        first_season (int, optional): The last season when seasons is a number.
+            Defaults to 2022.
+        extra_columns (int, optional): Mostly missing filler columns to add, to match
+            the width of the real files (about 370 columns). Defaults to 0.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        df (pd.DataFrame): The raw play-by-play data, in game and play order
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if isinstance(seasons, int):
+        seasons = list(range(first_season - seasons + 1, first_season + 1))
+
+    games = pd.concat([_season_games(season, weeks, rng) for season in seasons],
+                      ignore_index=True)
+    n_games = len(games)
+
+    games['total_line'] = np.round(rng.normal(45, 4, n_games) * 2) / 2
+    games['spread_line'] = np.round(rng.normal(2, 6, n_games) * 2) / 2
+    games['home_score'] = rng.poisson(24, n_games)
+    games['away_score'] = rng.poisson(21, n_games)
+    dome = rng.random(n_games) < 0.3
+    games['temp'] = np.where(dome, np.nan, rng.integers(20, 90, n_games))
+    games['wind'] = np.where(dome, np.nan, rng.integers(0, 20, n_games))
+
+    plays_per_game = rng.integers(150, 200, n_games)
+    game = np.repeat(np.arange(n_games), plays_per_game)
+    n = len(game)
+    play_number = np.arange(n) - np.repeat(np.cumsum(plays_per_game) - plays_per_game,
+                                           plays_per_game)
+
+    df = games[['game_id', 'season', 'week', 'game_date', 'home_team', 'away_team',
+                'home_score', 'away_score', 'total_line', 'spread_line', 'temp',
+                'wind']].take(game).reset_index(drop=True)
+    df.insert(1, 'play_id', (play_number * 23 + 1).astype(np.float64))
+    df['season_type'] = 'REG'
+    df['old_game_id'] = df['game_id'].str.replace('_', '', regex=False)
+
+    # drives alternate between the teams, starting with a random one
+    df['drive'] = (play_number // 6 + 1).astype(np.float64)
+    home_first = rng.random(n_games) < 0.5
+    home_ball = (df['drive'].to_numpy() % 2 == 1) == home_first[game]
+    home = df['home_team'].to_numpy(dtype=object)
+    away = df['away_team'].to_numpy(dtype=object)
+
+    types = list(PLAY_TYPES)
+    probs = np.array(list(PLAY_TYPES.values()))
+    play_type = np.array(types, dtype=object)[rng.choice(len(types), size=n, p=probs / probs.sum())]
+    no_team = pd.isna(play_type)
+
+    df['posteam'] = np.where(no_team, None, np.where(home_ball, home, away))
+    df['defteam'] = np.where(no_team, None, np.where(home_ball, away, home))
+    df['play_type'] = play_type
+    df['game_seconds_remaining'] = 3600. * (1 - play_number / plays_per_game[game])
+    df['down'] = np.where(no_team, np.nan, rng.integers(1, 5, n))
+    df['ydstogo'] = rng.integers(1, 16, n).astype(np.float64)
+    df['yardline_100'] = np.where(no_team, np.nan, rng.integers(1, 100, n))
+
+    is_pass = play_type == 'pass'
+    is_run = play_type == 'run'
+    is_kick = (play_type == 'field_goal') | (play_type == 'extra_point')
+    scrimmage = is_pass | is_run
+
+    sack = is_pass & (rng.random(n) < 0.065)
+    interception = is_pass & ~sack & (rng.random(n) < 0.025)
+    complete = is_pass & ~sack & ~interception & (rng.random(n) < 0.65)
+    two_point = scrimmage & (rng.random(n) < 0.004)
+    touchdown = scrimmage & ~two_point & (rng.random(n) < 0.035)
+
+    df['qb_dropback'] = is_pass.astype(np.float64)
+    df['pass_attempt'] = is_pass.astype(np.float64)
+    df['rush_attempt'] = is_run.astype(np.float64)
+    df['sack'] = sack.astype(np.float64)
+    df['interception'] = interception.astype(np.float64)
+    df['complete_pass'] = complete.astype(np.float64)
+    df['touchdown'] = touchdown.astype(np.float64)
+    df['td_team'] = np.where(touchdown, df['posteam'], None)
+    df['play_type_nfl'] = np.where(sack, 'SACK', pd.Series(play_type).map(PLAY_TYPES_NFL)
+                                   .fillna('TIMEOUT').to_numpy())
+
+    yards = np.where(is_pass, np.where(complete, rng.gamma(1.6, 7, n).round() - 2, 0),
+                     rng.gamma(1.3, 3.5, n).round() - 2)
+    df['yards_gained'] = np.where(sack, -rng.integers(1, 12, n),
+                                  np.where(scrimmage, yards, np.where(no_team, np.nan, 0.)))
+    air_yards = np.where(is_pass & ~sack, rng.normal(8, 9, n).round(), np.nan)
+    df['air_yards'] = air_yards
+    df['yards_after_catch'] = np.where(complete, np.maximum(yards - np.nan_to_num(air_yards), 0),
+                                       np.nan)
+
+    epa = rng.normal(0, 1.4, n)
+    df['epa'] = np.where(no_team, np.nan, epa)
+    df['success'] = np.where(no_team, np.nan, (epa > 0).astype(np.float64))
+    df['cpoe'] = np.where(is_pass & ~sack & (rng.random(n) < 0.97), rng.normal(0, 40, n),
+                          np.nan)
+
+    team_codes = pd.Index(TEAMS).get_indexer(df['posteam'].fillna(TEAMS[0]))
+
+    passer_ids, passer_names = _players('QB', team_codes, rng)
+    df['passer_player_id'] = np.where(is_pass, passer_ids, None)
+    df['passer_player_name'] = np.where(is_pass, passer_names, None)
+
+    rusher_pos = np.where(rng.random(n) < 0.1, 'QB', 'RB')
+    rb_ids, rb_names = _players('RB', team_codes, rng)
+    qb_ids, qb_names = _players('QB', team_codes, rng)
+    df['rusher_player_id'] = np.where(is_run, np.where(rusher_pos == 'QB', qb_ids, rb_ids), None)
+    df['rusher_player_name'] = np.where(is_run, np.where(rusher_pos == 'QB', qb_names, rb_names),
+                                        None)
+
+    targeted = is_pass & ~sack & (rng.random(n) < 0.93)
+    receiver_pos = rng.choice(['WR', 'TE', 'RB'], size=n, p=[0.65, 0.2, 0.15])
+    receivers = {pos: _players(pos, team_codes, rng) for pos in ['WR', 'TE', 'RB']}
+    df['receiver_player_id'] = np.where(targeted, np.select(
+        [receiver_pos == pos for pos in receivers], [ids for ids, _ in receivers.values()]), None)
+    df['receiver_player_name'] = np.where(targeted, np.select(
+        [receiver_pos == pos for pos in receivers], [names for _, names in receivers.values()]),
+        None)
+
+    kicker_ids = np.array([f'00-9{i:06d}' for i in range(len(TEAMS))], dtype=object)[team_codes]
+    kicker_names = np.array([f'K.{team}' for team in TEAMS], dtype=object)[team_codes]
+    df['kicker_player_id'] = np.where(is_kick | (play_type == 'kickoff'), kicker_ids, None)
+    df['kicker_player_name'] = np.where(is_kick | (play_type == 'kickoff'), kicker_names, None)
+
+    distance = np.where(play_type == 'field_goal', rng.integers(19, 60, n), np.nan)
+    made = rng.random(n) < np.where(play_type == 'extra_point', 0.94,
+                                    1.3 - np.nan_to_num(distance, nan=30) / 70)
+    df['kick_distance'] = distance
+    df['field_goal_result'] = np.where(play_type == 'field_goal',
+                                       np.where(made, 'made', 'missed'), None)
+    df['extra_point_result'] = np.where(play_type == 'extra_point',
+                                        np.where(made, 'good', 'failed'), None)
+
+    df['two_point_attempt'] = two_point.astype(np.float64)
+    df['two_point_conv_result'] = np.where(
+        two_point, np.where(rng.random(n) < 0.48, 'success', 'failure'), None)
+
+    fumble = scrimmage & (rng.random(n) < 0.012)
+    df['fumble'] = fumble.astype(np.float64)
+    df['fumble_lost'] = (fumble & (rng.random(n) < 0.5)).astype(np.float64)
+    df['return_touchdown'] = ((interception | fumble) & (rng.random(n) < 0.1)).astype(np.float64)
+    df['safety'] = (scrimmage & (rng.random(n) < 0.0008)).astype(np.float64)
+    blocked = (is_kick | (play_type == 'punt')) & (rng.random(n) < 0.01)
+    df['blocked_player_name'] = np.where(blocked, 'B.Blocker', None)
+
+    score_differential = rng.integers(-21, 22, n).astype(np.float64)
+    df['score_differential'] = np.where(no_team, np.nan, score_differential)
+    df['score_differential_post'] = np.where(
+        no_team, np.nan, score_differential + np.where(touchdown, 7, 0) +
+        np.where((play_type == 'field_goal') & made, 3, 0))
+
+    description = np.select(
+        [is_kick & made, is_kick, is_pass, is_run, rng.random(n) < 0.003],
+        ['(Kick formation) kick is GOOD', '(Kick formation) kick is No Good',
+         '(Shotgun) pass short right', 'up the middle', 'Aborted snap'],
+        'END QUARTER')
+    df['desc'] = description.astype(object)
+    df['side_of_field'] = np.where(no_team, None, np.where(rng.random(n) < 0.5, home, away))
+
+    extra = {f'extra_{i}': np.where(rng.random(n) < 0.7, np.nan, rng.random(n))
+             for i in range(extra_columns)}
+    if extra:
+        df = pd.concat([df, pd.DataFrame(extra)], axis=1)
+
+    return df
+
+
+def make_games(pbp: pd.DataFrame = None, seed: int = 0):
+    """
+    A function that generates Lee Sharpe style games data for the games of
+    synthetic play-by-play data, for building the games table.
+
+    Args:
+        pbp (pd.DataFrame): Play-by-play data from make_pbp
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        df (pd.DataFrame): One row per game with rest days and coaches
+    """
+
+    rng = np.random.default_rng(seed)
+
+    games = pbp[['game_id', 'home_team', 'away_team']].drop_duplicates('game_id')
+    n_games = len(games)
+
+    return pd.DataFrame({
+        'game_id': games['game_id'].to_numpy(),
+        'home_rest': rng.choice([6, 7, 7, 7, 10, 13], n_games),
+        'away_rest': rng.choice([6, 7, 7, 7, 10, 13], n_games),
+        'home_coach': ('Coach ' + games['home_team']).to_numpy(),
+        'away_coach': ('Coach ' + games['away_team']).to_numpy()
+    })
+
+
+def write_pbp_seasons(df: pd.DataFrame = None, directory: str = None):
+    """
+    A function that writes play-by-play data as one nflfastR style file per
+    season, such as play_by_play_2021.parquet
+
+    Args:
+        df (pd.DataFrame): Play-by-play data with a season column
+        directory (str): The directory to write to
+
+    Returns:
+        list: The paths written
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for season, rows in df.groupby('season', sort=True):
+        path = os.path.join(directory, f'play_by_play_{season}.parquet')
+        rows.to_parquet(path, index=False)
+        paths.append(path)
+
+    return paths
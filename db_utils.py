@@ -1,9 +1,139 @@
-import io
+import time
 import psycopg2
+import pandas as pd
 
-from sqlalchemy import create_engine
+from psycopg2 import sql
+from sqlalchemy import Index, MetaData, Table, text
 
+from database.engines import get_engine, database_url
+from database.query_cache import invalidate
+from database.instrumentation import instrumented, add_bytes
 
+
+# the columns identifying a row of each table, used to replace rows on reload
+UPSERT_KEYS = {
+    'pbp': ['game_id', 'play_id'],
+    'qb_games': ['game_id', 'player_id'],
+    'rush_games': ['game_id', 'player_id'],
+    'receiving_games': ['game_id', 'player_id'],
+    'kicker_games': ['game_id', 'kicker_player_id'],
+    'defense_games': ['game_id', 'team'],
+    'games': ['game_id', 'team']
+}
+
+# characters that have to be escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _encode_column(values=None):
+    """
+    Encode a column as COPY text: strings have backslashes, tabs and line
+    breaks escaped and missing values become \\N
+    """
+
+    missing = values.isna().to_numpy()
+    text = values.astype(str)
+
+    if not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)):
+        text = text.str.translate(COPY_ESCAPES)
+
+    return text.mask(missing, '\\N')
+
+
+def encode_batches(df=None, batch_size=50000):
+    """
+    Encode a dataframe as batches of COPY text rows, one batch at a time.
+
+    Args:
+        df (pd.DataFrame): the dataframe to encode
+        batch_size (int): the number of rows in each batch. defaults to 50000
+
+    Yields:
+        bytes: the utf-8 encoded rows of each batch
+    """
+
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        columns = [_encode_column(batch[col]) for col in batch.columns]
+        rows = columns[0].str.cat(columns[1:], sep='\t') if len(columns) > 1 else columns[0]
+        yield ('\n'.join(rows) + '\n').encode('utf-8')
+
+
+class BatchReader:
+    """
+    A read-only file object over an iterator of byte batches, so COPY can
+    stream the batches without the whole table being held in memory.
+    """
+
+    def __init__(self, batches=None):
+        self._batches = iter(batches)
+        self._current = b''
+        self._pos = 0
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            rest = self._current[self._pos:] + b''.join(self._batches)
+            self._current, self._pos = b'', 0
+            self.bytes_read += len(rest)
+            return rest
+
+        while self._pos >= len(self._current):
+            try:
+                self._current, self._pos = next(self._batches), 0
+            except StopIteration:
+                return b''
+
+        chunk = self._current[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        self.bytes_read += len(chunk)
+
+        return chunk
+
+
+@instrumented
+def copy_into_table(conn=None, df=None, table_name=None, batch_size=50000):
+    """
+    Stream a dataframe into an existing table with COPY.
+
+    The rows are encoded and sent one batch at a time, so memory stays
+    bounded by the batch size rather than the size of the dataframe. The
+    caller is responsible for committing.
+
+    Args:
+        conn: a raw psycopg2 connection
+        df (pd.DataFrame): the rows to insert
+        table_name: the name of the table
+        batch_size (int): the number of rows encoded at a time. defaults to 50000
+
+    Returns:
+        dict: the number of rows, the seconds taken and the rows per second
+    """
+
+    copy_sql = sql.SQL('COPY {} ({}) FROM STDIN').format(
+        sql.Identifier(table_name),
+        sql.SQL(', ').join(sql.Identifier(col) for col in df.columns))
+
+    start = time.perf_counter()
+
+    reader = BatchReader(encode_batches(df, batch_size))
+
+    with conn.cursor() as cur:
+        cur.copy_expert(copy_sql, reader, size=1 << 20)
+
+    add_bytes(reader.bytes_read)
+
+    seconds = time.perf_counter() - start
+    stats = {'rows': len(df), 'seconds': round(seconds, 3),
+             'rows_per_second': round(len(df) / seconds) if seconds else None}
+
+    print(f"copied {stats['rows']} rows into {table_name} in {stats['seconds']}s "
+          f"({stats['rows_per_second']} rows/s)")
+
+    return stats
+
+
+@instrumented
 def create_table(df=None, table_name=None, URI=None):
     """
     Creates a table in the database
@@ -14,36 +144,65 @@ def create_table(df=None, table_name=None, URI=None):
         URI: credentials for the database. defaults to URI
     """
 
-    engine = create_engine(URI)
+    engine = get_engine(URI)
     print('connected to the db..')
 
     df.head(0).to_sql(table_name, engine, if_exists='replace', index=False)
 
+    if table_name in UPSERT_KEYS:
+        create_key_index(table_name, URI)
+
 
-def populate_table(df=None, table_name=None, URI=None):
+@instrumented
+def create_key_index(table_name=None, URI=None, key_cols=None):
+    """
+    Create the index on the key columns of a table that upsert_into_table
+    matches rows on, if it does not exist yet.
+
+    This is a one-time setup step, run by create_table and populate_table.
+    On a large existing table it builds the index under a lock, so run it
+    once before the first reload rather than on every upsert.
+
+    Args:
+        table_name: the name of an existing table
+        URI: credentials for the database
+        key_cols (list): the columns identifying a row. defaults to UPSERT_KEYS[table_name]
+    """
+
+    if key_cols is None:
+        key_cols = UPSERT_KEYS[table_name]
+
+    engine = get_engine(URI)
+    table = Table(table_name, MetaData(), autoload_with=engine)
+
+    Index(f'{table_name}_{"_".join(key_cols)}_idx',
+          *[table.c[col] for col in key_cols]).create(engine, checkfirst=True)
+
+
+@instrumented
+def populate_table(df=None, table_name=None, URI=None, batch_size=50000):
     """
     Populate the table in the db with data from the dataframe.
 
-    The method here is quite fast. It uses the copy_from method from
-    the psycopg2 library.
+    The method here is quite fast. It streams the rows to COPY in
+    batches of batch_size rows.
     """
 
-    engine = create_engine(URI)
+    engine = get_engine(URI)
     conn = engine.raw_connection()
     print('connected to the database..')
 
     try:
         df.head(0).to_sql(table_name, engine, if_exists='replace', index=False)
 
-        with conn.cursor() as cur, io.StringIO() as output:
-            print('creating the cursor..')
-            print('writing the csv to file..')
-            df.to_csv(output, sep='\t', header=False,
-                      index=False, encoding='utf-8')
-            output.seek(0)
-            cur.copy_from(output, table_name, null="") 
+        copy_into_table(conn, df, table_name, batch_size=batch_size)
         conn.commit()
+        invalidate(table_name, database=database_url(URI))
         print('data inserted into table successfully!')
+
+        # indexed after the load, so COPY does not maintain the index row by row
+        if table_name in UPSERT_KEYS:
+            create_key_index(table_name, URI)
     
     except:
         print('Error: unable to populate the table.')
@@ -53,31 +212,29 @@ def populate_table(df=None, table_name=None, URI=None):
         conn.close()
 
 
-def insert_into_table(df=None, table_name=None, URI=None):
+@instrumented
+def insert_into_table(df=None, table_name=None, URI=None, batch_size=50000, conn=None):
     """
-    Insert new data into the table.
+    Insert new data into the table, streaming the rows to COPY in
+    batches of batch_size rows.
+
+    A connection from raw_connection(URI) can be passed to reuse it across
+    many inserts. It is left open for the caller; otherwise a connection is
+    checked out of the shared pool and returned to it afterwards.
     """
 
     if df is None:
         raise ValueError("Error: df is None")
 
-    engine = create_engine(URI)
-
-    conn = engine.raw_connection()
-    cur = conn.cursor()
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_engine(URI).raw_connection()
 
     try:
-        output = io.StringIO()
-
-        df.to_csv(output, sep='\t', header=False,
-                  index=False, encoding='utf-8')
-        output.seek(0)
-
-        cur.copy_from(output, table_name, null="")
+        copy_into_table(conn, df, table_name, batch_size=batch_size)
 
         conn.commit()
-        cur.close()
-        conn.close()
+        invalidate(table_name, database=database_url(URI))
 
     except (psycopg2.OperationalError, psycopg2.ProgrammingError) as e:
         print(f"Error: unable to insert data into the table. {e}")
@@ -87,22 +244,126 @@ def insert_into_table(df=None, table_name=None, URI=None):
     except Exception as e:
         print(f"Error: {e}")
         print(df.index[-1])
+        conn.rollback()
 
     finally:
-        cur.close()
-        conn.close()
+        if owns_conn:
+            conn.close()
+
+
+@instrumented
+def upsert_into_table(df=None, table_name=None, URI=None, key_cols=None,
+                      batch_size=50000, conn=None):
+    """
+    Insert or replace rows in the table, keyed on key_cols.
+
+    The rows are streamed with COPY into a temporary staging table, then
+    merged into the table in one statement that deletes the existing rows
+    with the same keys and inserts the staged rows. Rerunning the same
+    chunk or reloading a corrected week therefore never duplicates rows,
+    and only touches the rows being loaded.
+
+    Keys are matched with =, so the merge can use the index made by
+    create_key_index, which create_table and populate_table build, and
+    only looks up the staged keys rather than scanning the whole table.
+    Rows with a missing key value or keys repeated within df are rejected
+    before anything is sent, since = never matches a missing value and
+    only one row per key can be kept. Any error rolls the transaction
+    back, a passed conn included, and is raised again.
 
+    Args:
+        df (pd.DataFrame): the rows to upsert
+        table_name: the name of an existing table
+        URI: credentials for the database
+        key_cols (list): the columns identifying a row. defaults to UPSERT_KEYS[table_name]
+        batch_size (int): the number of rows encoded at a time. defaults to 50000
+        conn: an open connection to reuse, left open for the caller. defaults to None
+
+    Raises:
+        ValueError: if df has rows with a missing key value or repeats a key
+        Exception: whatever failed, after the transaction is rolled back
 
+    Returns:
+        int: the number of rows written
+    """
+
+    if df is None:
+        raise ValueError("Error: df is None")
+
+    if key_cols is None:
+        key_cols = UPSERT_KEYS[table_name]
+
+    missing = df[key_cols].isna().any(axis=1)
+    if missing.any():
+        raise ValueError(f"Error: {missing.sum()} rows of {table_name} have a missing key "
+                         f"value in {key_cols}")
+
+    repeated = df.duplicated(subset=key_cols, keep=False)
+    if repeated.any():
+        keys = df.loc[repeated, key_cols].drop_duplicates()
+        raise ValueError(f"Error: {len(keys)} keys of {table_name} are repeated in df:\n"
+                         f"{keys.to_string(index=False)}")
+
+    target = sql.Identifier(table_name)
+    staging = sql.Identifier(f'{table_name}_staging')
+    columns = sql.SQL(', ').join(sql.Identifier(col) for col in df.columns)
+    key_match = sql.SQL(' AND ').join(
+        sql.SQL('t.{0} = s.{0}').format(sql.Identifier(col))
+        for col in key_cols)
+
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_engine(URI).raw_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL(
+                'CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP').format(
+                staging, target))
+
+        copy_into_table(conn, df, f'{table_name}_staging', batch_size=batch_size)
+
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                WITH replaced AS (
+                    DELETE FROM {target} AS t
+                    USING {staging} AS s
+                    WHERE {key_match}
+                )
+                INSERT INTO {target} ({columns})
+                SELECT {columns} FROM {staging}
+            """).format(target=target, staging=staging, key_match=key_match,
+                        columns=columns))
+            written = cur.rowcount
+
+        conn.commit()
+        invalidate(table_name, database=database_url(URI))
+        print(f'upserted {written} rows into {table_name}')
+
+        return written
+
+    except Exception as e:
+        print(f"Error: unable to upsert data into the table. {e}")
+        conn.rollback()
+        raise
+
+    finally:
+        if owns_conn:
+            conn.close()
+
+
+@instrumented
 def drop_table(table_name=None, URI=None):
     """
-    Drop a table from the database. 
+    Drop a table from the database if it exists. Runs through the engine, so
+    it works on Postgres and on a SQLite stand-in alike.
 
     """
 
-    psyco_conn = psycopg2.connect(URI)
-    cursor = psyco_conn.cursor()
-    psyco_conn.autocommit = True
+    engine = get_engine(URI)
+    quoted = engine.dialect.identifier_preparer.quote(table_name)
+
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS {quoted}'))
 
-    cursor.execute("""DROP TABLE %s;""" % table_name)
-    cursor.close()
-    psyco_conn.close()
+    invalidate(table_name, database=database_url(URI))
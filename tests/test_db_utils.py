@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from db_utils import upsert_into_table
+
+
+# the checks run before a connection is opened, so no database is needed
+URI = 'postgresql://nobody@localhost:1/none'
+
+
+def test_upsert_rejects_repeated_keys():
+    df = pd.DataFrame({'game_id': ['2021_01_PHI_ATL', '2021_01_PHI_ATL', '2021_01_DAL_TB'],
+                       'team': ['PHI', 'PHI', 'DAL'], 'points': [32, 6, 29]})
+
+    with pytest.raises(ValueError, match='1 keys of games are repeated') as error:
+        upsert_into_table(df, 'games', URI=URI)
+
+    assert '2021_01_PHI_ATL' in str(error.value)
+    assert '2021_01_DAL_TB' not in str(error.value)
+
+
+def test_upsert_rejects_missing_keys():
+    df = pd.DataFrame({'game_id': ['2021_01_PHI_ATL', None], 'team': ['PHI', 'ATL'],
+                       'points': [32, 6]})
+
+    with pytest.raises(ValueError, match='missing key'):
+        upsert_into_table(df, 'games', URI=URI)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.depth_snaps import add_depth_and_snaps, schedule_weeks
+from database.player_index import build_player_index
+
+
+def _chart_weeks(season, regular_weeks):
+    """
+    One entry per chart of a season whose charts have some regular season weeks
+    """
+
+    game_types = ['REG'] * regular_weeks + ['WC', 'DIV', 'CON', 'SB']
+    return pd.DataFrame({'season': season, 'week': np.arange(1, len(game_types) + 1),
+                         'game_type': game_types})
+
+
+@pytest.mark.parametrize('season, regular_weeks, first_week, wild_card, super_bowl', [
+    (2004, 17, 1, 18, 21),
+    (2014, 17, 1, 18, 21),
+    (2016, 18, 0, 18, 21),
+    (2021, 19, 0, 19, 22)
+])
+def test_schedule_weeks(season, regular_weeks, first_week, wild_card, super_bowl):
+    charts = _chart_weeks(season, regular_weeks)
+    weeks = schedule_weeks(charts)
+
+    assert weeks[0] == first_week
+    assert weeks[regular_weeks - 1] == (18 if season >= 2021 else 17)
+    assert list(weeks[regular_weeks:]) == list(range(wild_card, super_bowl + 1))
+
+
+@pytest.fixture(scope='module')
+def season():
+    """
+    Depth charts, snap counts and player-games of one season of two teams,
+    with charts labelled a week ahead of the games as in most seasons
+    """
+
+    rng = np.random.default_rng(7)
+    players = [(team, f'00-00{team}{i}', f'{team}pfr{i}', f'{team} Player {i}')
+               for team in ['GB', 'DET'] for i in range(4)]
+
+    charts = _chart_weeks(2016, 18)
+    charts = charts.merge(pd.DataFrame(players, columns=['club_code', 'gsis_id', 'pfr_id',
+                                                         'full_name']), how='cross')
+    charts['depth_team'] = rng.integers(1, 4, len(charts))
+    charts['position'] = 'WR'
+    charts['chart_week'] = charts['week']
+    charts['week'] = schedule_weeks(charts)
+    # a few teams skip a week's chart
+    charts = charts[rng.random(len(charts)) > 0.2].reset_index(drop=True)
+
+    games = pd.DataFrame([(week, *player) for week in range(1, 22) for player in players],
+                         columns=['week', 'team', 'player_id', 'pfr_player_id', 'player'])
+    games = games[rng.random(len(games)) > 0.3].reset_index(drop=True)
+    games['game_id'] = [f'2016_{week:02d}_GB_DET' for week in games['week']]
+    games['season'] = 2016
+
+    snaps = games.assign(offense_snaps=rng.integers(1, 70, len(games)))
+    snaps['offense_pct'] = snaps['offense_snaps'] / 70
+
+    index = build_player_index({'depth_charts': charts, 'snap_counts': snaps})
+
+    return charts, snaps, games[['game_id', 'week', 'team', 'player_id', 'pfr_player_id']], index
+
+
+@pytest.mark.parametrize('same_week_depth', [True, False])
+def test_no_later_week_leaks(season, same_week_depth):
+    charts, snaps, games, index = season
+    result = add_depth_and_snaps(games, charts, snaps, index, same_week_depth=same_week_depth)
+
+    latest = result['week'] if same_week_depth else result['week'] - 1
+    assert (result['depth_week'].dropna() <= latest[result['depth_week'].notna()]).all()
+    assert (result['prev_snap_week'].dropna() < result['week'][result['prev_snap_week'].notna()]).all()
+
+    # the latest chart and earlier game of each row, found by brute force
+    for row in result.itertuples():
+        chart = charts[(charts['gsis_id'] == row.player_id) & (charts['week'] <= row.week -
+                                                               (not same_week_depth))]
+        if len(chart):
+            chart = chart[chart['week'] == chart['week'].max()]
+            assert row.depth_week == chart['week'].iloc[0]
+            assert row.depth_team == chart['depth_team'].min()
+        else:
+            assert np.isnan(row.depth_week)
+
+        earlier = snaps[(snaps['pfr_player_id'] == row.pfr_player_id) &
+                        (snaps['week'] < row.week)]
+        if len(earlier):
+            assert row.prev_snap_week == earlier['week'].max()
+            assert row.prev_offense_snaps == earlier.loc[earlier['week'].idxmax(), 'offense_snaps']
+        else:
+            assert np.isnan(row.prev_snap_week)
+
+
+def test_wild_card_game_uses_the_wild_card_chart(season):
+    charts, snaps, games, index = season
+    result = add_depth_and_snaps(games, charts, snaps, index)
+
+    # the wild card games are week 18 of the game ids, their charts are labelled 19
+    wild_card = result[(result['week'] == 18) & (result['depth_week'] == 18)]
+    labels = charts.set_index(['gsis_id', 'week'])['chart_week']
+
+    assert len(wild_card)
+    assert (labels.loc[list(zip(wild_card['player_id'], wild_card['depth_week']))] == 19).all()
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from database.synthetic_pbp import make_pbp, make_games
+from database.pbp_utils import process_pbp
+from database.derived_tables import get_derived_rows, update_derived_tables
+
+
+@pytest.fixture(scope='module')
+def season():
+    raw = make_pbp(1, weeks=3)
+    return process_pbp(raw), make_games(raw)
+
+
+def test_update_matches_full_rebuild(season):
+    df, ls = season
+    last_week = df['game_id'].str[5:7] == '03'
+
+    earlier = get_derived_rows(df[~last_week], ls=ls)
+    updated = update_derived_tables(earlier, df, game_ids=df.loc[last_week, 'game_id'].unique(),
+                                    ls=ls)
+
+    for name, table in get_derived_rows(df, ls=ls).items():
+        pd.testing.assert_frame_equal(updated[name], table, obj=name)
+
+
+def test_games_without_ls_raises(season):
+    df, ls = season
+    tables = get_derived_rows(df, ls=ls)
+
+    with pytest.raises(ValueError, match='games table'):
+        update_derived_tables(tables, df)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.rolling_features import add_rolling_features
+from database.feature_state import (update_state, update_feature_state, get_state_features,
+                                    load_state)
+
+
+SPEC = {
+    'rolling_targets': {'col': 'targets', 'kind': 'ewm', 'span': 5},
+    'rolling_rec_yards': {'col': 'rec_yards', 'kind': 'ewm', 'span': 12, 'min_periods': 1},
+    'rolling_unadjusted': {'col': 'rec_yards', 'kind': 'ewm', 'span': 4, 'adjust': False},
+    'rolling_aDOT': {'col': 'aDOT', 'kind': 'rolling', 'window': 12, 'min_periods': 1},
+    'rolling_td': {'col': 'td', 'kind': 'rolling', 'window': 3}
+}
+
+
+def _box_scores(seasons=(2021, 2022), weeks=8, n_players=30, seed=5):
+    """
+    Receiving box scores in game order, with players missing some weeks
+    """
+
+    rng = np.random.default_rng(seed)
+    rows = [(f'{season}_{week:02d}_GB_DET', f'00-{player:04d}')
+            for season in seasons for week in range(1, weeks + 1)
+            for player in range(n_players) if rng.random() < 0.7]
+    df = pd.DataFrame(rows, columns=['game_id', 'player_id'])
+    df['targets'] = rng.integers(0, 12, len(df)).astype(float)
+    df['rec_yards'] = rng.normal(40, 25, len(df)).round()
+    df['aDOT'] = np.where(rng.random(len(df)) < 0.1, np.nan, rng.normal(8, 3, len(df)))
+    df['td'] = rng.integers(0, 2, len(df)).astype(float)
+
+    return df
+
+
+def test_weekly_updates_match_full_history(tmp_path):
+    df = _box_scores()
+    expected = add_rolling_features(df, SPEC)
+
+    result = update_feature_state('receiving', df, SPEC, root=tmp_path)
+
+    pd.testing.assert_frame_equal(result[list(SPEC)], expected[list(SPEC)], check_exact=True)
+
+
+def test_rerunning_a_week_brings_later_weeks_up_to_date(tmp_path):
+    df = _box_scores()
+    update_feature_state('receiving', df, SPEC, root=tmp_path)
+
+    corrected = df.copy()
+    week_5 = corrected['game_id'] == '2022_05_GB_DET'
+    corrected.loc[week_5, 'rec_yards'] += 10
+    later = corrected['game_id'] >= '2022_05_GB_DET'
+
+    result = update_feature_state('receiving', corrected[later], SPEC, root=tmp_path)
+    expected = add_rolling_features(corrected, SPEC)[later]
+
+    pd.testing.assert_frame_equal(result[list(SPEC)], expected[list(SPEC)], check_exact=True)
+
+
+def test_state_features_are_the_next_game(tmp_path):
+    df = _box_scores()
+    update_feature_state('receiving', df, SPEC, root=tmp_path)
+
+    # every player's features for a game after the last one
+    players = df['player_id'].unique()
+    next_game = pd.DataFrame({'game_id': '2022_09_GB_DET', 'player_id': players})
+    expected = (add_rolling_features(pd.concat([df, next_game], ignore_index=True), SPEC)
+                .tail(len(players)).set_index('player_id')[list(SPEC)])
+
+    features = get_state_features(load_state('receiving', root=tmp_path), SPEC)
+    features = features.set_index('player_id').loc[players, list(SPEC)]
+
+    pd.testing.assert_frame_equal(features, expected, check_exact=True)
+
+
+def test_features_grouped_differently_are_rejected():
+    spec = {**SPEC, 'team_targets': {'col': 'targets', 'kind': 'ewm', 'span': 5, 'by': 'team'}}
+
+    with pytest.raises(ValueError, match='grouped by team'):
+        update_state(_box_scores(), spec)
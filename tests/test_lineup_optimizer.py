@@ -0,0 +1,103 @@
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.lineup_optimizer import (SITE_ROSTERS, STACK_POSITIONS, BRING_BACK_POSITIONS,
+                                       _build_pool, _best_lineup, build_lineups)
+
+
+ROSTER = {**SITE_ROSTERS['dk'], 'salary_cap': 42000}
+
+
+def _players(seed):
+    """
+    A small two-game slate with a binding salary cap
+    """
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for pos, count in {'QB': 3, 'RB': 4, 'WR': 5, 'TE': 3, 'DST': 2}.items():
+        for i in range(count):
+            team = ['GB', 'DET', 'DAL', 'NYG'][rng.integers(0, 4)]
+            rows.append((f'{pos}{i}', pos, team, rng.integers(25, 65) * 100))
+    players = pd.DataFrame(rows, columns=['player_id', 'position', 'team', 'salary'])
+    players['opp'] = players['team'].map({'GB': 'DET', 'DET': 'GB', 'DAL': 'NYG', 'NYG': 'DAL'})
+
+    return players, rng.normal(10, 5, len(players))
+
+
+def _brute_force(players, values, stack, bring_back):
+    """
+    The best legal lineup, trying every set of players
+    """
+
+    counts = {'QB': (1, 1), 'RB': (2, 3), 'WR': (3, 4), 'TE': (1, 2), 'DST': (1, 1)}
+    position, team, opp = (players[col].to_numpy() for col in ['position', 'team', 'opp'])
+    salary = players['salary'].to_numpy()
+
+    best, best_value = None, -np.inf
+    for lineup in combinations(range(len(players)), 9):
+        lineup = list(lineup)
+        if salary[lineup].sum() > ROSTER['salary_cap']:
+            continue
+        taken = Counter(position[lineup])
+        if any(not low <= taken[pos] <= high for pos, (low, high) in counts.items()):
+            continue
+        qb = [row for row in lineup if position[row] == 'QB'][0]
+        stacked = sum(team[row] == team[qb] and position[row] in STACK_POSITIONS
+                      for row in lineup)
+        back = sum(team[row] == opp[qb] and position[row] in BRING_BACK_POSITIONS
+                   for row in lineup)
+        if stacked < stack or back < bring_back:
+            continue
+        if values[lineup].sum() > best_value:
+            best, best_value = lineup, values[lineup].sum()
+
+    return best, best_value
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('stack, bring_back', [(0, 0), (1, 0), (2, 0), (1, 1), (2, 2), (3, 0)])
+def test_best_lineup_matches_brute_force(seed, stack, bring_back):
+    players, values = _players(seed)
+    pool = _build_pool(players, ROSTER)
+    allowed = np.ones(len(players), dtype=bool)
+
+    lineup = _best_lineup(values, pool, allowed, stack, bring_back)
+    expected, expected_value = _brute_force(players, values, stack, bring_back)
+
+    if expected is None:
+        assert lineup is None
+    else:
+        assert lineup == expected
+        assert values[lineup].sum() == pytest.approx(expected_value)
+
+
+def test_excluded_players_are_never_chosen():
+    players, values = _players(0)
+    pool = _build_pool(players, ROSTER)
+    allowed = np.ones(len(players), dtype=bool)
+
+    best = _best_lineup(values, pool, allowed)
+    allowed[best[:2]] = False
+    lineup = _best_lineup(values, pool, allowed)
+
+    assert not set(best[:2]) & set(lineup)
+
+
+def test_build_lineups_respects_exposure():
+    players, values = _players(1)
+    sims = values[:, None] + np.random.default_rng(0).normal(0, 6, (len(players), 200))
+
+    lineups = build_lineups(players, sims, n_lineups=6, max_exposure=0.5, stack=0, n_jobs=1,
+                            n_candidates=20, sample_size=20)
+    slots = lineups.drop(columns=['salary', 'mean_points'])
+    lineup_sets = [set(row) for row in slots.itertuples(index=False)]
+
+    assert 0 < len(lineups) <= 6
+    assert (lineups['salary'] <= SITE_ROSTERS['dk']['salary_cap']).all()
+    assert slots.stack().value_counts().max() <= 3
+    assert len(set(map(frozenset, lineup_sets))) == len(lineup_sets)
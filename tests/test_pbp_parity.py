@@ -0,0 +1,92 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+import baseline_pbp_utils as baseline
+from database import pbp_utils
+from database.pbp_frame import PbpFrame
+from database.pbp_schema import compact_pbp
+from database.synthetic_pbp import make_pbp, make_games
+
+
+AGGREGATORS = ['get_qb_pass', 'get_rushing', 'get_receiving', 'get_kicker_stats',
+               'get_def_stats', 'get_opp_pass', 'get_opp_rush', 'get_team_pass_yds',
+               'get_team_rush_yds', 'get_team_scores', 'get_drive_stats',
+               'get_team_adjusted_epa']
+
+# compact_pbp stores epa, cpoe and the other float columns as float32, so
+# their aggregates agree with the float64 ones to about 1e-7, relative to
+# the values summed. sums that cancel out to near 0 need the absolute bound
+FLOAT32_RTOL = 1e-6
+FLOAT32_ATOL = 1e-5
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return make_pbp(1, weeks=4)
+
+
+@pytest.fixture(scope='module')
+def expected(raw):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df = baseline.process_pbp(raw.copy())
+
+    return df
+
+
+@pytest.fixture(scope='module')
+def processed(raw):
+    return pbp_utils.process_pbp(raw.copy())
+
+
+def _baseline(name, df):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return getattr(baseline, name)(df.copy()).reset_index(drop=True)
+
+
+def test_process_pbp_matches_baseline(raw, expected, processed):
+    pd.testing.assert_frame_equal(processed, expected)
+
+    in_place = raw.copy()
+    pd.testing.assert_frame_equal(pbp_utils.process_pbp(in_place, inplace=True), expected)
+
+
+@pytest.mark.parametrize('name', AGGREGATORS)
+def test_aggregators_match_baseline(name, expected, processed):
+    result = getattr(pbp_utils, name)(PbpFrame(processed)).reset_index(drop=True)
+
+    # the adjusted EPA running sums add the plays up in another order
+    pd.testing.assert_frame_equal(result, _baseline(name, expected), check_dtype=False,
+                                  check_categorical=False, rtol=1e-12,
+                                  check_exact=name != 'get_team_adjusted_epa')
+
+
+@pytest.mark.parametrize('name', AGGREGATORS)
+def test_aggregators_match_baseline_on_compact_frames(name, expected, processed):
+    result = getattr(pbp_utils, name)(PbpFrame(compact_pbp(processed))).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(result, _baseline(name, expected), check_dtype=False,
+                                  check_categorical=False, rtol=FLOAT32_RTOL,
+                                  atol=FLOAT32_ATOL)
+
+
+def test_game_results_match_baseline(raw, expected, processed):
+    ls = make_games(raw)
+
+    def game_results(module, df):
+        return module.get_game_results(
+            df=df, team_rush_yds=module.get_team_rush_yds(df),
+            team_pass_yds=module.get_team_pass_yds(df), team_scores=module.get_team_scores(df),
+            opp_rush=module.get_opp_rush(df), opp_pass=module.get_opp_pass(df), ls=ls)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = game_results(pbp_utils, PbpFrame(processed))
+        baseline_result = game_results(baseline, expected.copy())
+
+    pd.testing.assert_frame_equal(result.reset_index(drop=True),
+                                  baseline_result.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
@@ -0,0 +1,32 @@
+import pytest
+
+from database.synthetic_pbp import make_pbp
+from database.pbp_utils import process_pbp
+from database.pbp_views import PBP_VIEWS, SQL_DIALECTS, check_views, view_sql
+
+
+@pytest.fixture(scope='module')
+def pbp():
+    df = process_pbp(make_pbp(1, weeks=3))
+
+    # passer names that go through each of the QB name fixes
+    names = df['passer_player_name'].dropna().unique()
+    df['passer_player_name'] = df['passer_player_name'].replace(
+        {names[0]: 'Aa.Rodgers', names[1]: 'T. Brady Jr.', names[2]: 'Alex Smith'})
+
+    return df
+
+
+def test_views_match_pandas(pbp, tmp_path):
+    report = check_views(pbp, URI=f'sqlite:///{tmp_path / "views.db"}')
+
+    assert list(report['view']) == list(PBP_VIEWS)
+    assert report['matches'].all(), report[~report['matches']].to_string()
+    assert (report['sql_rows'] > 0).all()
+
+
+@pytest.mark.parametrize('dialect', list(SQL_DIALECTS))
+def test_view_sql_has_no_unfilled_placeholders(dialect):
+    for name in PBP_VIEWS:
+        query = view_sql(name, dialect=dialect)
+        assert '{' not in query and '}' not in query
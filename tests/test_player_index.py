@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from database.player_index import build_player_index, current_keys, player_keys
+
+
+DEPTH_CHARTS = pd.DataFrame({
+    'season': [2020, 2020, 2021],
+    'club_code': ['GB', 'GB', 'TB'],
+    'gsis_id': ['00-0023459', '00-0033936', '00-0019596'],
+    'full_name': ['Aaron Rodgers', 'Davante Adams', 'Tom Brady']
+})
+
+SNAP_COUNTS = pd.DataFrame({
+    'season': [2020, 2020, 2021, 2021],
+    'team': ['GB', 'GB', 'TB', 'TB'],
+    'pfr_player_id': ['RodgAa00', 'AdamDa01', 'BradTo00', 'GronRo00'],
+    'player': ['Aaron Rodgers', 'Davante Adams', 'Tom Brady', 'Rob Gronkowski']
+})
+
+
+def _links(index):
+    """
+    The gsis id each pfr id resolves to, None where it has none
+    """
+
+    keys = player_keys(index, SNAP_COUNTS['pfr_player_id'], 'pfr_id')
+    gsis = index[index['kind'] == 'gsis_id'].set_index('player_key')['value']
+
+    return list(pd.Series(keys).map(gsis).replace({np.nan: None}))
+
+
+def test_extending_links_like_one_build():
+    at_once = build_player_index({'depth_charts': DEPTH_CHARTS, 'snap_counts': SNAP_COUNTS})
+
+    snaps_first = build_player_index({'snap_counts': SNAP_COUNTS})
+    extended = build_player_index({'depth_charts': DEPTH_CHARTS}, snaps_first)
+
+    assert _links(at_once) == ['00-0023459', '00-0033936', '00-0019596', None]
+    assert _links(extended) == _links(at_once)
+
+    # the names of the relinked players still resolve, to the gsis id's key
+    names = player_keys(extended, DEPTH_CHARTS['full_name'], 'full_name',
+                        DEPTH_CHARTS['season'], DEPTH_CHARTS['club_code'])
+    assert list(names) == list(player_keys(extended, DEPTH_CHARTS['gsis_id']))
+
+
+def test_retired_keys_map_to_current_keys():
+    snaps_first = build_player_index({'snap_counts': SNAP_COUNTS})
+    extended = build_player_index({'depth_charts': DEPTH_CHARTS}, snaps_first)
+
+    saved = player_keys(snaps_first, SNAP_COUNTS['pfr_player_id'], 'pfr_id')
+    current = player_keys(extended, SNAP_COUNTS['pfr_player_id'], 'pfr_id')
+
+    assert list(current_keys(extended, saved)) == list(current)
+    # the unlinked pfr id keeps its key
+    assert saved[3] == current[3]
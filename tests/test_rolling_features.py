@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.rolling_features import add_rolling_features
+
+
+SPEC = {
+    'ewm_5': {'col': 'yards', 'kind': 'ewm', 'span': 5},
+    'ewm_12_min1': {'col': 'yards', 'kind': 'ewm', 'span': 12, 'min_periods': 1},
+    'ewm_4_unadjusted': {'col': 'targets', 'kind': 'ewm', 'span': 4, 'adjust': False},
+    'ewm_3_shift2': {'col': 'targets', 'kind': 'ewm', 'span': 3, 'shift': 2},
+    'rolling_6': {'col': 'yards', 'kind': 'rolling', 'window': 6},
+    'rolling_12_min1': {'col': 'targets', 'kind': 'rolling', 'window': 12, 'min_periods': 1},
+    'team_rolling_3': {'col': 'yards', 'kind': 'rolling', 'window': 3, 'by': ['team', 'season']}
+}
+
+
+def _games(n_players=40, n_games=30, seed=3):
+    """
+    Player-games in game order, with missing values, players joining late
+    and a few rows without a player_id
+    """
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'player_id': rng.integers(0, n_players, n_players * n_games).astype(str),
+        'team': rng.choice(['GB', 'DET', 'CHI'], n_players * n_games),
+        'season': np.repeat([2021, 2022], n_players * n_games // 2),
+        'yards': rng.normal(50, 30, n_players * n_games).round(),
+        'targets': rng.integers(0, 12, n_players * n_games).astype(float)
+    })
+    df.loc[rng.random(len(df)) < 0.1, 'yards'] = np.nan
+    df.loc[rng.random(len(df)) < 0.02, 'player_id'] = None
+
+    return df
+
+
+def _expected(df, feature, by='player_id'):
+    """
+    The feature as the notebooks compute it, with a groupby transform
+    """
+
+    shift = feature.get('shift', 1)
+    if feature['kind'] == 'ewm':
+        func = (lambda x: x.shift(shift).ewm(span=feature['span'],
+                                             adjust=feature.get('adjust', True),
+                                             min_periods=feature.get('min_periods', 0)).mean())
+    else:
+        func = (lambda x: x.shift(shift).rolling(feature['window'],
+                                                 min_periods=feature.get('min_periods')).mean())
+
+    return df.groupby(feature.get('by', by))[feature['col']].transform(func)
+
+
+@pytest.mark.parametrize('name', list(SPEC))
+def test_features_match_groupby_transform(name):
+    df = _games()
+    result = add_rolling_features(df, SPEC)
+
+    pd.testing.assert_series_equal(result[name], _expected(df, SPEC[name]), check_names=False,
+                                   check_exact=True)
+
+
+def test_inplace_and_copy():
+    df = _games()
+
+    result = add_rolling_features(df, SPEC)
+    assert 'ewm_5' not in df.columns
+
+    add_rolling_features(df, SPEC, inplace=True)
+    pd.testing.assert_frame_equal(df, result)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.scoring import score_frame, score_sims, combine_rules, get_rules
+
+
+# the scoring formulas of feature_processing.ipynb (receiving, rushing, qb,
+# kicker), bayesian_nn_qbs.ipynb (fanduel_points) and pymc_dfs_models.ipynb (defense)
+def notebook_points(df, site, table):
+    if table == 'receiving':
+        if site == 'dk':
+            return ((df['rec_yards'] * 0.1).add(df['td'] * 6)
+                    .add((df['rec_yards'] >= 100).astype(int) * 3).add(df['rec'] * 1))
+        return (df['rec_yards'] * 0.1).add(df['td'] * 6).add(df['rec'] * 0.5)
+
+    if table == 'rushing':
+        if site == 'dk':
+            return ((df['rush_yds'] * 0.1).add(df['rush_td'] * 6)
+                    .add((df['rush_yds'] >= 100).astype(int) * 3).add(df['fumbles'] * -1))
+        return (df['rush_yds'] * 0.1).add(df['rush_td'] * 6).add(df['fumbles'] * -2)
+
+    if table == 'qb':
+        if site == 'dk':
+            return ((df['touchdown'] * 4).add(df['pass_yards'] * 0.04)
+                    .add((df['pass_yards'] >= 300).astype(int) * 3)
+                    .add(df['interception'] * -1).add(df['rush_td'] * 6)
+                    .add(df['rush_yds'] * 0.1).add((df['rush_yds'] >= 100).astype(int) * 3)
+                    .add(df['fumbles'] * -1))
+        return (df['rush_yds'].mul(0.1).add(df['rush_td'].mul(6)).add(df['pass_yards'].mul(0.04))
+                .add(df['interception'].mul(-1)).add(df['fumbles'].mul(-2))
+                .add(df['touchdown'].mul(4)))
+
+    if table == 'kicker':
+        return ((df['pats'] * 1).add(df['fg_0_39'] * 3).add(df['fg_40_49'] * 4)
+                .add(df['fg_50_on'] * 5))
+
+    opp = df['opp_points']
+    return ((df['def_int'] * 2).add(df['def_sack'] * 1).add(df['safety'] * 2)
+            .add(df['kick_blocked'] * 2).add(df['def_td'] * 6)
+            .add(np.where(opp <= 6, 7, 0)).add(np.where(opp.between(7, 13), 4, 0))
+            .add(np.where(opp.between(14, 20), 1, 0)).add(np.where(opp.between(28, 34), -1, 0))
+            .add(np.where(opp.between(35, 100), -4, 0)))
+
+
+def _box_scores(n=2000, seed=11):
+    """
+    Random stat lines around every bonus threshold and points bracket
+    """
+
+    rng = np.random.default_rng(seed)
+    counts = ['td', 'rec', 'rush_td', 'fumbles', 'touchdown', 'interception', 'pats',
+              'fg_0_39', 'fg_40_49', 'fg_50_on', 'def_int', 'def_sack', 'safety',
+              'kick_blocked', 'def_td']
+    df = pd.DataFrame({col: rng.integers(0, 4, n) for col in counts})
+    df['rec_yards'] = rng.integers(-5, 180, n)
+    df['rush_yds'] = rng.integers(-10, 180, n)
+    df['pass_yards'] = rng.integers(0, 450, n)
+    df['opp_points'] = rng.integers(0, 60, n)
+
+    return df
+
+
+CASES = [(site, table) for site in ['dk', 'fd']
+         for table in ['receiving', 'rushing', 'qb', 'kicker', 'defense']]
+
+
+@pytest.mark.parametrize('site, table', CASES)
+def test_score_frame_matches_notebook(site, table):
+    df = _box_scores()
+
+    pd.testing.assert_series_equal(score_frame(df, site, table),
+                                   notebook_points(df, site, table).astype(np.float64),
+                                   check_names=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize('site, table', CASES)
+def test_score_sims_matches_score_frame(site, table):
+    df = _box_scores(n=600)
+    # 30 players by 20 simulations
+    sims = {col: df[col].to_numpy(dtype=np.float64).reshape(30, 20) for col in df.columns}
+
+    points = score_sims(sims, site, table)
+
+    assert points.shape == (30, 20)
+    np.testing.assert_array_equal(points.ravel(), score_frame(df, site, table).to_numpy())
+    np.testing.assert_allclose(score_sims(sims, site, table, dtype=np.float32), points,
+                               rtol=1e-6, atol=1e-4)
+
+
+def test_combined_rules_add_up():
+    df = _box_scores()
+    rules = combine_rules(get_rules('dk', 'rushing'), get_rules('dk', 'receiving'))
+
+    pd.testing.assert_series_equal(
+        score_frame(df, rules=rules),
+        (notebook_points(df, 'dk', 'rushing') + notebook_points(df, 'dk', 'receiving'))
+        .astype(np.float64), check_names=False, rtol=1e-12)
+
+
+def test_missing_stats_score_nothing():
+    df = pd.DataFrame({'rec_yards': [120., np.nan], 'td': [1., np.nan], 'rec': [np.nan, 3.]})
+
+    assert list(score_frame(df, 'dk', 'receiving')) == [12 + 6 + 3, 3]